@@ -6,8 +6,6 @@
 
 import argparse
 import os.path
-from plumbum import local
-from plumbum.cmd import sudo, btrfs, mv, cp, chown, chmod
 
 parser = argparse.ArgumentParser()
 parser.add_argument('p', nargs='?')
@@ -22,6 +20,9 @@ if not os.path.isdir(p):
     print(f"path doesn't exist: {p}")
     exit()
 
+# plumbum only once the arguments are known to be good
+from plumbum import local
+from plumbum.cmd import sudo, btrfs, mv, cp, chown, chmod
 
 def test_volume_exists(p):
     (ret, stdout, stderr)=sudo[btrfs['subvolume', 'show', p]].run(retcode=None)
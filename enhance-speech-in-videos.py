@@ -28,13 +28,21 @@ rnn_file = "bd.rnnn"
 gain=0 # i used 13 before, but adjust depending on the input video
 
 import glob
-# used for parallelism & persistence; so we don't re-process the same file
-import joblib
-# invokes ffmpeg in a way that is less painful
-import ffmpeg
+# joblib (parallelism & persistence, so we don't re-process the same file) is imported in main(), so starting up
+# doesn't pay for it
 
-from joblib import Memory
-mem = Memory(job_cache_dir, verbose=1)
+class _LazyModule:
+    """Stands in for a module, importing it when one of its attributes is first used"""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        import importlib
+        return getattr(importlib.import_module(self._name), attr)
+
+# invokes ffmpeg in a way that is less painful. bound lazily rather than imported in _process, since joblib
+# throws away its cache when _process's source changes
+ffmpeg = _LazyModule('ffmpeg')
 
 def inputs(justOne: bool):
     files = glob.glob(file_glob_pattern)
@@ -64,10 +72,10 @@ def _process(x, gain, view_graph):
         else:
             ffmpeg.run(out)
 
-process = mem.cache(_process)
-
 def main():
-    from joblib import Parallel, delayed
+    from joblib import Memory, Parallel, delayed
+    mem = Memory(job_cache_dir, verbose=1)
+    process = mem.cache(_process)
     # run in parallel; adjust depending on cpu count
     Parallel(n_jobs=n_jobs)(delayed(process)(x, gain, False) for x in inputs(False))
 
@@ -0,0 +1,145 @@
+import argparse, json, os, random, string, sys, tempfile, time, tracemalloc
+
+from interactive.picker.filter import IncrementalFilter, LabelIndex
+from interactive.picker.items import PickableBase, sort_by_weight
+from interactive.picker.ranking import RankingStore
+
+def _uncached_weight(label: str) -> float:
+    """PickableBase.weight() as it was before weights were cached, to compare against"""
+    import string
+    w = 1.0
+    current_factor = 1
+    step = 0.1
+
+    for c in label.lower():
+        current_factor = current_factor * step
+        letter_idx = string.ascii_lowercase.find(c)
+        if letter_idx >= 0:
+            ratio = 1 - (float(letter_idx) / len(string.ascii_lowercase))
+            assignment = (4 * ratio) + 1
+            w = w + (assignment * current_factor)
+            continue
+        try:
+            int_value = int(c)
+            ratio = 1 - (float(int_value) / 10)
+            assignment = (2 * ratio) + 6
+            w = w + (assignment * current_factor)
+            continue
+        except (TypeError, ValueError):
+            continue
+    return w
+
+def _labels(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' -_.'
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(4, 40))) for _ in range(count)]
+
+def measure_sort(count: int, repeats: int = 3) -> dict:
+    """Seconds to sort count pickables by weight, the old way and with cached weights (first sort, which works the
+    weights out, and a later one which reuses them)"""
+    labels = _labels(count)
+    results = {}
+
+    items = [PickableBase(label) for label in labels]
+    before = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        before = sorted(items, key=lambda p: _uncached_weight(p.label), reverse=True)
+    results['uncached_s'] = (time.perf_counter() - start) / repeats
+
+    items = [PickableBase(label) for label in labels]
+    start = time.perf_counter()
+    after = sort_by_weight(items)
+    results['first_sort_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeats):
+        after = sort_by_weight(items)
+    results['cached_sort_s'] = (time.perf_counter() - start) / repeats
+
+    if [p.label for p in before] != [p.label for p in after]:
+        raise AssertionError('cached weights sort differently')
+    return results
+
+def measure_filter(count: int) -> dict:
+    """Time to index count pickables, the index's size, and how long each keystroke takes while typing, deleting
+    and retyping a few queries"""
+    items = [PickableBase(label) for label in _labels(count, seed=1)]
+    sort_by_weight(items) # weights are worked out already by the time a picker filters
+    # sized on a build of its own, tracemalloc slows building down a lot
+    tracemalloc.start()
+    index = LabelIndex(items)
+    index.ranked()
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del index
+    start = time.perf_counter()
+    index = LabelIndex(items)
+    index.ranked()
+    build_s = time.perf_counter() - start
+
+    f = IncrementalFilter(index)
+    keystrokes = []
+    for query in ['a', 'ab', 'abc', 'ab', 'a', '', 'x', 'x1', 'x1 ', 'x1 y', 'x1 ', 'x1', 'x', 'e', 'e_', 'e_q']:
+        start = time.perf_counter()
+        f.update_ids(query)
+        keystrokes.append(time.perf_counter() - start)
+    keystrokes.sort()
+    return {'build_s': build_s, 'index_bytes': index_bytes, 'keystroke_p50_ms': keystrokes[len(keystrokes) // 2] * 1000,
+            'keystroke_max_ms': keystrokes[-1] * 1000}
+
+def measure_ranking(count: int, history: int = 65536) -> dict:
+    """Time to open a ranking file with history records, rank count pickables with it, and save a pick"""
+    items = [PickableBase(label) for label in _labels(count, seed=2)]
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'ranking.bin')
+        store = RankingStore(path, max_records=history)
+        now = time.time()
+        for i in range(history):
+            store.record('bench' if i < count else f'other {i}', items[i % count].label if i < count else str(i),
+                         when=now - rng.randrange(60 * 24 * 3600))
+        store.save()
+        store.close()
+
+        start = time.perf_counter()
+        store = RankingStore(path, max_records=history)
+        open_s = time.perf_counter() - start
+        start = time.perf_counter()
+        store.rank('bench', items)
+        rank_s = time.perf_counter() - start
+        store.record('bench', items[0].label)
+        start = time.perf_counter()
+        store.save()
+        save_s = time.perf_counter() - start
+        store.close()
+    return {'open_s': open_s, 'rank_s': rank_s, 'save_s': save_s}
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description='Benchmarks for picker items')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to PATH as JSON, - for stdout')
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args(argv)
+    out = sys.stderr if args.json == '-' else sys.stdout
+
+    results = {'sort_by_weight': measure_sort(args.count)}
+    r = results['sort_by_weight']
+    print(f'sorting {args.count} pickables: {r["uncached_s"] * 1000:.0f}ms uncached, {r["first_sort_s"] * 1000:.0f}ms '
+          f'working weights out, {r["cached_sort_s"] * 1000:.0f}ms with them cached', file=out)
+
+    results['filter'] = r = measure_filter(args.count)
+    print(f'filtering {args.count} pickables: index built in {r["build_s"] * 1000:.0f}ms, {r["index_bytes"] / 1e6:.1f}MB, '
+          f'keystrokes p50 {r["keystroke_p50_ms"]:.2f}ms max {r["keystroke_max_ms"]:.2f}ms', file=out)
+
+    results['ranking'] = r = measure_ranking(args.count)
+    print(f'ranking {args.count} pickables: file opened in {r["open_s"] * 1000:.2f}ms, ranked in {r["rank_s"] * 1000:.0f}ms, '
+          f'a pick saved in {r["save_s"] * 1000:.0f}ms', file=out)
+
+    if args.json:
+        if args.json == '-':
+            json.dump(results, sys.stdout, indent=1)
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=1)
+
+if __name__ == '__main__':
+    main()
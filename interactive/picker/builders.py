@@ -1,28 +1,51 @@
 
-from typing import Iterable
+from typing import AsyncIterable, Callable, Iterable
 from interactive.picker.items import PickableBase, PickedAction, PickedResult
 from interactive.picker.pickers import ItemPickerBase
+from interactive.picker.ranking import RankingStore
 from sink.errors import stub
 from collections import namedtuple
 from enum import Enum
 
 
-type PickableTree = PickableBase | tuple[str, Iterable[PickableTree]]
+type PickableTree = PickableBase | tuple[str, PickableChildren]
+type PickableChildren = Iterable[PickableTree] | AsyncIterable[PickableTree] | Callable[[], Iterable[PickableTree] | AsyncIterable[PickableTree]]
 
-def build_tree(title: str, picker: type[ItemPickerBase], pickables: list[PickableTree]):
+def build_tree(title: str, picker: type[ItemPickerBase], pickables: list[PickableTree] | Iterable[PickableTree],
+               ranking: RankingStore | None = None):
+    """Nested pickers are only made once they are opened, and their items read as the picker pages through them, so
+    a branch's items can be a generator, an async iterator or a function returning one of those.
+    With a ranking store, every picker in the tree shows what was picked most often and most recently first."""
     from interactive.picker.items.nested_picker import NestedPickerPickable
-    def build_tree_rec(pt: PickableTree) -> PickableBase:
+    def build_tree_rec(pt: PickableTree, parent_path: str) -> PickableBase:
         if isinstance(pt, tuple):
-            # create the picker that this will open when picked
-            items = [build_tree_rec(x) for x in pt[1]]
-            inner_picker = picker(title=pt[0], items=items)
+            # the picker that this will open when picked, made when it is
+            label, children = pt
+            path = f'{parent_path}/{label}'
+            def make_picker():
+                p = picker(title=label, items=build_items(children, path))
+                p.path = path
+                p.ranking = ranking
+                return p
             # now create the pickable that will use it
-            p = NestedPickerPickable(pt[0], inner_picker)
+            p = NestedPickerPickable(label, make_picker)
             return p
         else:
             # It's already a pickable
             return pt
 
-    root_items = [build_tree_rec(x) for x in pickables]
-    root = picker(title, root_items)
-    return root
\ No newline at end of file
+    def build_items(children: PickableChildren, path: str):
+        if callable(children):
+            children = children()
+        if isinstance(children, AsyncIterable):
+            async def build_async():
+                async for x in children:
+                    yield build_tree_rec(x, path)
+            return build_async()
+        if isinstance(children, list):
+            return [build_tree_rec(x, path) for x in children]
+        return (build_tree_rec(x, path) for x in children)
+
+    root = picker(title, build_items(pickables, title))
+    root.ranking = ranking
+    return root
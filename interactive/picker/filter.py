@@ -0,0 +1,130 @@
+from array import array
+from typing import Iterable
+from interactive.picker.items import PickableBase
+
+def _terms(query: str) -> list[str]:
+    return query.lower().split()
+
+def _implies(narrower: list[str], wider: list[str]) -> bool:
+    """Whether every label matching the narrower terms matches the wider ones too"""
+    return all(any(w in n for n in narrower) for w in wider)
+
+class LabelIndex:
+    """Index over the labels of picker items, for filtering as you type. A label matches a query when every
+    whitespace separated term of the query is somewhere in it, ignoring case. Matches come out highest weight() first.
+    Labels are indexed by their single characters and trigrams: a term is looked up by its rarest trigram (or
+    character, for short terms) and the candidates are then checked in full."""
+    def __init__(self, items: Iterable[PickableBase] = ()):
+        self.items: list[PickableBase] = []
+        self._labels: list[str] = []
+        # ids of items with a gram in their label, in the order they were added
+        self._postings: dict[str, array] = {}
+        # ids of all items, highest weight first; made again when items are added
+        self._ranked: list[int] | None = None
+        self.add(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, items: Iterable[PickableBase]):
+        """Index some more items, e.g. the next page of a lazy picker"""
+        postings = self._postings
+        item_id = len(self.items)
+        for item in items:
+            label = item.label.lower()
+            self.items.append(item)
+            self._labels.append(label)
+            grams = set(label)
+            grams.update([label[i:i + 3] for i in range(len(label) - 2)])
+            for gram in grams:
+                try:
+                    postings[gram].append(item_id)
+                except KeyError:
+                    postings[gram] = array('I', (item_id,))
+            item_id += 1
+        self._ranked = None
+
+    def ranked(self) -> list[int]:
+        """Ids of every item, highest weight first (ties in the order they were added)"""
+        if self._ranked is None:
+            items = self.items
+            self._ranked = sorted(range(len(items)), key=lambda i: -items[i].weight())
+        return self._ranked
+
+    def _candidates(self, term: str) -> array | None:
+        """The shortest posting list covering term; None if nothing can match"""
+        grams = [term[i:i + 3] for i in range(len(term) - 2)] if len(term) >= 3 else list(term)
+        best = None
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids is None:
+                return None
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def _filter(self, ids: Iterable[int], terms: list[str]) -> list[int]:
+        labels = self._labels
+        if len(terms) == 1:
+            term = terms[0]
+            return [i for i in ids if term in labels[i]]
+        return [i for i in ids if all(t in labels[i] for t in terms)]
+
+    def search(self, query: str, within: list[int] | None = None) -> list[int]:
+        """Ids of the items matching query, highest weight first. within is an earlier result (in the same order)
+        that the query narrows down, it's only checked item by item if that's quicker than the index."""
+        terms = _terms(query)
+        if not terms:
+            return list(within) if within is not None else list(self.ranked())
+
+        candidates = []
+        for term in terms:
+            ids = self._candidates(term)
+            if ids is None:
+                return []
+            candidates.append(ids)
+        best = min(candidates, key=len)
+        if within is not None and len(within) <= len(best):
+            return self._filter(within, terms)
+
+        if len(terms) == 1 and len(terms[0]) in (1, 3):
+            # the term is a gram, so its postings are exactly the matches
+            matches = best
+        else:
+            matches = self._filter(best, terms)
+        if len(matches) * 8 > len(self._labels):
+            # most of the items, quicker to pick them out of the ranked ids than to sort them
+            matched = bytearray(len(self._labels))
+            for i in matches:
+                matched[i] = 1
+            return [i for i in self.ranked() if matched[i]]
+        items = self.items
+        return sorted(matches, key=lambda i: -items[i].weight())
+
+class IncrementalFilter:
+    """Filters a LabelIndex as a query is typed. Results for the queries typed so far are kept, so typing another
+    character narrows the last result down and deleting one goes back to an earlier result."""
+    def __init__(self, index: LabelIndex):
+        self.index = index
+        # (terms, ids) for a chain of queries, each narrowing down the one before it
+        self._chain: list[tuple[list[str], list[int]]] = []
+        self._indexed = len(index)
+
+    def update(self, query: str) -> list[PickableBase]:
+        """Items matching query, highest weight first"""
+        return [self.index.items[i] for i in self.update_ids(query)]
+
+    def update_ids(self, query: str) -> list[int]:
+        if len(self.index) != self._indexed:
+            # items were added, earlier results are missing them
+            self._chain.clear()
+            self._indexed = len(self.index)
+        terms = _terms(query)
+        chain = self._chain
+        while chain and not _implies(terms, chain[-1][0]):
+            chain.pop()
+        if chain and chain[-1][0] == terms:
+            return chain[-1][1]
+        ids = self.index.search(query, chain[-1][1] if chain else None)
+        chain.append((terms, ids))
+        return ids
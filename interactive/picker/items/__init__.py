@@ -1,5 +1,6 @@
 
 from enum import Enum
+from operator import methodcaller
 
 
 class PickedAction(Enum):
@@ -12,43 +13,83 @@ class PickedResult:
         self.action = action
         self.message = message
 
+def _weight_table() -> dict[str, float | None]:
+    """What each character adds to a weight, before it is scaled down by its position"""
+    import string
+    table = {}
+    for letter_idx, c in enumerate(string.ascii_lowercase):
+        ratio = 1 - (float(letter_idx) / len(string.ascii_lowercase)) # 1- to reverse it, since larger values are higher weighted
+        # letter indices are assigned a number line position between [1,5]
+        table[c] = (4 * ratio) + 1
+    for int_value in range(10):
+        ratio = 1 - (float(int_value) / 10)
+        # number indices are assigned somewhere between [6,8] so they take precedence over letters
+        table[str(int_value)] = (2 * ratio) + 6
+    return table
+
+# None for characters that aren't letters or numbers, they don't contribute to weight. Other characters are added as
+# they turn up
+_WEIGHT_TABLE = _weight_table()
+
+def label_weight(label: str) -> float:
+    """The default weight of a label: 1 with the label turned into a fractional component for ordering"""
+    table = _WEIGHT_TABLE
+    w = 1.0
+    current_factor = 1
+    step = 0.1
+
+    for c in label.lower():
+        current_factor = current_factor * step
+        try:
+            assignment = table[c]
+        except KeyError:
+            # int() takes digits of any script
+            assignment = table[c] = ((2 * (1 - (float(int(c)) / 10))) + 6) if c.isdecimal() else None
+        if assignment is not None:
+            w = w + (assignment * current_factor)
+    return w
+
 class PickableBase:
+    # the weight is worked out once per label; subclasses that weigh items differently override weight()
+    __slots__ = ('_label', '_weight')
+    # picked() does slow blocking work, which async pickers run on an executor. See AsyncPickable for actions that
+    # are coroutines
+    blocking: bool = False
+
     def __init__(self, label: str):
         self.label = label
+    @property
+    def label(self) -> str:
+        return self._label
+    @label.setter
+    def label(self, label: str):
+        self._label = label
+        self._weight = None
     def picked(self) -> PickedResult:
         return PickedResult(PickedAction.PICK_AGAIN, f'Not implemented: {self.label}')
     def enabled(self) -> bool:
         return True
     def __str__(self) -> str:
         return f'{self.label} ({self.weight()})'
-    def weight(self):
+    def weight(self) -> float:
         """Higher numbers are more likely to be picked. Default is 1 with the label turned into a fractional component for ordering"""
-        import string
-        w = 1.0
-        current_factor = 1
-        step = 0.1
-
-        for c in self.label.lower():
-            current_factor = current_factor * step
-            letter_idx = string.ascii_lowercase.find(c)
-            if letter_idx >= 0:
-                ratio = 1 - (float(letter_idx) / len(string.ascii_lowercase)) # 1- to reverse it, since larger values are higher weighted
-                # letter indices are assigned a number line position between [1,5]
-                assignment = (4 * ratio) + 1
-                w = w + (assignment * current_factor)
-                continue
-            
-            # maybe it is a number?
-            try:
-                int_value = int(c)
-                ratio = 1 - (float(int_value) / 10)
-                # number indices are assigned somewhere between [6,8] so they take precedence over letters
-                assignment = (2 * ratio) + 6
-                w = w + (assignment * current_factor)
-                continue
-
-            except (TypeError, ValueError):
-                # characters that aren't letters or numbers will not contribute to weight
-                continue
-
+        w = self._weight
+        if w is None:
+            w = self._weight = label_weight(self._label)
         return w
+
+class AsyncPickable(PickableBase):
+    """An item whose action is a coroutine. Async pickers run picked_async() on their event loop; other pickers call
+    picked(), which runs it to completion on a loop of its own"""
+    __slots__ = ()
+
+    def picked(self) -> PickedResult:
+        import asyncio
+        return asyncio.run(self.picked_async())
+
+    async def picked_async(self) -> PickedResult:
+        return PickedResult(PickedAction.PICK_AGAIN, f'Not implemented: {self.label}')
+
+def sort_by_weight(items: list[PickableBase]) -> list[PickableBase]:
+    """items, most likely to be picked first"""
+    return sorted(items, key=methodcaller('weight'), reverse=True)
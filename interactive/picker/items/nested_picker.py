@@ -1,12 +1,20 @@
+from typing import Callable
 from interactive.picker.items import PickableBase, PickedResult
 from interactive.picker.pickers import ItemPickerBase
 
 
 class NestedPickerPickable(PickableBase):
-    def __init__(self, label: str, inner_picker: ItemPickerBase):
+    def __init__(self, label: str, inner_picker: ItemPickerBase | Callable[[], ItemPickerBase]):
+        """inner_picker can be a function that makes the picker, which is then only called once this is picked"""
         super().__init__(label)
-        self.inner_picker = inner_picker
-    
+        self._inner_picker = inner_picker
+
+    @property
+    def inner_picker(self) -> ItemPickerBase:
+        if not isinstance(self._inner_picker, ItemPickerBase):
+            self._inner_picker = self._inner_picker()
+        return self._inner_picker
+
     def picked(self) -> PickedResult:
         result = self.inner_picker.run()
         return result
\ No newline at end of file
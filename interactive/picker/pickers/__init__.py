@@ -1,24 +1,136 @@
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Callable, Iterable
 from interactive.picker.items import PickableBase, PickedAction, PickedResult
-from sink.errors import stub
+from sink.errors import stubbed
+if TYPE_CHECKING:
+    from interactive.picker.ranking import RankingStore
+
+type ItemSource = Iterable[PickableBase] | AsyncIterable[PickableBase]
 
 class ItemPickerBase:
     """Base for item pickers"""
-    def __init__(self, title: str, items: list[PickableBase]):
+    # how many items to load at a time from a lazy source, None for all of them at once
+    page_size: int | None = 100
+    # remembers what gets picked in this picker (under path, the titles down to it), to show it first next time
+    ranking: 'RankingStore | None' = None
+
+    def __init__(self, title: str, items: ItemSource | Callable[[], ItemSource], page_size: int | None = None):
+        """items can be a list, or a generator, async iterator or something that returns one when called. Those are
+        only read from a page at a time, once the picker is shown."""
         self.title = title
-        self.items = items
-    def run(self) -> PickedResult:
-        while True:
-            result = self._present_items()
-            if result.action == PickedAction.PICK_AGAIN:
-                continue
-            elif result.action == PickedAction.PICK_PARENT:
-                this_result = PickedResult(action=PickedAction.PICK_AGAIN, message=result.message)
-                return this_result
-            elif result.action == PickedAction.EXIT:
-                return result
+        self.path = title
+        if page_size is not None:
+            self.page_size = page_size
+        if isinstance(items, list):
+            self.items = items
+            self._source = None
+        else:
+            self.items = []
+            self._source = items
+        self._async_runner = None
+        self._ranked = False
+
+    def exhausted(self) -> bool:
+        """Whether every item has been loaded"""
+        return self._source is None
+
+    def load_more(self, count: int | None = None) -> int:
+        """Load up to count more items (a page by default, everything if page_size is None) from the source. Returns
+        how many were loaded."""
+        if self._source is None:
+            return 0
+        if count is None:
+            count = self.page_size
+        source = self._source
+        if callable(source):
+            source = self._source = source()
+        if isinstance(source, AsyncIterable):
+            loaded = self._load_async(source, count)
+        else:
+            if not hasattr(source, '__next__'):
+                source = self._source = iter(source)
+            loaded = 0
+            for item in source:
+                self.items.append(item)
+                loaded += 1
+                if count is not None and loaded >= count:
+                    break
             else:
-                raise Exception(f'Action variant not handled: {result.action} in result {result} for picker {self.title}')
+                self._source = None
+        return loaded
+
+    def _load_async(self, source: AsyncIterable[PickableBase], count: int | None) -> int:
+        # pickers run synchronously, so async sources get an event loop of their own to be stepped on
+        import asyncio
+        if self._async_runner is None:
+            self._async_runner = asyncio.Runner()
+        runner = self._async_runner
+        iterator: AsyncIterator[PickableBase] = aiter(source)
+        self._source = iterator
+        async def take():
+            loaded = 0
+            while count is None or loaded < count:
+                try:
+                    item = await anext(iterator)
+                except StopAsyncIteration:
+                    return loaded, True
+                self.items.append(item)
+                loaded += 1
+            return loaded, False
+        done = True
+        try:
+            loaded, done = runner.run(take())
+        finally:
+            if done:
+                # also when a page is given up on part way (Ctrl-C, say): the runner cancels what is left of it, closes
+                # the source if it's a generator, and closes the loop
+                self._source = None
+                self._async_runner = None
+                runner.close()
+        return loaded
+
+    def _rank_items(self):
+        """Move the items picked before to the front, when there's a ranking store. Done once, when the picker is
+        first shown, so the items don't move around under the user; only the first page of a lazy source is ranked."""
+        if self._ranked:
+            return
+        self._ranked = True
+        if self.ranking is not None and self.items:
+            # in place, AutoItemPicker shares the list
+            self.items[:] = self.ranking.rank(self.path, self.items)
+
+    def _record_pick(self, item: PickableBase):
+        # only noted here, the file is written once the picker is left (_save_ranking) rather than before every action
+        if self.ranking is not None:
+            self.ranking.record(self.path, item.label)
+
+    def _save_ranking(self):
+        if self.ranking is not None:
+            self.ranking.save()
+
+    def run(self) -> PickedResult:
+        if not self.items:
+            self.load_more()
+        self._rank_items()
+        try:
+            while True:
+                result = self._handle_result(self._present_items())
+                if result is not None:
+                    return result
+        finally:
+            self._save_ranking()
+
+    def _handle_result(self, result: PickedResult) -> PickedResult | None:
+        """What run() returns after an item was picked with this result, None to show the items again"""
+        if result.action == PickedAction.PICK_AGAIN:
+            return None
+        elif result.action == PickedAction.PICK_PARENT:
+            this_result = PickedResult(action=PickedAction.PICK_AGAIN, message=result.message)
+            return this_result
+        elif result.action == PickedAction.EXIT:
+            return result
+        else:
+            raise Exception(f'Action variant not handled: {result.action} in result {result} for picker {self.title}')
 
+    @stubbed
     def _present_items(self) -> PickedResult:
-        stub()
-        raise Exception() # will throw inside of stub, this is just here to satisfy static analysis
+        ...
@@ -0,0 +1,89 @@
+import asyncio, collections, concurrent.futures
+from interactive.picker.items import AsyncPickable, PickableBase, PickedAction, PickedResult
+from interactive.picker.pickers.tui import TuiItemPicker
+
+class AsyncTuiItemPicker(TuiItemPicker):
+    """A tui item picker that doesn't wait for slow items. An AsyncPickable runs on the event loop, and an item marked
+    blocking runs on an executor (e.g. a QueueExecutor with workers), while the menu is shown again straight away.
+    Their results show up in the title the next time the menu is drawn after they're done (pick can't redraw by
+    itself); one that asks to exit or go back to the parent picker does so then.
+    The menu itself runs on a thread of the loop's default executor, so the loop carries on while it waits for keys."""
+    def __init__(self, title: str, items, page_size: int | None = None, executor: concurrent.futures.Executor | None = None):
+        """executor runs the blocking items, the loop's default executor if None"""
+        super().__init__(title, items, page_size)
+        self.executor = executor
+        # actions still going, by the future run_coroutine_threadsafe gave for them
+        self.running: dict[concurrent.futures.Future, PickableBase] = {}
+        # futures of finished actions, in the order they finished
+        self._finished = collections.deque()
+        self._loop = None
+
+    def run(self) -> PickedResult:
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> PickedResult:
+        """run(), on the running event loop. Waits for actions that are still going before returning."""
+        loop = self._loop = asyncio.get_running_loop()
+        if not self.items:
+            await loop.run_in_executor(None, self.load_more)
+        self._rank_items()
+        try:
+            while True:
+                result = self._take_finished()
+                if result is None:
+                    result = self._handle_result(await loop.run_in_executor(None, self._present_items))
+                if result is not None:
+                    return result
+        finally:
+            if self.running:
+                await asyncio.gather(*(asyncio.wrap_future(f) for f in list(self.running)), return_exceptions=True)
+                self._take_finished()
+            self._loop = None
+            self._save_ranking()
+
+    def display_title(self) -> str:
+        title = super().display_title()
+        if self.running:
+            title = f'{title} ({len(self.running)} running)'
+        return title
+
+    def _pick_item(self, item: PickableBase, idx: int) -> PickedResult:
+        if not (item.blocking or isinstance(item, AsyncPickable)) or self._loop is None:
+            return super()._pick_item(item, idx)
+        self._record_pick(item)
+        # on the menu's thread, hand the action over to the loop and show the menu again
+        future = asyncio.run_coroutine_threadsafe(self._run_action(item), self._loop)
+        self.running[future] = item
+        future.add_done_callback(self._finished.append)
+        self.title = f"{self.base_title} | {item.label} -> running"
+        self.default_index = idx
+        return PickedResult(PickedAction.PICK_AGAIN)
+
+    async def _run_action(self, item: PickableBase) -> PickedResult:
+        try:
+            if isinstance(item, AsyncPickable):
+                result = await item.picked_async()
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self.executor, item.picked)
+        except Exception as e:
+            result = PickedResult(PickedAction.PICK_AGAIN, f'failed: {e!r}')
+        return result
+
+    def _take_finished(self) -> PickedResult | None:
+        """Show the results of actions that finished since the menu was last up. Returns what run() should return
+        if one of them asked to leave this picker."""
+        leave = None
+        done = []
+        while self._finished:
+            future = self._finished.popleft()
+            item = self.running.pop(future)
+            try:
+                result = future.result()
+            except concurrent.futures.CancelledError:
+                result = PickedResult(PickedAction.PICK_AGAIN, 'cancelled')
+            done.append(f"{item.label} -> {result.message}")
+            if leave is None:
+                leave = self._handle_result(result)
+        if done:
+            self.title = f"{self.base_title} | {'; '.join(done)}"
+        return leave
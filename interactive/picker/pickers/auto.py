@@ -5,16 +5,37 @@ from interactive.picker.pickers.tui import TuiItemPicker
 from sink.errors import stub
 from enum import Enum
 
+def display_available() -> bool:
+    """Whether a graphical picker can be shown: PySide6 is installed and there's a display to show it on"""
+    import importlib.util, os, sys
+    if importlib.util.find_spec('PySide6') is None:
+        return False
+    if sys.platform.startswith('linux') or 'bsd' in sys.platform:
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
+
 class AutoItemPicker(ItemPickerBase):
     """A mixed graphical & tui item picker"""
-    def __init__(self, title: str, items: list[PickableBase]):
-        super().__init__(title, items)
-
-        # currently only wraps tui
-        self.inner = TuiItemPicker(title, items)
+    def __init__(self, title: str, items, page_size: int | None = None, backend: str | None = None):
+        """backend is 'qt' or 'tui'. By default it's qt when display_available(), the tui otherwise."""
+        if backend is None:
+            backend = 'qt' if display_available() else 'tui'
+        if backend == 'qt':
+            # only now, Qt takes a while to import
+            from interactive.picker.pickers.qt import QtItemPicker
+            self.inner = QtItemPicker(title, items, page_size)
+        elif backend == 'tui':
+            self.inner = TuiItemPicker(title, items, page_size)
+        else:
+            raise ValueError(f'Unknown picker backend {backend!r}')
+        self.backend = backend
+        # the inner picker reads the source, this one sees the same list of loaded items
+        super().__init__(title, self.inner.items, page_size)
         
     def run(self) -> PickedResult:
+        self.inner.ranking = self.ranking
+        self.inner.path = self.path
         return self.inner.run()
     
     def _present_items(self) -> PickedResult:
-        raise Exception('_present_items on AutoItemPicker shouldn\'t be called, it should delegate to an inner picker instead')
\ No newline at end of file
+        raise Exception('_present_items on AutoItemPicker shouldn\'t be called, it should delegate to an inner picker instead')
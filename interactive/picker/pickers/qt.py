@@ -0,0 +1,136 @@
+from typing import TYPE_CHECKING
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PySide6.QtWidgets import QApplication, QDialog, QLineEdit, QListView, QVBoxLayout
+from interactive.picker.items import PickableBase, PickedAction, PickedResult
+from interactive.picker.pickers import ItemPickerBase
+if TYPE_CHECKING:
+    from interactive.picker.filter import IncrementalFilter
+
+# the application pickers made, if there wasn't one already; kept here so it isn't collected
+_app = None
+
+def _application() -> QApplication:
+    global _app
+    app = QApplication.instance()
+    if app is None:
+        app = _app = QApplication([])
+    return app # type: ignore
+
+class _ItemListModel(QAbstractListModel):
+    """The picker's items as a list model. Views only ask for the rows they show, and more items are loaded from a
+    lazy source through fetchMore() as the view scrolls to the end of what's loaded."""
+    def __init__(self, picker: ItemPickerBase):
+        super().__init__()
+        self.picker = picker
+        # rows shown, so that rows only appear between beginInsertRows and endInsertRows
+        self._count = len(picker.items)
+        # ids of the items matching the filter, None when not filtering
+        self._rows: list[int] | None = None
+        self._filter: 'IncrementalFilter | None' = None
+
+    def item(self, row: int) -> PickableBase:
+        rows, filter = self._rows, self._filter
+        # rows are only set once there is a filter
+        if rows is not None and filter is not None:
+            return filter.index.items[rows[row]]
+        return self.picker.items[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._count if self._rows is None else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
+            return self.item(index.row()).label
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._rows is None and not self.picker.exhausted()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.picker.load_more():
+            self.beginInsertRows(QModelIndex(), self._count, len(self.picker.items) - 1)
+            self._count = len(self.picker.items)
+            self.endInsertRows()
+
+    def set_query(self, query: str):
+        """Show only the items with every word of query in their label, highest weight first"""
+        self.beginResetModel()
+        if query.strip():
+            from interactive.picker.filter import IncrementalFilter, LabelIndex
+            # filter everything, not just what has been scrolled to so far
+            while not self.picker.exhausted():
+                self.picker.load_more()
+            self._count = len(self.picker.items)
+            if self._filter is None:
+                self._filter = IncrementalFilter(LabelIndex())
+            index = self._filter.index
+            if len(index) < len(self.picker.items):
+                index.add(self.picker.items[len(index):])
+            self._rows = self._filter.update_ids(query)
+        else:
+            self._rows = None
+        self.endResetModel()
+
+class QtItemPicker(ItemPickerBase):
+    """A graphical item picker: a filter box over a list view. The view is virtualized, only visible rows are drawn
+    and every row is taken to be as tall as the first, so huge lists cost no more to show than short ones."""
+    def __init__(self, title: str, items, page_size: int | None = None):
+        super().__init__(title, items, page_size)
+        self.base_title = title
+        self.title = title
+        self._dialog: QDialog | None = None
+        self._model: _ItemListModel | None = None
+        self._view: QListView | None = None
+        self._picked: PickableBase | None = None
+
+    def _make_dialog(self) -> QDialog:
+        dialog = QDialog()
+        layout = QVBoxLayout(dialog)
+        query = QLineEdit()
+        query.setPlaceholderText('filter')
+        view = QListView()
+        view.setUniformItemSizes(True)
+        view.setLayoutMode(QListView.LayoutMode.Batched)
+        model = _ItemListModel(self)
+        view.setModel(model)
+        layout.addWidget(query)
+        layout.addWidget(view)
+
+        def pick(index):
+            if index.isValid():
+                self._picked = model.item(index.row())
+                dialog.accept()
+        def pick_current():
+            index = view.currentIndex()
+            pick(index if index.isValid() else model.index(0))
+        def filter_changed(text):
+            model.set_query(text)
+            view.setCurrentIndex(model.index(0))
+        view.activated.connect(pick)
+        query.returnPressed.connect(pick_current)
+        query.textChanged.connect(filter_changed)
+        dialog.resize(480, 640)
+        self._model = model
+        self._view = view
+        return dialog
+
+    def _present_items(self) -> PickedResult:
+        _application()
+        dialog = self._dialog
+        if dialog is None:
+            dialog = self._dialog = self._make_dialog()
+        dialog.setWindowTitle(self.title)
+        self._picked = None
+        dialog.exec()
+        # only set when an item was picked, closing the dialog leaves it None
+        if self._picked is None:
+            return PickedResult(action=PickedAction.PICK_PARENT, message='exited')
+
+        item = self._picked
+        self._record_pick(item)
+        result = item.picked()
+        # if this picker is shown again, update its state with some info
+        self.title = f"{self.base_title} | {item.label} -> {result.message}"
+        return result
@@ -1,4 +1,3 @@
-
 from time import sleep
 from interactive.picker.items import PickedAction, PickedResult
 from interactive.picker.pickers import ItemPickerBase
@@ -6,30 +5,107 @@ from interactive.picker.pickers import ItemPickerBase
 class TuiItemPicker(ItemPickerBase):
     from interactive.picker.items import PickableBase, PickedResult
     """A tui item picker"""
-    def __init__(self, title: str, items: list[PickableBase]):
-        super().__init__(title, items)
+    # shown after the items while there are more items to load
+    more_label = '... more'
+    # shown last once there are more than filter_threshold items, picking it asks for a filter
+    filter_label = '/ filter'
+    filter_threshold = 20
+
+    def __init__(self, title: str, items, page_size: int | None = None):
+        super().__init__(title, items, page_size)
         self.base_title = title
         self.title = title
-        self.items = items
         self.default_index = 0
+        # only items with every word of the query in their label are shown, highest weight first
+        self.query = ''
+        # labels of the items loaded so far, extended as more are loaded rather than rebuilt every time
+        self._options = []
+        # how many of more_label and filter_label are at the end of _options
+        self._extras = 0
+        # the items behind the options, in order
+        self._shown = self.items
+        self._filter = None
 
     def _present_items(self) -> PickedResult:
         return self.run_tui()
 
-    def run_tui(self) -> PickedResult:
+    def options(self) -> list[str]:
+        """Labels to show, followed by more_label if there are more items to load and filter_label if there are
+        enough items to filter"""
+        if self.query:
+            self._shown = self._filtered()
+            options = [x.label for x in self._shown]
+            if not self.exhausted():
+                options.append(self.more_label)
+            options.append(self.filter_label)
+            return options
+
+        self._shown = self.items
+        options = self._options
+        if self._extras:
+            del options[-self._extras:]
+        options.extend(x.label for x in self.items[len(options):])
+        extras = []
+        if not self.exhausted():
+            extras.append(self.more_label)
+        if len(self.items) > self.filter_threshold or not self.exhausted():
+            extras.append(self.filter_label)
+        options.extend(extras)
+        self._extras = len(extras)
+        return options
+
+    def _filtered(self) -> list[PickableBase]:
+        from interactive.picker.filter import IncrementalFilter, LabelIndex
+        if self._filter is None:
+            self._filter = IncrementalFilter(LabelIndex())
+        index = self._filter.index
+        if len(index) < len(self.items):
+            index.add(self.items[len(index):])
+        return self._filter.update(self.query)
+
+    def read_query(self) -> str:
+        """Ask for a new filter, after pick has given the terminal back"""
+        return input(f'filter {self.base_title} (empty to show everything) [{self.query}]: ')
+
+    def display_title(self) -> str:
+        return self.title if not self.query else f'{self.title} | filter: {self.query} ({len(self._shown)} matches)'
+
+    def choose(self, options: list[str], title: str) -> tuple[str | None, int]:
+        """Let the user pick one of options, returning it and its index, or None if they backed out"""
         from pick import pick
-        options = [x.label for x in self.items]
-        selected, idx = pick(options, self.title, multiselect=False, min_selection_count=1, default_index=self.default_index, quit_keys=[ord('q'), 27])
+        return pick(options, title, multiselect=False, min_selection_count=1, default_index=min(self.default_index, len(options) - 1), quit_keys=[ord('q'), 27]) # type: ignore
+
+    def run_tui(self) -> PickedResult:
+        options = self.options()
+        selected, idx = self.choose(options, self.display_title())
 
         if not selected:
             return PickedResult(action=PickedAction.PICK_PARENT, message='exited')
 
+        if selected == self.filter_label and idx >= len(self._shown): # type: ignore
+            self.query = self.read_query().strip()
+            if self.query:
+                # filter everything, not just what has been paged in so far
+                while not self.exhausted():
+                    self.load_more()
+            self.default_index = 0
+            return PickedResult(action=PickedAction.PICK_AGAIN)
+
+        if idx == len(self._shown): # type: ignore
+            # the more entry, show the next page starting from its first item
+            self.default_index = idx
+            self.load_more()
+            return PickedResult(action=PickedAction.PICK_AGAIN)
+
         # print(f'sel: {selected}, idx: {idx}')
         # sleep(3)
-        item = self.items[idx] # type: ignore
+        return self._pick_item(self._shown[idx], idx) # type: ignore
+
+    def _pick_item(self, item: PickableBase, idx: int) -> PickedResult:
+        self._record_pick(item)
         result = item.picked()
 
         # if this picker is shown again, update its state with some info
         self.title = f"{self.base_title} | {item.label} -> {result.message}"
         self.default_index = idx
-        return result
\ No newline at end of file
+        return result
@@ -0,0 +1,192 @@
+import array, bisect, hashlib, mmap, os, struct, sys, tempfile, time
+from typing import Sequence
+from interactive.picker.items import PickableBase
+
+# magic, version, record size, record count
+_HEADER = struct.Struct('<4sHHI')
+_MAGIC = b'PKRK'
+_VERSION = 1
+# key (a hash of picker path and label), times picked, last picked (unix seconds)
+_RECORD = struct.Struct('<QII')
+
+def _lock_exclusive(file):
+    """flock file until it is closed. fcntl is POSIX only; elsewhere saves go unlocked"""
+    try:
+        import fcntl
+    except ImportError:
+        return
+    fcntl.flock(file, fcntl.LOCK_EX)
+
+def default_path() -> str:
+    state = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(state, 'vivlim-scripts', 'picker-ranking.bin')
+
+class RankingStore:
+    """Remembers how often and how recently items were picked, by picker path and label, so pickers can show the
+    usual choices first.
+    The file is a header and fixed size records sorted by key, mmapped; the first lookup reads just the keys out of
+    it to binary search, and only the records found are read. Picks are kept in memory until save(), which merges them into what's
+    on disk then (so pickers in other processes don't lose theirs) and replaces the file in one rename. Saves hold an
+    flock on a .lock file next to it from reading to renaming where there is fcntl, so two of them can't overlap."""
+    def __init__(self, path: str | None = None, half_life: float = 14 * 24 * 3600, max_records: int = 1 << 16):
+        """half_life is how many seconds it takes for a pick to count half as much. Past max_records, the records
+        with the lowest scores are dropped on save."""
+        self.path = path or default_path()
+        self.half_life = half_life
+        self.max_records = max_records
+        # picks since the last save: key -> (times picked, last picked)
+        self._pending: dict[int, tuple[int, int]] = {}
+        self._map = None
+        self._count = 0
+        # the keys of the records in the file, in order, read on the first lookup
+        self._keys: array.array | None = None
+        self._open()
+
+    @staticmethod
+    def key(picker_path: str, label: str) -> int:
+        return RankingStore._path_hash(picker_path)(label)
+
+    @staticmethod
+    def _path_hash(picker_path: str):
+        """key() for labels in picker_path, hashing the path only once"""
+        prefix = hashlib.blake2b(f'{picker_path}\0'.encode(), digest_size=8)
+        def key(label: str) -> int:
+            h = prefix.copy()
+            h.update(label.encode())
+            return int.from_bytes(h.digest(), 'little')
+        return key
+
+    def _open(self):
+        self.close()
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < _HEADER.size:
+                    return
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        magic, version, record_size, count = _HEADER.unpack_from(m, 0)
+        if magic != _MAGIC or version != _VERSION or record_size != _RECORD.size or len(m) < _HEADER.size + count * _RECORD.size:
+            # not ours, or written by some other version; it is replaced on the next save
+            m.close()
+            return
+        self._map = m
+        self._count = count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._count = 0
+            self._keys = None
+
+    def _stored(self, key: int) -> tuple[int, int] | None:
+        keys = self._keys
+        if keys is None:
+            # records are a key then two 32 bit fields, so every other 64 bit word is a key
+            words = array.array('Q', self._map[_HEADER.size:_HEADER.size + self._count * _RECORD.size]) # type: ignore
+            if sys.byteorder != 'little':
+                words.byteswap()
+            keys = self._keys = words[::2]
+        i = bisect.bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return None
+        _, count, last = _RECORD.unpack_from(self._map, _HEADER.size + i * _RECORD.size) # type: ignore
+        return count, last
+
+    def lookup(self, picker_path: str, label: str) -> tuple[int, int] | None:
+        """(times picked, last picked) for an item, None if it never was"""
+        key = self.key(picker_path, label)
+        stored = self._stored(key) if self._map is not None else None
+        pending = self._pending.get(key)
+        if pending is None:
+            return stored
+        if stored is None:
+            return pending
+        return stored[0] + pending[0], max(stored[1], pending[1])
+
+    def _score(self, count: int, last: int, now: float) -> float:
+        return count * 0.5 ** (max(0.0, now - last) / self.half_life)
+
+    def score(self, picker_path: str, label: str, now: float | None = None) -> float:
+        """Times picked, with each pick counting for less the longer ago it was; 0 if it never was"""
+        found = self.lookup(picker_path, label)
+        if found is None:
+            return 0.0
+        return self._score(*found, time.time() if now is None else now)
+
+    def record(self, picker_path: str, label: str, when: float | None = None):
+        """Note that an item was just picked, save() writes it out"""
+        key = self.key(picker_path, label)
+        count, last = self._pending.get(key, (0, 0))
+        self._pending[key] = (count + 1, max(last, int(time.time() if when is None else when)))
+
+    def rank(self, picker_path: str, items: Sequence[PickableBase], now: float | None = None) -> list[PickableBase]:
+        """items with the ones picked before moved to the front, highest score first. Only those get sorted, the
+        rest keep their order."""
+        now = time.time() if now is None else now
+        key = self._path_hash(picker_path)
+        stored = self._stored if self._map is not None else lambda k: None
+        pending = self._pending
+        picked = []
+        rest = []
+        for item in items:
+            k = key(item.label)
+            found = stored(k)
+            p = pending.get(k)
+            if p is not None:
+                found = p if found is None else (found[0] + p[0], max(found[1], p[1]))
+            if found is None:
+                rest.append(item)
+            else:
+                picked.append((self._score(*found, now), item))
+        picked.sort(key=lambda si: si[0], reverse=True)
+        return [item for _, item in picked] + rest
+
+    def save(self):
+        """Merge the picks since the last save into the file"""
+        if not self._pending:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(f'{self.path}.lock', 'wb') as lock:
+            _lock_exclusive(lock)
+            self._save_locked(directory)
+
+    def _save_locked(self, directory: str):
+        # picks other processes saved since this one opened the file count too
+        self._open()
+        merged = dict(self._pending)
+        stored = self._map[_HEADER.size:_HEADER.size + self._count * _RECORD.size] if self._map is not None else b''
+        for key, count, last in _RECORD.iter_unpack(stored):
+            pending = merged.get(key)
+            if pending is not None:
+                merged[key] = (count + pending[0], max(last, pending[1]))
+            else:
+                merged[key] = (count, last)
+        if len(merged) > self.max_records:
+            now = time.time()
+            keep = sorted(merged, key=lambda k: self._score(*merged[k], now), reverse=True)[:self.max_records]
+            merged = {k: merged[k] for k in keep}
+
+        data = bytearray(_HEADER.size + len(merged) * _RECORD.size)
+        _HEADER.pack_into(data, 0, _MAGIC, _VERSION, _RECORD.size, len(merged))
+        offset = _HEADER.size
+        for key in sorted(merged):
+            count, last = merged[key]
+            _RECORD.pack_into(data, offset, key, min(count, 0xffffffff), last)
+            offset += _RECORD.size
+        fd, temp = tempfile.mkstemp(prefix=f'{os.path.basename(self.path)}.', suffix='.tmp', dir=directory)
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+            self.close()
+            os.replace(temp, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp)
+            except FileNotFoundError:
+                pass
+            raise
+        self._pending.clear()
+        self._open()
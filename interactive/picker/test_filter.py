@@ -0,0 +1,68 @@
+import unittest, random, string, time
+
+from interactive.picker.filter import IncrementalFilter, LabelIndex
+from interactive.picker.items import PickableBase, sort_by_weight
+from interactive.picker.pickers.tui import TuiItemPicker
+from sink.unittest import LoggedTestCase
+
+def _brute_force(items: list[PickableBase], query: str) -> list[str]:
+    terms = query.lower().split()
+    return [p.label for p in sort_by_weight(items) if all(t in p.label.lower() for t in terms)]
+
+class TestLabelIndex(LoggedTestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        labels = [''.join(rng.choice('abcdeAB1 -') for _ in range(rng.randint(0, 12))) for _ in range(2000)]
+        items = [PickableBase(label) for label in labels]
+        index = LabelIndex(items[:1000])
+        index.add(items[1000:])
+        for query in ['', 'a', 'A', 'ab', 'abc', 'abcd', 'b a', '1 -', 'e-', 'zz', 'a b c d e', ' ']:
+            with self.subTest(query=query):
+                self.assertListEqual([index.items[i].label for i in index.search(query)], _brute_force(items, query))
+
+    def test_incremental(self):
+        rng = random.Random(2)
+        items = [PickableBase(''.join(rng.choice(string.ascii_lowercase + ' ') for _ in range(16))) for _ in range(5000)]
+        f = IncrementalFilter(LabelIndex(items))
+        # typing, deleting and retyping
+        for query in ['q', 'qu', 'qui', 'qui ', 'qui x', 'qui', 'qu', 'qa', 'q', '', 'zz', 'z']:
+            with self.subTest(query=query):
+                self.assertListEqual([p.label for p in f.update(query)], _brute_force(items, query))
+        # items added after a search show up in the next one
+        f.index.add([PickableBase('zzz new')])
+        self.assertIn('zzz new', [p.label for p in f.update('z')])
+
+    def test_keystroke_latency(self):
+        rng = random.Random(3)
+        alphabet = string.ascii_letters + string.digits + ' -_.'
+        items = [PickableBase(''.join(rng.choice(alphabet) for _ in range(rng.randint(4, 40)))) for _ in range(100_000)]
+        f = IncrementalFilter(LabelIndex(items))
+        f.index.ranked()
+        worst = 0.0
+        for query in ['a', 'ab', 'abc', 'ab', 'a', 'x', 'x1', 'x1 y', 'e', 'e_', '']:
+            start = time.perf_counter()
+            f.update_ids(query)
+            elapsed = time.perf_counter() - start
+            self.logger.info(f'{query!r}: {elapsed * 1000:.2f}ms')
+            worst = max(worst, elapsed)
+        # a frame, with room for slow test machines
+        self.assertLess(worst, 0.05)
+
+class TestTuiFilter(LoggedTestCase):
+    def test_filtered_options(self):
+        items = [PickableBase(f'snapshot {i}') for i in range(30)] + [PickableBase('home'), PickableBase('Home backup')]
+        picker = TuiItemPicker('volumes', items)
+        options = picker.options()
+        self.assertEqual(options[-1], picker.filter_label)
+        picker.query = 'home'
+        # ranked by weight, so the longer label comes first
+        self.assertListEqual(picker.options(), ['Home backup', 'home', picker.filter_label])
+        picker.query = 'snapshot 2'
+        self.assertListEqual(picker.options(), _brute_force(items, 'snapshot 2') + [picker.filter_label])
+        # each word on its own: 2, 12 and 20 to 29
+        self.assertEqual(len(picker.options()), 13)
+        picker.query = ''
+        self.assertListEqual(picker.options(), options)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,14 @@
-import unittest, logging
+import unittest, asyncio, importlib.util, logging, os, sys, time
+from unittest import mock
 from random import shuffle
 
-from interactive.picker.items import PickableBase
+from interactive.picker.builders import build_tree
+from interactive.picker.items import AsyncPickable, PickableBase, PickedAction, PickedResult, label_weight, sort_by_weight
+from interactive.picker.items.nested_picker import NestedPickerPickable
+from interactive.picker.pickers import ItemPickerBase
+from interactive.picker.pickers.async_tui import AsyncTuiItemPicker
+from interactive.picker.pickers.auto import AutoItemPicker
+from interactive.picker.pickers.tui import TuiItemPicker
 from sink.unittest import LoggedTestCase
 
 class TestPickableItems(LoggedTestCase):
@@ -33,6 +40,244 @@ class TestPickableItems(LoggedTestCase):
         for pickable, name in zip(items_sorted_by_weight, sorted_names):
             self.assertEqual(pickable.label, name)
 
+    def test_weight_is_cached_per_label(self):
+        p = PickableBase('hello')
+        w = p.weight()
+        self.assertAlmostEqual(w, 1 + 0.1 * ((4 * (1 - 7 / 26)) + 1) + 0.01 * ((4 * (1 - 4 / 26)) + 1) + 0.001 * ((4 * (1 - 11 / 26)) + 1)
+                         + 0.0001 * ((4 * (1 - 11 / 26)) + 1) + 0.00001 * ((4 * (1 - 14 / 26)) + 1))
+        self.assertIs(p.weight(), w)
+        p.label = 'a'
+        self.assertGreater(p.weight(), w)
+        # digits outweigh letters, whatever script they're in, and everything else only takes up a position
+        self.assertGreater(label_weight('9'), label_weight('a'))
+        self.assertEqual(label_weight('\u0663'), label_weight('3'))
+        self.assertEqual(label_weight('a-b'), label_weight('a b'))
+        self.assertEqual(label_weight('A'), label_weight('a'))
+
+    def test_sort_by_weight_uses_overrides(self):
+        class Pinned(PickableBase):
+            def weight(self):
+                return 100.0
+        items = [PickableBase('a'), Pinned('z'), PickableBase('b')]
+        self.assertListEqual([p.label for p in sort_by_weight(items)], ['z', 'a', 'b'])
+
+
+class _ScriptedPicker(ItemPickerBase):
+    """Picks the items at the given indices in turn instead of asking, then goes back to its parent"""
+    script: list[int] = []
+    shown: list[str] = []
+
+    def _present_items(self) -> PickedResult:
+        self.shown.append(self.title)
+        if not self.script:
+            return PickedResult(PickedAction.PICK_PARENT)
+        return self.items[self.script.pop(0)].picked()
+
+class _Exit(PickableBase):
+    def picked(self) -> PickedResult:
+        return PickedResult(PickedAction.EXIT, self.label)
+
+class TestLazyPickers(LoggedTestCase):
+    def test_generator_source_is_paged(self):
+        produced = []
+        def source():
+            for i in range(25):
+                produced.append(i)
+                yield PickableBase(f'item {i}')
+
+        picker = TuiItemPicker('paged', source(), page_size=10)
+        self.assertListEqual(produced, [])
+        self.assertEqual(picker.load_more(), 10)
+        self.assertEqual(len(produced), 10)
+        options = picker.options()
+        self.assertListEqual(options[-2:], [picker.more_label, picker.filter_label])
+        self.assertEqual(len(options), 12)
+        picker.load_more()
+        picker.load_more()
+        self.assertTrue(picker.exhausted())
+        options = picker.options()
+        self.assertListEqual(options, [f'item {i}' for i in range(25)] + [picker.filter_label])
+
+    def test_async_source(self):
+        async def source():
+            for i in range(5):
+                await asyncio.sleep(0)
+                yield PickableBase(f'async {i}')
+
+        picker = ItemPickerBase('async', source, page_size=2)
+        self.assertEqual(picker.load_more(), 2)
+        self.assertEqual(picker.load_more(None), 2)
+        self.assertEqual(picker.load_more(10), 1)
+        self.assertTrue(picker.exhausted())
+        self.assertListEqual([p.label for p in picker.items], [f'async {i}' for i in range(5)])
+
+    def test_async_source_interrupted_mid_page(self):
+        closed = []
+        async def inner():
+            try:
+                for i in range(10):
+                    yield i
+            finally:
+                closed.append('inner')
+        async def source():
+            async for i in inner():
+                if i == 3:
+                    raise KeyboardInterrupt
+                yield PickableBase(f'async {i}')
+
+        picker = ItemPickerBase('async', source(), page_size=2)
+        self.assertEqual(picker.load_more(), 2)
+        with self.assertRaises(KeyboardInterrupt):
+            picker.load_more()
+        # given up on, and its loop shut down cleanly, which closed the generator it was reading from
+        self.assertTrue(picker.exhausted())
+        self.assertListEqual(closed, ['inner'])
+        self.assertListEqual([p.label for p in picker.items], [f'async {i}' for i in range(3)])
+
+    def test_build_tree_opens_branches_lazily(self):
+        listed = []
+        def list_snapshots():
+            listed.append(True)
+            return (_Exit(f'snapshot {i}') for i in range(1000))
+
+        _ScriptedPicker.shown = []
+        _ScriptedPicker.script = [1, 3]
+        root = build_tree('root', _ScriptedPicker, [
+            PickableBase('hello'),
+            ('snapshots', list_snapshots),
+            ('empty', []),
+        ])
+        self.assertListEqual(listed, [])
+        result = root.run()
+        self.assertEqual(result.action, PickedAction.EXIT)
+        self.assertEqual(result.message, 'snapshot 3')
+        self.assertListEqual(_ScriptedPicker.shown, ['root', 'snapshots'])
+        branch = root.items[1]
+        assert isinstance(branch, NestedPickerPickable)
+        snapshots = branch.inner_picker
+        # only the first page was read
+        self.assertEqual(len(snapshots.items), ItemPickerBase.page_size)
+        self.assertFalse(snapshots.exhausted())
+
+
+class _SlowCoroutine(AsyncPickable):
+    async def picked_async(self) -> PickedResult:
+        await asyncio.sleep(0.3)
+        return PickedResult(PickedAction.PICK_AGAIN, 'scanned')
+
+class _SlowBlocking(PickableBase):
+    blocking = True
+    def picked(self) -> PickedResult:
+        time.sleep(0.3)
+        return PickedResult(PickedAction.PICK_AGAIN, 'encoded')
+
+class _Failing(AsyncPickable):
+    async def picked_async(self) -> PickedResult:
+        raise ValueError('disk gone')
+
+class _ScriptedAsyncPicker(AsyncTuiItemPicker):
+    """Picks the labels in script in turn, None meaning to wait a while before picking the next one"""
+    def __init__(self, *args, script: list[str | None], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.script = script
+        self.seen: list[tuple[float, str]] = []
+
+    def choose(self, options: list[str], title: str) -> tuple[str | None, int]:
+        self.seen.append((time.perf_counter(), title))
+        label = self.script.pop(0)
+        if label is None:
+            time.sleep(0.5)
+            return self.choose(options, title)
+        return label, options.index(label)
+
+class TestAsyncPicker(LoggedTestCase):
+    def test_slow_actions_run_in_the_background(self):
+        # pile isn't a package, its modules import each other as top level modules
+        pile = os.path.join(os.path.dirname(__file__), '..', '..', 'pile')
+        with mock.patch.object(sys, 'path', [pile, *sys.path]):
+            queue_executor = importlib.import_module('queue_executor')
+        qe = queue_executor.QueueExecutor(workers=1)
+        items = [_SlowCoroutine('scan'), _SlowBlocking('encode'), _Failing('broken'), PickableBase('noop'), _Exit('quit')]
+        picker = _ScriptedAsyncPicker('tools', items, executor=qe, script=['scan', 'encode', 'broken', None, 'noop', 'quit'])
+        start = time.perf_counter()
+        result = picker.run()
+        qe.shutdown(wait=True)
+        for when, title in picker.seen:
+            self.logger.info(f'{(when - start) * 1000:.0f}ms: {title}')
+
+        self.assertEqual(result.action, PickedAction.EXIT)
+        self.assertEqual(qe.exec_count, 1)
+        # the menu came back while both slow actions were going
+        when, title = picker.seen[2]
+        self.assertLess(when - start, 0.25)
+        self.assertIn('(2 running)', title)
+        # and shows what they did once they're done
+        last_title = picker.seen[-1][1]
+        self.assertNotIn('running', last_title)
+        # fails straight away, so it may be shown before the others are done
+        self.assertIn('broken -> failed: ValueError', ' '.join(title for _, title in picker.seen[3:]))
+        self.assertIn('scan -> scanned', last_title)
+        self.assertIn('encode -> encoded', last_title)
+
+    def test_exit_from_background_action(self):
+        class _SlowExit(AsyncPickable):
+            async def picked_async(self) -> PickedResult:
+                await asyncio.sleep(0.1)
+                return PickedResult(PickedAction.EXIT, 'done')
+        picker = _ScriptedAsyncPicker('tools', [_SlowExit('finish'), PickableBase('other')], script=['finish', None, 'other', 'other'])
+        result = picker.run()
+        self.assertEqual(result.action, PickedAction.EXIT)
+        self.assertEqual(result.message, 'done')
+        # left once the action had finished, without picking 'other'
+        self.assertListEqual(picker.script, ['other'])
+        # pickers that aren't async wait for it
+        self.assertEqual(_SlowExit('finish').picked().message, 'done')
+
+
+class TestPickerBackends(LoggedTestCase):
+    def test_auto_falls_back_to_tui_when_headless(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DISPLAY', None)
+            os.environ.pop('WAYLAND_DISPLAY', None)
+            with mock.patch.object(sys, 'platform', 'linux'):
+                picker = AutoItemPicker('headless', [PickableBase('a')])
+        self.assertEqual(picker.backend, 'tui')
+        self.assertIsInstance(picker.inner, TuiItemPicker)
+        self.assertIs(picker.items, picker.inner.items)
+        with self.assertRaises(ValueError):
+            AutoItemPicker('nope', [], backend='curses')
+
+    @unittest.skipUnless(importlib.util.find_spec('PySide6'), 'PySide6 is not installed')
+    def test_qt_model_is_lazy_and_filters(self):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from interactive.picker.pickers.qt import QtItemPicker, _application
+        _application()
+        produced = []
+        def source():
+            for i in range(10_000):
+                produced.append(i)
+                yield PickableBase(f'volume {i}')
+        picker = AutoItemPicker('volumes', source(), page_size=100, backend='qt')
+        qt_picker = picker.inner
+        assert isinstance(qt_picker, QtItemPicker)
+        qt_picker.load_more()
+        qt_picker._dialog = qt_picker._make_dialog()
+        model = qt_picker._model
+        assert model is not None
+        self.assertEqual(model.rowCount(), 100)
+        self.assertTrue(model.canFetchMore())
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), 200)
+        self.assertEqual(len(produced), 200)
+        self.assertEqual(model.data(model.index(150)), 'volume 150')
+
+        model.set_query('volume 9999')
+        self.assertEqual(len(produced), 10_000)
+        self.assertEqual(model.item(0).label, 'volume 9999')
+        self.assertFalse(model.canFetchMore())
+        model.set_query('')
+        self.assertEqual(model.rowCount(), 10_000)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,196 @@
+import unittest, os, struct, subprocess, sys, tempfile, threading
+
+from interactive.picker.builders import build_tree
+from interactive.picker.items import PickableBase, PickedAction, PickedResult
+from interactive.picker.pickers import ItemPickerBase
+from interactive.picker.ranking import RankingStore
+from sink.unittest import LoggedTestCase
+
+DAY = 24 * 3600
+
+class _RecordingPicker(ItemPickerBase):
+    """Picks the item with the next label in script, noting what it saw, then goes back to its parent"""
+    script: list[str] = []
+    seen: dict[str, list[str]] = {}
+
+    def _present_items(self) -> PickedResult:
+        self.seen[self.path] = [p.label for p in self.items]
+        if not self.script:
+            return PickedResult(PickedAction.PICK_PARENT)
+        label = self.script.pop(0)
+        item = next(p for p in self.items if p.label == label)
+        self._record_pick(item)
+        return item.picked()
+
+class _Exit(PickableBase):
+    def picked(self) -> PickedResult:
+        return PickedResult(PickedAction.EXIT, self.label)
+
+class TestRankingStore(LoggedTestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'state', 'ranking.bin')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_round_trip(self):
+        store = RankingStore(self.path)
+        self.assertIsNone(store.lookup('root', 'a'))
+        store.record('root', 'a', when=1000)
+        store.record('root', 'a', when=2000)
+        store.record('root/sub', 'a', when=3000)
+        self.assertEqual(store.lookup('root', 'a'), (2, 2000))
+        store.save()
+        store.close()
+
+        with open(self.path, 'rb') as f:
+            magic, _, _, count = struct.unpack('<4sHHI', f.read(12))
+        self.assertEqual((magic, count), (b'PKRK', 2))
+        store = RankingStore(self.path)
+        self.assertEqual(store.lookup('root', 'a'), (2, 2000))
+        self.assertEqual(store.lookup('root/sub', 'a'), (1, 3000))
+        self.assertIsNone(store.lookup('root', 'b'))
+        # picks since opening add to what's on disk
+        store.record('root', 'a', when=2500)
+        self.assertEqual(store.lookup('root', 'a'), (3, 2500))
+        store.close()
+
+    def test_concurrent_saves_merge(self):
+        first = RankingStore(self.path)
+        second = RankingStore(self.path)
+        first.record('root', 'a', when=1000)
+        second.record('root', 'a', when=2000)
+        second.record('root', 'b', when=2000)
+        first.save()
+        second.save()
+        first.close()
+        second.close()
+
+        store = RankingStore(self.path)
+        self.assertEqual(store.lookup('root', 'a'), (2, 2000))
+        self.assertEqual(store.lookup('root', 'b'), (1, 2000))
+        store.close()
+
+    def test_overlapping_saves_keep_every_pick(self):
+        def save_picks(label: str):
+            store = RankingStore(self.path)
+            for i in range(20):
+                store.record('root', label, when=1000 + i)
+                store.save()
+            store.close()
+
+        threads = [threading.Thread(target=save_picks, args=(label,)) for label in 'abcd']
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        store = RankingStore(self.path)
+        for label in 'abcd':
+            self.assertEqual(store.lookup('root', label), (20, 1019))
+        store.close()
+        # no temp files left behind
+        self.assertListEqual(sorted(os.listdir(os.path.dirname(self.path))), ['ranking.bin', 'ranking.bin.lock'])
+
+    def test_unreadable_file_is_replaced(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'something else entirely')
+        store = RankingStore(self.path)
+        self.assertIsNone(store.lookup('root', 'a'))
+        store.record('root', 'a', when=1000)
+        store.save()
+        store.close()
+        store = RankingStore(self.path)
+        self.assertEqual(store.lookup('root', 'a'), (1, 1000))
+        store.close()
+
+    def test_works_without_fcntl(self):
+        # as on Windows: the picker package still imports, and saves just go unlocked
+        script = ('import sys\n'
+                  'sys.modules["fcntl"] = None\n'
+                  'import interactive.picker.builders\n'
+                  'from interactive.picker.ranking import RankingStore\n'
+                  'store = RankingStore(sys.argv[1])\n'
+                  'store.record("root", "a", when=1000)\n'
+                  'store.save()\n')
+        root = os.path.join(os.path.dirname(__file__), '..', '..')
+        subprocess.run([sys.executable, '-c', script, self.path], check=True, cwd=root)
+        store = RankingStore(self.path)
+        self.assertEqual(store.lookup('root', 'a'), (1, 1000))
+        store.close()
+
+    def test_rank_decays_and_keeps_unpicked_order(self):
+        store = RankingStore(self.path, half_life=DAY)
+        now = 100 * DAY
+        # often, but long ago
+        for _ in range(4):
+            store.record('root', 'old', when=now - 10 * DAY)
+        store.record('root', 'recent', when=now - DAY)
+        self.assertAlmostEqual(store.score('root', 'recent', now), 0.5)
+        self.assertAlmostEqual(store.score('root', 'old', now), 4 * 0.5 ** 10)
+
+        items = [PickableBase(l) for l in ['x', 'old', 'y', 'recent', 'z']]
+        ranked = store.rank('root', items, now)
+        self.assertListEqual([p.label for p in ranked], ['recent', 'old', 'x', 'y', 'z'])
+        # the same labels elsewhere in the tree aren't affected
+        self.assertListEqual([p.label for p in store.rank('other', items, now)], ['x', 'old', 'y', 'recent', 'z'])
+        store.close()
+
+    def test_save_prunes_lowest_scores(self):
+        store = RankingStore(self.path, max_records=2)
+        store.record('root', 'a')
+        store.record('root', 'b')
+        store.record('root', 'b')
+        store.record('root', 'c', when=1)
+        store.save()
+        self.assertIsNotNone(store.lookup('root', 'a'))
+        self.assertIsNotNone(store.lookup('root', 'b'))
+        self.assertIsNone(store.lookup('root', 'c'))
+        store.close()
+
+    def test_pickers_show_picked_items_first(self):
+        def tree():
+            return [
+                PickableBase('hello'),
+                ('snapshots', lambda: (_Exit(f'snapshot {i}') for i in range(10))),
+                _Exit('quit'),
+            ]
+
+        store = RankingStore(self.path)
+        _RecordingPicker.seen = {}
+        _RecordingPicker.script = ['snapshots', 'snapshot 7']
+        result = build_tree('root', _RecordingPicker, tree(), ranking=store).run()
+        self.assertEqual(result.message, 'snapshot 7')
+        self.assertListEqual(_RecordingPicker.seen['root'], ['hello', 'snapshots', 'quit'])
+        store.close()
+
+        # as if the next time the script is run
+        store = RankingStore(self.path)
+        _RecordingPicker.seen = {}
+        _RecordingPicker.script = ['snapshots', 'snapshot 2']
+        build_tree('root', _RecordingPicker, tree(), ranking=store).run()
+        self.assertListEqual(_RecordingPicker.seen['root'], ['snapshots', 'hello', 'quit'])
+        self.assertListEqual(_RecordingPicker.seen['root/snapshots'][:3], ['snapshot 7', 'snapshot 0', 'snapshot 1'])
+        self.assertEqual(store.lookup('root', 'snapshots')[0], 2) # type: ignore
+        store.close()
+
+    def test_picks_saved_when_picker_is_left(self):
+        path = self.path
+        class _CheckSaved(PickableBase):
+            def picked(self) -> PickedResult:
+                # the pick was noted, but the file isn't written on the way to running the action
+                return PickedResult(PickedAction.EXIT, str(os.path.exists(path)))
+
+        store = RankingStore(self.path)
+        _RecordingPicker.seen = {}
+        _RecordingPicker.script = ['check']
+        result = build_tree('root', _RecordingPicker, [_CheckSaved('check')], ranking=store).run()
+        self.assertEqual(result.message, 'False')
+        store.close()
+        store = RankingStore(self.path)
+        self.assertEqual(store.lookup('root', 'check')[0], 1) # type: ignore
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,411 @@
+import argparse, asyncio, concurrent.futures, datetime, gc, hashlib, json, os, platform, statistics, subprocess, sys, threading, time, tracemalloc
+
+from process_queue_executor import ProcessQueueExecutor
+from queue_executor import ExecQueueFutureFactory, Priority, QueueExecutor
+
+def _percentiles(seconds: list[float]) -> dict:
+    seconds = sorted(seconds)
+    return {
+        'p50_us': statistics.median(seconds) * 1e6,
+        'p90_us': seconds[int(len(seconds) * 0.9)] * 1e6,
+        'p99_us': seconds[int(len(seconds) * 0.99)] * 1e6,
+        'max_us': seconds[-1] * 1e6,
+    }
+
+def _start_executor(mode: str):
+    """An executor with something waiting for work: a QueueExecutor pumped by a thread of our own in the given
+    pump mode, a QueueExecutor with one worker, or a ThreadPoolExecutor with its thread started.
+    Returns the executor and a function that shuts it down"""
+    if mode == 'thread_pool':
+        pool = concurrent.futures.ThreadPoolExecutor(1)
+        pool.submit(int).result()
+        return pool, lambda: pool.shutdown(wait=True)
+    if mode == 'workers':
+        qe = QueueExecutor(workers=1)
+        return qe, lambda: qe.shutdown(wait=True)
+    qe = QueueExecutor()
+    t = threading.Thread(target=getattr(qe, mode))
+    t.start()
+    def stop():
+        qe.shutdown(wait=False)
+        t.join()
+    return qe, stop
+
+def measure_idle_cpu(mode: str, seconds: float = 1.0):
+    """CPU seconds burned per wall second by an executor with nothing queued, see _start_executor for the modes"""
+    executor, stop = _start_executor(mode)
+    time.sleep(0.1) # let the pump settle into its idle state
+
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu_before
+    wall = time.perf_counter() - wall_before
+
+    stop()
+    return cpu / wall
+
+def measure_submit_latency(mode: str, jobs: int = 500, gap: float = 0.001):
+    """Time between submit() and the job starting, with the executor going idle between jobs. The asyncio mode
+    measures call_soon_threadsafe into a loop running on another thread instead"""
+    if mode == 'asyncio':
+        loop = asyncio.new_event_loop()
+        t = threading.Thread(target=loop.run_forever)
+        t.start()
+        def submit():
+            started = concurrent.futures.Future()
+            loop.call_soon_threadsafe(lambda: started.set_result(time.perf_counter()))
+            return started
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            t.join()
+            loop.close()
+    else:
+        executor, stop = _start_executor(mode)
+        submit = lambda: executor.submit(time.perf_counter)
+
+    latencies = []
+    for _ in range(jobs):
+        submitted = time.perf_counter()
+        started = submit().result()
+        latencies.append(started - submitted)
+        time.sleep(gap)
+
+    stop()
+    return _percentiles(latencies)
+
+def measure_sleeping_tasks(tasks: int = 5000, sleep: float = 0.5):
+    """Pump cost of many factory tasks that are all waiting on a future resolved by another loop"""
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever)
+    loop_thread.start()
+
+    factory = ExecQueueFutureFactory(loop)
+    pump = threading.Thread(target=factory.pump_blocking_loop)
+    pump.start()
+
+    finished = []
+    async def sleeper():
+        fut = loop.create_future()
+        loop.call_soon_threadsafe(loop.call_later, sleep, fut.set_result, None)
+        await fut
+        finished.append(None)
+
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    for _ in range(tasks):
+        factory.submit(sleeper())
+    while len(finished) < tasks:
+        time.sleep(0.01)
+    cpu = time.process_time() - cpu_before
+    wall = time.perf_counter() - wall_before
+
+    factory.shutdown(wait=False)
+    pump.join()
+    loop.call_soon_threadsafe(loop.stop)
+    loop_thread.join()
+    loop.close()
+    return {
+        'steps_per_task': factory.exec_count / tasks,
+        'cpu_per_wall_second': cpu / wall,
+    }
+
+def measure_pool_throughput(workers: int, jobs: int = 2000, blob_size: int = 256 * 1024):
+    """run_in_executor jobs per second through a worker pool, for a job that releases the GIL"""
+    qe = QueueExecutor(workers=workers)
+    blob = os.urandom(blob_size)
+
+    async def run_jobs():
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(qe, hashlib.sha256, blob) for _ in range(jobs)))
+
+    started = time.perf_counter()
+    asyncio.run(run_jobs())
+    elapsed = time.perf_counter() - started
+    qe.shutdown(wait=True)
+    return jobs / elapsed
+
+def _sum_of_squares(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+def measure_cpu_bound(executor: QueueExecutor, jobs: int = 64, n: int = 200_000):
+    """run_in_executor jobs per second for pure Python work that holds the GIL"""
+    async def run_jobs():
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, _sum_of_squares, n) for _ in range(jobs)))
+
+    started = time.perf_counter()
+    asyncio.run(run_jobs())
+    elapsed = time.perf_counter() - started
+    executor.shutdown(wait=True)
+    return jobs / elapsed
+
+async def _exec_one_hop_per_step(qe: QueueExecutor, coro):
+    """How exec_on_queue used to drive coroutines: a run_in_executor round trip for every step"""
+    loop = asyncio.get_running_loop()
+    def iterate():
+        try:
+            coro.send(None)
+        except StopIteration:
+            return True
+        return False
+    while not await loop.run_in_executor(qe, iterate):
+        pass
+
+def measure_coroutine_steps(mode: str, steps: int = 20000):
+    """Coroutine steps per second for a coroutine that yields with asyncio.sleep(0) on every step: driven by
+    exec_on_queue, by the old run_in_executor hop per step, by ExecQueueFutureFactory pumped on this thread,
+    or as a plain asyncio task"""
+    async def yielder():
+        for _ in range(steps):
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    if mode == 'factory':
+        factory = ExecQueueFutureFactory()
+        factory.post(yielder())
+        factory.shutdown(wait=True)
+    elif mode == 'asyncio':
+        asyncio.run(yielder())
+    else:
+        qe = QueueExecutor(workers=1)
+        async def run():
+            if mode == 'one_hop_per_step':
+                await _exec_one_hop_per_step(qe, yielder())
+            else:
+                await qe.exec_on_queue(asyncio.get_running_loop(), yielder())
+        asyncio.run(run())
+        qe.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+    return steps / elapsed
+
+def measure_fairness(mode: str, coroutines: int = 100, steps: int = 200):
+    """How evenly coroutines that all yield on every step share the executor, from their step counts at the
+    moment half of all steps have been taken. jain_index is 1.0 when perfectly even and 1/coroutines when one
+    coroutine had it all; finish_spread is the spread of completion times relative to the total run time."""
+    counts = [0] * coroutines
+    finished = [0.0] * coroutines
+    halfway = []
+    total = 0
+    async def worker(i: int):
+        nonlocal total
+        for _ in range(steps):
+            counts[i] += 1
+            total += 1
+            if total == coroutines * steps // 2:
+                halfway.extend(counts)
+            await asyncio.sleep(0)
+        finished[i] = time.perf_counter()
+
+    started = time.perf_counter()
+    if mode == 'factory':
+        factory = ExecQueueFutureFactory()
+        for i in range(coroutines):
+            factory.post(worker(i))
+        factory.shutdown(wait=True)
+    elif mode == 'exec_on_queue':
+        qe = QueueExecutor(workers=1)
+        async def run():
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(qe.exec_on_queue(loop, worker(i)) for i in range(coroutines)))
+        asyncio.run(run())
+        qe.shutdown(wait=True)
+    elif mode == 'asyncio':
+        async def run():
+            await asyncio.gather(*(worker(i) for i in range(coroutines)))
+        asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    return {
+        'jain_index': sum(halfway) ** 2 / (coroutines * sum(c * c for c in halfway)),
+        'min_max_ratio': min(halfway) / max(halfway),
+        'finish_spread': (max(finished) - min(finished)) / elapsed,
+    }
+
+def measure_priority_latency(probe_priority: Priority, backlog: int = 20000, probes: int = 100, gap: float = 0.001):
+    """Submit-to-start latency of probe jobs submitted while a single worker drains a backlog of LOW jobs"""
+    qe = QueueExecutor(workers=1)
+    for _ in range(backlog):
+        qe.submit_prioritized(sum, range(1000), priority=Priority.LOW)
+
+    futures = []
+    for _ in range(probes):
+        futures.append((time.perf_counter(), qe.submit_prioritized(time.perf_counter, priority=probe_priority)))
+        time.sleep(gap)
+    latencies = [f.result() - submitted for submitted, f in futures]
+
+    qe.shutdown(wait=True)
+    return _percentiles(latencies)
+
+def measure_fan_out(mode: str, jobs: int = 50000, stats: bool = False):
+    """Jobs per second for a fan-out of tiny jobs through one worker thread, submitted one call at a time or as
+    a batch, with ThreadPoolExecutor and call_soon_threadsafe into an asyncio loop for comparison"""
+    args = [(i,) for i in range(jobs)]
+    if mode == 'thread_pool':
+        pool = concurrent.futures.ThreadPoolExecutor(1)
+        started = time.perf_counter()
+        concurrent.futures.wait([pool.submit(abs, *a) for a in args])
+        elapsed = time.perf_counter() - started
+        pool.shutdown(wait=True)
+        return jobs / elapsed
+    if mode == 'asyncio':
+        loop = asyncio.new_event_loop()
+        t = threading.Thread(target=loop.run_forever)
+        t.start()
+        done = threading.Event()
+        remaining = jobs
+        def job(i):
+            nonlocal remaining
+            abs(i)
+            remaining -= 1
+            if not remaining:
+                done.set()
+        started = time.perf_counter()
+        for a in args:
+            loop.call_soon_threadsafe(job, *a)
+        done.wait()
+        elapsed = time.perf_counter() - started
+        loop.call_soon_threadsafe(loop.stop)
+        t.join()
+        loop.close()
+        return jobs / elapsed
+
+    qe = QueueExecutor(workers=1, chunk_size=64, stats=stats)
+    started = time.perf_counter()
+    if mode == 'submit':
+        futures = [qe.submit(abs, *a) for a in args]
+        concurrent.futures.wait(futures)
+    elif mode == 'submit_many':
+        concurrent.futures.wait(qe.submit_many(abs, args))
+    elif mode == 'submit_batch':
+        qe.submit_batch(abs, args).result()
+    elif mode == 'post_many':
+        qe.post_many(abs, args)
+        qe.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+    qe.shutdown(wait=True)
+    return jobs / elapsed
+
+async def _noop():
+    pass
+
+def measure_queued_memory(mode: str, tasks: int = 100_000):
+    """Bytes allocated per task left sitting in the queue, including whatever the caller holds on to"""
+    loop = asyncio.new_event_loop()
+    factory = ExecQueueFutureFactory(loop)
+    qe = QueueExecutor()
+    held = []
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if mode == 'factory.submit':
+        held = [factory.submit(_noop()) for _ in range(tasks)]
+    elif mode == 'factory.post':
+        held = [factory.post(_noop()) for _ in range(tasks)]
+    elif mode == 'submit':
+        held = [qe.submit(abs, i) for i in range(tasks)]
+    elif mode == 'post':
+        held = [qe.post(abs, i) for i in range(tasks)]
+    elif mode == 'post_many':
+        held = qe.post_many(abs, [(i,) for i in range(tasks)])
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # the coroutines are never run, close them so they don't warn
+    for task in factory.exec_queue.take_all():
+        task.coro.close()
+    del held
+    loop.close()
+    return used / tasks
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description='Benchmarks for QueueExecutor and ExecQueueFutureFactory')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to PATH as JSON, - for stdout')
+    parser.add_argument('--quick', action='store_true', help='a tenth of the work per benchmark, for a smoke test')
+    args = parser.parse_args(argv)
+    scale = 0.1 if args.quick else 1.0
+    n = lambda count: max(1, int(count * scale))
+    # printed as we go, since a full run takes a while
+    out = sys.stderr if args.json == '-' else sys.stdout
+    results = {}
+
+    results['idle_cpu'] = {}
+    results['submit_latency'] = {}
+    for mode in ['pump_busy_loop', 'pump_blocking_loop', 'workers', 'thread_pool', 'asyncio']:
+        if mode != 'asyncio':
+            results['idle_cpu'][mode] = idle = measure_idle_cpu(mode, seconds=scale)
+            print(f'{mode}: idle cpu {idle:.1%}', file=out)
+        results['submit_latency'][mode] = latency = measure_submit_latency(mode, jobs=n(500))
+        print(f'{mode}: submit-to-run p50 {latency["p50_us"]:.1f}us p99 {latency["p99_us"]:.1f}us', file=out)
+
+    results['fan_out_jobs_per_s'] = {}
+    for mode in ['submit', 'submit_many', 'submit_batch', 'post_many', 'thread_pool', 'asyncio']:
+        results['fan_out_jobs_per_s'][mode] = rate = measure_fan_out(mode, jobs=n(50000))
+        print(f'fan-out via {mode}: {rate:.0f} jobs/s', file=out)
+    results['fan_out_jobs_per_s']['submit_batch+stats'] = rate = measure_fan_out('submit_batch', jobs=n(50000), stats=True)
+    print(f'fan-out via submit_batch with stats: {rate:.0f} jobs/s', file=out)
+
+    results['pool_sha256_jobs_per_s'] = {}
+    for workers in [1, 2, 4, 8]:
+        results['pool_sha256_jobs_per_s'][workers] = rate = measure_pool_throughput(workers, jobs=n(2000))
+        print(f'workers={workers}: {rate:.0f} sha256 jobs/s', file=out)
+
+    cpus = os.cpu_count() or 1
+    results['cpu_bound_jobs_per_s'] = {
+        'threads': measure_cpu_bound(QueueExecutor(workers=cpus), jobs=n(64)),
+        'processes': measure_cpu_bound(ProcessQueueExecutor(processes=cpus), jobs=n(64)),
+    }
+    print(f'cpu-bound jobs on {cpus} cpus: {results["cpu_bound_jobs_per_s"]["threads"]:.1f}/s on threads, '
+          f'{results["cpu_bound_jobs_per_s"]["processes"]:.1f}/s on processes', file=out)
+
+    results['coroutine_steps_per_s'] = {}
+    for mode in ['one_hop_per_step', 'exec_on_queue', 'factory', 'asyncio']:
+        results['coroutine_steps_per_s'][mode] = rate = measure_coroutine_steps(mode, steps=n(20000))
+        print(f'coroutine steps via {mode}: {rate:.0f}/s', file=out)
+
+    results['fairness'] = {}
+    for mode in ['factory', 'exec_on_queue', 'asyncio']:
+        results['fairness'][mode] = fairness = measure_fairness(mode, steps=n(200) * 2)
+        print(f'fairness via {mode}: jain index {fairness["jain_index"]:.3f}, min/max steps {fairness["min_max_ratio"]:.2f}, '
+              f'finish spread {fairness["finish_spread"]:.1%}', file=out)
+
+    results['priority_latency'] = {}
+    for priority in [Priority.LOW, Priority.HIGH]:
+        results['priority_latency'][priority.name] = latency = measure_priority_latency(priority, backlog=n(20000), probes=n(100))
+        print(f'{priority.name} probes behind a LOW backlog: p50 {latency["p50_us"]:.1f}us p99 {latency["p99_us"]:.1f}us', file=out)
+
+    results['queued_bytes_per_task'] = {}
+    for mode in ['factory.submit', 'factory.post', 'submit', 'post', 'post_many']:
+        results['queued_bytes_per_task'][mode] = size = measure_queued_memory(mode, tasks=n(100_000))
+        print(f'queued via {mode}: {size:.0f} bytes per task', file=out)
+
+    results['sleeping_tasks'] = sleeping = measure_sleeping_tasks(tasks=n(5000), sleep=0.5 * scale)
+    print(f'sleeping tasks: {sleeping["steps_per_task"]:.1f} pump steps per task, cpu {sleeping["cpu_per_wall_second"]:.1%} while waiting', file=out)
+
+    if args.json:
+        report = {
+            'commit': _git_commit(),
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': cpus,
+            'quick': args.quick,
+            'results': results,
+        }
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
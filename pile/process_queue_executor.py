@@ -0,0 +1,262 @@
+import array, concurrent.futures, functools, multiprocessing, os, pickle, queue, threading, time, typing
+from multiprocessing import shared_memory
+
+from queue_executor import _TIMER_CHECK, _WAKEUP, _pass_wakeup_along, OverflowPolicy, QueueExecutor
+
+# buffers that are worth a shared memory block once they are big enough; numpy arrays are recognised by __array_interface__
+_SHAREABLE = (bytes, bytearray, memoryview, array.array)
+
+class _SharedArg:
+    """Stands in for a large buffer argument that was copied into a shared memory block"""
+    __slots__ = ('name', 'nbytes', 'format', 'shape')
+
+    def __init__(self, name: str, nbytes: int, format: str, shape: tuple):
+        self.name = name
+        self.nbytes = nbytes
+        self.format = format
+        self.shape = shape
+
+def _share(value, threshold: int, blocks: list):
+    """Copy value into a new shared memory block if it is a big enough buffer, returning what to pickle in its place"""
+    if not (isinstance(value, _SHAREABLE) or hasattr(value, '__array_interface__')):
+        return value
+    view = memoryview(value)
+    # cast() only handles native single character formats
+    if view.nbytes < threshold or not view.c_contiguous or len(view.format) != 1:
+        return value
+    block = shared_memory.SharedMemory(create=True, size=view.nbytes)
+    blocks.append(block)
+    _block_buffer(block)[:view.nbytes] = view.cast('B')
+    return _SharedArg(block.name, view.nbytes, view.format, view.shape or ())
+
+def _block_buffer(block: shared_memory.SharedMemory) -> memoryview:
+    buf = block.buf
+    if buf is None:
+        raise ValueError(f'shared memory block {block.name} is closed')
+    return buf
+
+def _release_blocks(blocks: list):
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+def _attach(value, attached: list):
+    """In the worker, turn a _SharedArg back into a memoryview over its block"""
+    if not isinstance(value, _SharedArg):
+        return value
+    block = shared_memory.SharedMemory(value.name)
+    raw = _block_buffer(block)[:value.nbytes]
+    # checked to be a single character native format in _share
+    view = raw.cast(typing.cast(typing.Any, value.format), value.shape)
+    attached.append((block, raw, view))
+    return view
+
+def _detach(attached: list):
+    for block, raw, view in attached:
+        try:
+            view.release()
+            raw.release()
+            block.close()
+        except BufferError:
+            # the callable kept a reference to the view, the mapping goes away with the process instead
+            pass
+
+def _run_pickled_calls(payloads: list[bytes]) -> list[bytes]:
+    """Runs in a worker process. Each call is unpickled, run and its outcome pickled on its own, so one bad call
+    doesn't take the rest of the chunk down with it"""
+    outcomes = []
+    for payload in payloads:
+        attached = []
+        try:
+            fn, args, kwargs = pickle.loads(payload)
+            args = [_attach(a, attached) for a in args]
+            kwargs = {k: _attach(v, attached) for k, v in kwargs.items()}
+            outcome = (fn(*args, **kwargs), None)
+        except Exception as e:
+            outcome = (None, e)
+        finally:
+            args = kwargs = None
+            _detach(attached)
+        try:
+            outcomes.append(pickle.dumps(outcome, pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            result, exc = outcome
+            what = f'{type(exc).__name__}: {exc}' if exc is not None else f'result {type(result).__name__}'
+            outcomes.append(pickle.dumps((None, RuntimeError(f'{what} could not be pickled: {e}'))))
+    return outcomes
+
+class _Chunk:
+    """Jobs pickled for a single trip to a worker process"""
+    __slots__ = ('jobs', 'payloads', 'started', 'nbytes', 'blocks')
+
+    def __init__(self):
+        self.jobs = []
+        self.payloads = []
+        self.started = []
+        self.nbytes = 0
+        self.blocks = []
+
+class ProcessQueueExecutor(QueueExecutor):
+    """QueueExecutor whose jobs run in a pool of worker processes, for CPU-bound callables that the GIL would
+    otherwise serialize. Submitting, priorities, deadlines, capacity and counters work as in QueueExecutor; a
+    dispatcher thread takes jobs off exec_queue and ships them to the pool in pickled chunks."""
+    processes: int
+    chunk_bytes: int
+    shm_threshold: int | None
+    # trips to the pool, and bytes that went through shared memory instead of a pipe
+    chunk_count: int
+    shared_bytes: int
+
+    def __init__(self, processes: int | None = None, start_method: str | None = None, chunk_size: int = 16,
+                 chunk_bytes: int = 64 * 1024, shm_threshold: int | None = None, max_in_flight: int | None = None,
+                 capacity: int | None = None, overflow: OverflowPolicy = OverflowPolicy.BLOCK, stats: bool = False):
+        """processes defaults to os.cpu_count(). start_method is a multiprocessing start method ('fork', 'spawn' or
+        'forkserver'). If None, it is 'forkserver' where there is one and the platform default otherwise; not 'fork',
+        since the pool starts its processes from the dispatcher thread, and forking a process with threads can
+        deadlock the child.
+        Jobs are pickled one at a time as they are dispatched, so one that can't be pickled fails on its own, and up
+        to chunk_size of them totalling at most chunk_bytes go to a worker process in one trip.
+        With shm_threshold set, bytes-like arguments (bytes, bytearray, memoryview, array.array, numpy arrays) of at
+        least that many bytes are passed through shared memory instead. They arrive in the worker as a memoryview with
+        the same format and shape, which is only valid during the call, so the callable has to be written for that.
+        Off by default, so every argument arrives as a pickled copy of what was passed.
+        At most max_in_flight chunks (two per process by default) are handed to the pool at once, the rest wait in
+        exec_queue where priorities still apply."""
+        super().__init__(capacity=capacity, overflow=overflow, chunk_size=chunk_size, stats=stats)
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_bytes = chunk_bytes
+        self.shm_threshold = shm_threshold
+        self.chunk_count = 0
+        self.shared_bytes = 0
+        if start_method is None and 'forkserver' in multiprocessing.get_all_start_methods():
+            start_method = 'forkserver'
+        self._pool = concurrent.futures.ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context(start_method))
+        self._in_flight = threading.Semaphore(max_in_flight or 2 * self.processes)
+        # chunks finish on the pool's management thread while the dispatcher fails unpicklable jobs
+        self._count_lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._dispatch, name='ProcessQueueExecutor-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    async def exec_on_queue(self, loop, coro, priority=None):
+        coro.close()
+        raise TypeError('coroutines cannot be sent to a worker process, use a QueueExecutor for exec_on_queue')
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        super().shutdown(wait=False, cancel_futures=cancel_futures)
+        if wait and threading.current_thread() is not self._dispatcher:
+            self._dispatcher.join()
+
+    def snapshot(self) -> dict:
+        snap = super().snapshot()
+        snap['processes'] = self.processes
+        snap['chunk_count'] = self.chunk_count
+        snap['shared_bytes'] = self.shared_bytes
+        return snap
+
+    def _dispatch(self):
+        self.pump_blocking_loop()
+        # everything queued has been handed to the pool by now
+        self._pool.shutdown(wait=True, cancel_futures=self.cancelling)
+
+    def pump_single(self, block: bool = False, timeout: float | None = None):
+        """Hand some queued jobs to the pool. Returns False when pumping should cease."""
+        if self.cancelling:
+            return False
+        if self._timers:
+            next_timer = self._fire_due_timers()
+            if block and next_timer is not None and (timeout is None or next_timer < timeout):
+                timeout = next_timer
+        try:
+            jobs = self.exec_queue.get_many(self.chunk_size, block, timeout)
+        except queue.Empty:
+            return not self.stopping
+        chunk = _Chunk()
+        for job in jobs:
+            if job is _WAKEUP:
+                self._send(chunk)
+                return _pass_wakeup_along(self.exec_queue) and not self.cancelling
+            if job is _TIMER_CHECK:
+                continue
+            if self.admission and job.admitted:
+                self.admission.release()
+            chunk = self._add_to_chunk(job, chunk)
+        self._send(chunk)
+        return True
+
+    def _add_to_chunk(self, job, chunk: _Chunk) -> _Chunk:
+        """Pickle job into chunk, sending chunk off first if job would take it over chunk_bytes. Returns the chunk to carry on with"""
+        stats = self.stats
+        started_at = stats.job_dequeued(job) if stats else 0.0
+        if job.deadline is not None:
+            late_by = time.monotonic() - job.deadline
+            if late_by > 0:
+                self.deadline_missed_count += 1
+                job.expire(late_by)
+                return chunk
+        if not job.begin():
+            return chunk
+        blocks = []
+        try:
+            args = job.args
+            kwargs = getattr(job, 'kwargs', None) or {}
+            if self.shm_threshold is not None:
+                args = tuple(_share(a, self.shm_threshold, blocks) for a in args)
+                kwargs = {k: _share(v, self.shm_threshold, blocks) for k, v in kwargs.items()}
+            payload = pickle.dumps((job.fn, args, kwargs), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            _release_blocks(blocks)
+            self._job_finished(job, started_at, None, e)
+            return chunk
+        self.shared_bytes += sum(block.size for block in blocks)
+
+        if chunk.jobs and chunk.nbytes + len(payload) > self.chunk_bytes:
+            self._send(chunk)
+            chunk = _Chunk()
+        chunk.jobs.append(job)
+        chunk.payloads.append(payload)
+        chunk.started.append(started_at)
+        chunk.nbytes += len(payload)
+        chunk.blocks.extend(blocks)
+        return chunk
+
+    def _send(self, chunk: _Chunk):
+        if not chunk.jobs:
+            return
+        self._in_flight.acquire()
+        try:
+            pool_future = self._pool.submit(_run_pickled_calls, chunk.payloads)
+        except Exception as e:
+            # the pool is broken, e.g. a worker process died
+            self._chunk_finished(chunk, None, e)
+            return
+        self.chunk_count += 1
+        pool_future.add_done_callback(functools.partial(self._pool_future_done, chunk))
+
+    def _pool_future_done(self, chunk: _Chunk, pool_future: concurrent.futures.Future):
+        try:
+            outcomes = pool_future.result()
+        except BaseException as e:
+            self._chunk_finished(chunk, None, e)
+        else:
+            self._chunk_finished(chunk, outcomes, None)
+
+    def _chunk_finished(self, chunk: _Chunk, outcomes: list[bytes] | None, failure: BaseException | None):
+        self._in_flight.release()
+        _release_blocks(chunk.blocks)
+        for i, job in enumerate(chunk.jobs):
+            result, exc = None, failure
+            if outcomes is not None:
+                try:
+                    result, exc = pickle.loads(outcomes[i])
+                except Exception as e:
+                    exc = e
+            self._job_finished(job, chunk.started[i], result, exc)
+
+    def _job_finished(self, job, started_at: float, result, exc: BaseException | None):
+        job.finish(result, exc)
+        if exc is not None:
+            self.recent_errors.append((time.time(), exc))
+        with self._count_lock:
+            self.exec_count += 1
+        if self.stats:
+            self.stats.job_finished(job, started_at)
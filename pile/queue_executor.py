@@ -1,86 +1,907 @@
 from asyncio import AbstractEventLoop, AbstractEventLoopPolicy, CancelledError, SelectorEventLoop, events, futures
 import asyncio
+import collections
 import concurrent.futures
+import contextlib
+import enum
+import functools
+import heapq
+import itertools
 import queue
 import threading
-from typing import Coroutine
+import time
+import traceback
+import typing
+from typing import Callable, Coroutine, Iterable
+
+# Put on an exec queue by shutdown() to wake pumps parked in pump_blocking_loop. Stopping pumps pass it along
+# to each other until the queue has no real work left, then stop.
+_WAKEUP = object()
+# Put on an exec queue when a timer is scheduled ahead of all others, so a blocked pump wakes to reconsider how long to sleep
+_TIMER_CHECK = object()
+
+class Priority(enum.IntEnum):
+    """Submit-time priority class. Lower values run first, and jobs in the same class run in submission order"""
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+class DeadlineExceeded(TimeoutError):
+    """Set on a job's future when its deadline passed before it got to run"""
+
+class _MultiLevelQueue(queue.Queue):
+    """A queue.Queue with one FIFO per Priority, always served from the most urgent non-empty one.
+    Shutdown wakeups and timer checks get a final level of their own, so they always sit behind real work."""
+    def _init(self, maxsize):
+        self.levels = [collections.deque() for _ in range(len(Priority) + 1)]
+
+    def _qsize(self):
+        return sum(len(level) for level in self.levels)
+
+    def _put(self, item):
+        self.levels[len(Priority) if item is _WAKEUP or item is _TIMER_CHECK else item.priority].append(item)
+
+    def _get(self):
+        for level in self.levels:
+            if level:
+                return level.popleft()
+
+    def put_many(self, items: list):
+        """Put several items under a single lock acquisition"""
+        with self.not_full:
+            for item in items:
+                self._put(item)
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify(len(items))
+
+    def get_many(self, max_items: int, block: bool = True, timeout: float | None = None) -> list:
+        """Like get, but takes up to max_items from the most urgent non-empty level under a single lock acquisition"""
+        with self.not_empty:
+            if not block:
+                if not self._qsize():
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._qsize():
+                    self.not_empty.wait()
+            elif timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            else:
+                endtime = time.monotonic() + timeout
+                while not self._qsize():
+                    remaining = endtime - time.monotonic()
+                    if remaining <= 0.0:
+                        raise queue.Empty
+                    self.not_empty.wait(remaining)
+            level = next(level for level in self.levels if level)
+            items = [level.popleft() for _ in range(min(max_items, len(level)))]
+            self.not_full.notify()
+            return items
+
+    def has_work(self) -> bool:
+        with self.mutex:
+            return any(self.levels[:len(Priority)])
+
+    def work_count(self) -> int:
+        """Queued items, not counting shutdown wakeups"""
+        with self.mutex:
+            return sum(len(level) for level in self.levels[:len(Priority)])
+
+    def remove(self, item) -> bool:
+        """Take a particular item out of the queue. Returns False if it wasn't queued"""
+        with self.mutex:
+            try:
+                self.levels[item.priority].remove(item)
+            except ValueError:
+                return False
+            return True
+
+    def take_all(self) -> list:
+        """Remove and return everything queued apart from shutdown wakeups"""
+        with self.mutex:
+            items = []
+            for level in self.levels[:len(Priority)]:
+                items.extend(level)
+                level.clear()
+            return items
+
+    def take_matching(self, matches: Callable[[typing.Any], bool]) -> list:
+        """Remove and return every queued item matches is true for"""
+        with self.mutex:
+            taken = []
+            for level in self.levels[:len(Priority)]:
+                keep = collections.deque()
+                for item in level:
+                    (taken if matches(item) else keep).append(item)
+                if taken:
+                    level.clear()
+                    level.extend(keep)
+            return taken
+
+    def take_least_urgent(self, eligible: Callable[[typing.Any], bool]):
+        """Remove and return the oldest eligible item of the least urgent priority that has one, or None"""
+        with self.mutex:
+            for level in reversed(self.levels[:len(Priority)]):
+                for item in level:
+                    if eligible(item):
+                        level.remove(item)
+                        return item
+        return None
+
+def _pass_wakeup_along(exec_queue: _MultiLevelQueue) -> bool:
+    """Requeue the shutdown wakeup behind any remaining work. Returns True if there was still work queued"""
+    more_work = exec_queue.has_work()
+    exec_queue.put_nowait(_WAKEUP)
+    return more_work
+
+class OverflowPolicy(enum.Enum):
+    """What submit() does when an executor with a capacity is full"""
+    BLOCK = 'block' # wait until there is room
+    BACKPRESSURE = 'backpressure' # raise ExecutorFull carrying a future that resolves once there is room
+    REJECT = 'reject' # raise ExecutorFull
+    SHED_OLDEST = 'shed_oldest' # cancel the oldest queued job to make room, raise ExecutorFull if none is queued
+
+class ExecutorFull(RuntimeError):
+    """Raised by submit() when the executor is at capacity"""
+    def __init__(self, message: str, ready: concurrent.futures.Future | None = None):
+        super().__init__(message)
+        # for OverflowPolicy.BACKPRESSURE, resolves (to None) when it is worth submitting again
+        self.ready = ready
+
+class AdmissionControl:
+    """Counts admitted jobs against a capacity and applies an OverflowPolicy once it is reached"""
+    def __init__(self, capacity: int, policy: OverflowPolicy):
+        if capacity < 1:
+            raise ValueError(f'capacity must be at least 1, got {capacity}')
+        self.capacity = capacity
+        self.policy = policy
+        self.admitted = 0
+        self.closed = False
+        self.blocked_count = 0
+        self.backpressure_count = 0
+        self.rejected_count = 0
+        self.shed_count = 0
+        self._room = threading.Condition()
+        self._ready_waiters: list[concurrent.futures.Future] = []
+
+    def admit(self, shed_oldest: Callable[[], bool]):
+        """Take a slot for a new job. shed_oldest should cancel and drop the oldest queued job, returning False if there was none"""
+        with self._room:
+            if self.admitted < self.capacity:
+                self.admitted += 1
+                return
+            if self.policy == OverflowPolicy.BLOCK:
+                self.blocked_count += 1
+                self._room.wait_for(lambda: self.admitted < self.capacity or self.closed)
+                if self.closed:
+                    raise RuntimeError('cannot schedule new futures after shutdown')
+                self.admitted += 1
+            elif self.policy == OverflowPolicy.BACKPRESSURE:
+                self.backpressure_count += 1
+                ready = concurrent.futures.Future()
+                self._ready_waiters.append(ready)
+                raise ExecutorFull(f'executor is at capacity ({self.capacity})', ready)
+            elif self.policy == OverflowPolicy.REJECT:
+                self.rejected_count += 1
+                raise ExecutorFull(f'executor is at capacity ({self.capacity})')
+            elif self.policy == OverflowPolicy.SHED_OLDEST:
+                # the new job takes over the shed job's slot
+                if not shed_oldest():
+                    # everything admitted is running or parked, there's nothing queued to give up
+                    self.rejected_count += 1
+                    raise ExecutorFull(f'executor is at capacity ({self.capacity}) with nothing queued to shed')
+                self.shed_count += 1
+            else:
+                raise Exception(f'Overflow policy not handled: {self.policy}')
+
+    def admit_many(self, count: int, shed_oldest: Callable[[], bool]) -> int:
+        """Take slots for up to count new jobs, returning how many were taken. Under OverflowPolicy.BLOCK this
+        waits for at least one slot and takes what is free, so the caller can queue those and come back for the
+        rest. Under the other policies it is all or nothing, and a batch bigger than the capacity never fits."""
+        with self._room:
+            if self.policy == OverflowPolicy.BLOCK:
+                if self.admitted >= self.capacity:
+                    self.blocked_count += 1
+                    self._room.wait_for(lambda: self.admitted < self.capacity or self.closed)
+                    if self.closed:
+                        raise RuntimeError('cannot schedule new futures after shutdown')
+                taken = min(count, self.capacity - self.admitted)
+                self.admitted += taken
+                return taken
+            if count > self.capacity:
+                self.rejected_count += 1
+                raise ExecutorFull(f'batch of {count} is bigger than the executor capacity ({self.capacity})')
+            if self.admitted + count <= self.capacity:
+                self.admitted += count
+                return count
+            if self.policy == OverflowPolicy.BACKPRESSURE:
+                self.backpressure_count += 1
+                ready = concurrent.futures.Future()
+                self._ready_waiters.append(ready)
+                raise ExecutorFull(f'executor has no room for a batch of {count} ({self.admitted}/{self.capacity} taken)', ready)
+            elif self.policy == OverflowPolicy.REJECT:
+                self.rejected_count += 1
+                raise ExecutorFull(f'executor has no room for a batch of {count} ({self.admitted}/{self.capacity} taken)')
+            elif self.policy == OverflowPolicy.SHED_OLDEST:
+                # the new jobs take over the shed jobs' slots. Shedding a job of a batch drops the rest of the batch
+                # too, which can give back more than one slot
+                shed = 0
+                while self.capacity - self.admitted + shed < count and shed_oldest():
+                    shed += 1
+                self.shed_count += shed
+                if self.capacity - self.admitted + shed < count:
+                    # what was shed is gone either way, so at least give its slots back
+                    self.admitted -= shed
+                    self._room.notify(shed)
+                    self.rejected_count += 1
+                    raise ExecutorFull(f'executor is at capacity ({self.capacity}) with too little queued to shed for a batch of {count}')
+                self.admitted += count - shed
+                return count
+            else:
+                raise Exception(f'Overflow policy not handled: {self.policy}')
+
+    def release(self):
+        """Give back a slot once its job has left the queue"""
+        with self._room:
+            self.admitted -= 1
+            self._room.notify()
+            self._resolve_ready_waiters()
+
+    def close(self):
+        """Wake everything waiting for room, so they can see the executor shut down"""
+        with self._room:
+            self.closed = True
+            self._room.notify_all()
+            self._resolve_ready_waiters()
+
+    def _resolve_ready_waiters(self):
+        waiters = self._ready_waiters
+        self._ready_waiters = []
+        for w in waiters:
+            w.set_result(None)
+
+class _Histogram:
+    """Counts of durations in power-of-two microsecond buckets"""
+    __slots__ = ('counts',)
+    BUCKETS = 40
 
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+
+    def record(self, seconds: float):
+        self.counts[min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+
+    def percentile_us(self, p: float) -> int | None:
+        """Upper bound of the bucket the p-th percentile (0-100) falls in"""
+        total = sum(self.counts)
+        if not total:
+            return None
+        threshold = total * p / 100
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= threshold:
+                return 1 << i
+        return 1 << (self.BUCKETS - 1)
+
+    def snapshot(self) -> dict:
+        return {
+            'buckets_us': {1 << i: c for i, c in enumerate(self.counts) if c},
+            'p50_us': self.percentile_us(50),
+            'p99_us': self.percentile_us(99),
+        }
+
+class JobTiming(typing.NamedTuple):
+    """When a job was queued, started and finished, as time.perf_counter() values"""
+    label: str
+    enqueued: float
+    started: float
+    finished: float
+
+def _job_label(job) -> str:
+    target = getattr(job, 'fn', None) or getattr(job, 'coro', None)
+    return getattr(target, '__qualname__', None) or type(job).__name__
+
+class ExecutorStats:
+    """Timing instrumentation for an executor, switched on by setting its stats attribute. While that is None the
+    pump only pays for an attribute check per job. Jobs are stamped on enqueue, so ones queued before the stats
+    were attached count from when they started."""
+    def __init__(self, recent_jobs: int = 64):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.queue_wait = _Histogram()
+        self.run_time = _Histogram()
+        self.recent_jobs: collections.deque[JobTiming] = collections.deque(maxlen=recent_jobs)
+
+    def jobs_enqueued(self, jobs: Iterable):
+        now = time.perf_counter()
+        count = 0
+        for job in jobs:
+            job.enqueued_at = now
+            count += 1
+        with self._lock:
+            self.enqueued += count
+            self.max_depth = max(self.max_depth, self.enqueued - self.dequeued - self.dropped)
+
+    def job_dropped(self):
+        """A queued job was removed without running, e.g. shed by AdmissionControl"""
+        with self._lock:
+            self.dropped += 1
+
+    def job_dequeued(self, job) -> float:
+        now = time.perf_counter()
+        with self._lock:
+            self.dequeued += 1
+            self.queue_wait.record(now - getattr(job, 'enqueued_at', now))
+        return now
+
+    def job_finished(self, job, started: float):
+        now = time.perf_counter()
+        with self._lock:
+            self.run_time.record(now - started)
+            self.recent_jobs.append(JobTiming(_job_label(job), getattr(job, 'enqueued_at', started), started, now))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'enqueued': self.enqueued,
+                'max_queue_depth': self.max_depth,
+                'queue_wait': self.queue_wait.snapshot(),
+                'run_time': self.run_time.snapshot(),
+                'recent_jobs': list(self.recent_jobs),
+            }
+
+# guards creating the future of a QueuedTask or ExecJob, which is rare enough to share one lock
+_lazy_future_lock = threading.Lock()
 
 class ExecQueueTask(asyncio.Future):
+    """Future for the outcome of a QueuedTask. Cancelling it cancels the task the way Task.cancel would"""
+    __slots__ = ('task',)
+
+    def __init__(self, task: 'QueuedTask', loop: AbstractEventLoop | None = None):
+        super().__init__(loop=loop)
+        self.task = task
+
+    def cancel(self, msg=None) -> bool:
+        if not self.task.cancel(msg):
+            return False
+        if self.task.cancelled():
+            # taken straight off the queue, so like Future.cancel this is cancelled by the time it returns
+            asyncio.Future.cancel(self, msg)
+        return True
+
+class QueuedTask:
+    """A coroutine queued on an ExecQueueFutureFactory. Slotted and without a future of its own until future() is
+    called, so that very many can be queued"""
+    __slots__ = ('coro', 'priority', 'deadline', 'timeout', 'started', 'timed_out', 'waiting_on', 'wakeup', 'enqueued_at',
+                 '_factory', '_future', '_outcome', '_must_cancel', '_cancel_message')
     coro: Coroutine
-    def __init__(self, coro: Coroutine):
+    priority: Priority
+    # cleared once the task has taken its first step
+    deadline: float | None
+    # seconds from submit() after which the task is cancelled and fails with TimeoutError
+    timeout: float | None
+    started: bool
+    timed_out: bool
+    # the future the coroutine is suspended on while the task is parked
+    waiting_on: asyncio.Future | None
+    # the done callback that brings the task back from being parked
+    wakeup: Callable | None
+
+    def __init__(self, coro: Coroutine, factory: 'ExecQueueFutureFactory', priority: Priority = Priority.NORMAL,
+                 deadline: float | None = None, timeout: float | None = None):
         self.coro = coro
+        self.priority = priority
+        self.deadline = deadline
+        self.timeout = timeout
+        self.started = False
+        self.timed_out = False
+        self.waiting_on = None
+        self.wakeup = None
+        self._factory = factory
+        self._future: ExecQueueTask | None = None
+        # ('result', value), ('exception', exc) or ('cancelled', message) once done
+        self._outcome: tuple[str, object] | None = None
+        self._must_cancel = False
+        self._cancel_message = None
+
+    def future(self) -> ExecQueueTask:
+        """The future for this task's outcome, created the first time it is asked for on the factory's loop, or
+        without one on the loop running in this thread. RuntimeError if there is neither"""
+        with _lazy_future_lock:
+            fut = self._future
+            if fut is not None:
+                return fut
+            fut = self._future = ExecQueueTask(self, self._factory.future_loop())
+        outcome = self._outcome
+        if outcome is not None:
+            # the pump may be settling it at the same time, which is harmless
+            _settle_task_future_threadsafe(fut, outcome)
+        return fut
+
+    def done(self) -> bool:
+        return self._outcome is not None
+
+    def cancelled(self) -> bool:
+        return self._outcome is not None and self._outcome[0] == 'cancelled'
+
+    def cancel(self, msg=None) -> bool:
+        """Like Task.cancel. A task that hasn't started is taken off the queue and cancelled straight away. Otherwise
+        CancelledError is thrown into the coroutine at its next step, and the future it is parked on is cancelled
+        to bring that step about. Returns False if the task was already done."""
+        if self._outcome is not None:
+            return False
+        self._must_cancel = True
+        self._cancel_message = msg
+        self._factory._cancel_task(self)
+        return True
 
-class ExecQueueFutureFactory:
-    exec_queue = queue.Queue()
-    stopping: bool = False
-    cancelling: bool = False
-    exec_count = 0
-    exception_count = 0
-    last_error: str | None = None
-    queue_full_count = 0
-
-    def submit(self, coro: Coroutine, /, *args, **kwargs) -> asyncio.Future:
-        task = ExecQueueTask(coro)
-        self.exec_queue.put_nowait(task)
-        return task
+    def _finish(self, kind: str, value):
+        if self._outcome is not None:
+            return
+        self._outcome = (kind, value)
+        fut = self._future
+        if fut is not None:
+            _settle_task_future_threadsafe(fut, self._outcome)
+
+def _settle_task_future_threadsafe(fut: asyncio.Future, outcome: tuple[str, object]):
+    """Settle fut from whichever thread the task finished on. While its loop is running that has to happen on the
+    loop's thread, or the loop isn't woken up to run the callbacks of whoever awaits it"""
+    loop = fut.get_loop()
+    if loop.is_running() and events._get_running_loop() is not loop:
+        try:
+            loop.call_soon_threadsafe(_settle_task_future, fut, outcome)
+            return
+        except RuntimeError:
+            # closed in the meantime
+            pass
+    _settle_task_future(fut, outcome)
+
+def _settle_task_future(fut: asyncio.Future, outcome: tuple[str, object]):
+    kind, value = outcome
+    try:
+        if kind == 'result':
+            fut.set_result(value)
+        elif kind == 'exception':
+            fut.set_exception(typing.cast(BaseException, value))
+        else:
+            asyncio.Future.cancel(fut, value)
+    except asyncio.InvalidStateError:
+        pass
+    except RuntimeError:
+        # the loop is closed, so its callbacks can't be scheduled; the outcome is set all the same
+        pass
+
+class _ExecQueuePump:
+    """Queue, counters and shutdown state owned by each executor instance. Subclasses implement pump_single"""
+    exec_queue: _MultiLevelQueue
+    stopping: bool
+    cancelling: bool
+    exec_count: int
+    exception_count: int
+    last_error: str | None
+    deadline_missed_count: int
+    # (time.time(), exception) for the latest jobs that failed, whether or not the error reached a future
+    recent_errors: collections.deque[tuple[float, BaseException]]
+    stats: ExecutorStats | None
 
-    def shutdown(self, wait=True, *, cancel_futures=False):
+    def __init__(self):
+        super().__init__()
+        self.exec_queue = _MultiLevelQueue()
+        self.stopping = False
+        self.cancelling = False
+        self.exec_count = 0
+        self.exception_count = 0
+        self.last_error = None
+        self.deadline_missed_count = 0
+        self.recent_errors = collections.deque(maxlen=16)
+        self.stats = None
+        # threads currently inside a pump loop, so shutdown(wait=True) knows who to wait for
+        self._pump_threads: set[threading.Thread] = set()
+        self._pumps_changed = threading.Condition()
+        self.admission: AdmissionControl | None = None
+
+    def pump_single(self, block: bool = False, timeout: float | None = None) -> bool:
+        raise NotImplementedError
+
+    def queue_depth(self) -> int:
+        return self.exec_queue.work_count()
+
+    def snapshot(self) -> dict:
+        """Counters and gauges for this executor, plus timing histograms if stats are attached"""
+        snap = {
+            'exec_count': self.exec_count,
+            'exception_count': self.exception_count,
+            'deadline_missed_count': self.deadline_missed_count,
+            'queue_depth': self.queue_depth(),
+            'recent_errors': list(self.recent_errors),
+            'stopping': self.stopping,
+        }
+        if self.admission:
+            a = self.admission
+            snap['admission'] = {
+                'capacity': a.capacity,
+                'admitted': a.admitted,
+                'blocked_count': a.blocked_count,
+                'backpressure_count': a.backpressure_count,
+                'rejected_count': a.rejected_count,
+                'shed_count': a.shed_count,
+            }
+        if self.stats:
+            snap['stats'] = self.stats.snapshot()
+        return snap
+
+    def _record_error(self, e: BaseException):
+        self.last_error = ''.join(traceback.format_exception(e))
+        self.exception_count += 1
+        self.recent_errors.append((time.time(), e))
+
+    def pump_busy_loop(self):
+        with self._pumping():
+            while self.pump_single():
+                pass
+
+    def pump_blocking_loop(self, timeout: float | None = None):
+        """Like pump_busy_loop, but parks on the queue while it is empty instead of spinning.
+        timeout bounds how long a single wait lasts; shutdown() wakes the pump either way."""
+        with self._pumping():
+            while self.pump_single(block=True, timeout=timeout):
+                pass
+
+    @contextlib.contextmanager
+    def _pumping(self):
+        current = threading.current_thread()
+        with self._pumps_changed:
+            self._pump_threads.add(current)
+        try:
+            yield
+        finally:
+            with self._pumps_changed:
+                self._pump_threads.discard(current)
+                self._pumps_changed.notify_all()
+
+    def _check_accepting(self):
+        if self.stopping:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+
+    def _stop(self, cancel_futures: bool) -> bool:
+        """Flag the executor as stopping. Returns True the first time it is called"""
+        first_shutdown = not self.stopping
         self.stopping = True
         if cancel_futures:
             self.cancelling = True
+        if self.admission:
+            self.admission.close()
+        return first_shutdown
+
+    def _wait_for_pumps(self):
+        """Block until every pump loop has drained the queue and returned. If nothing is pumping, drain it here"""
+        current = threading.current_thread()
+        with self._pumps_changed:
+            if current in self._pump_threads:
+                # shutdown was called from inside a job, waiting on ourselves would never finish
+                return
+            if self._pump_threads:
+                self._pumps_changed.wait_for(lambda: not self._pump_threads)
+                return
+        self.pump_blocking_loop()
+
+class ExecQueueFutureFactory(_ExecQueuePump):
+    # tasks suspended on a future are off the queue; park_count - resume_count of them are still waiting
+    park_count: int
+    resume_count: int
+    timeout_count: int
+    loop: AbstractEventLoop | None
+
+    def __init__(self, loop: AbstractEventLoop | None = None, capacity: int | None = None, overflow: OverflowPolicy = OverflowPolicy.BLOCK, stats: bool = False):
+        """capacity limits how many submitted tasks may be unfinished at once, whether queued or parked.
+        overflow picks what submit() does when that limit is reached.
+        stats attaches an ExecutorStats, see snapshot()."""
+        super().__init__()
+        if stats:
+            self.stats = ExecutorStats()
+        self.park_count = 0
+        self.resume_count = 0
+        self.timeout_count = 0
+        self.loop = loop
+        if capacity is not None:
+            self.admission = AdmissionControl(capacity, overflow)
+        self._parked: set[QueuedTask] = set()
+        # heap of (due, seq, task) for tasks submitted with a timeout, checked by the pump
+        self._timeouts: list[tuple[float, int, QueuedTask]] = []
+        self._timeouts_lock = threading.Lock()
+        self._timeout_seq = itertools.count()
+        self._timeouts_prune_at = 64
+
+    def submit(self, coro: Coroutine, /, *args, priority: Priority = Priority.NORMAL, deadline: float | None = None,
+               timeout: float | None = None, **kwargs) -> asyncio.Future:
+        """Queue coro to run on the pump. Higher priority tasks are stepped first. If deadline (a time.monotonic()
+        value) passes before the task's first step, it fails with DeadlineExceeded instead of starting.
+        If the task hasn't finished timeout seconds after being submitted, it is cancelled, and fails with
+        TimeoutError once the coroutine has unwound. If it can't be queued (after shutdown, or when full), coro is
+        closed before the error is raised. The future is bound to future_loop(), so without a loop of the factory's
+        own this has to be called from a running one; post() has no such restriction."""
+        try:
+            self.future_loop()
+        except RuntimeError:
+            coro.close()
+            raise
+        task = self._new_task(coro, priority, deadline, timeout)
+        # created before queueing, so the pump never has to settle it after the fact
+        fut = task.future()
+        self._queue_new(task)
+        return fut
+
+    def future_loop(self) -> AbstractEventLoop:
+        """The loop futures of tasks are created on: the factory's own, or else the one running in this thread"""
+        loop = self.loop or events._get_running_loop()
+        if loop is None:
+            raise RuntimeError('ExecQueueFutureFactory has no loop to create futures on; pass one in, or ask from a running loop')
+        return loop
+
+    def post(self, coro: Coroutine, /, *, priority: Priority = Priority.NORMAL, deadline: float | None = None,
+             timeout: float | None = None) -> QueuedTask:
+        """Like submit, but returns the QueuedTask without creating a future for it, which is cheaper when queueing
+        very many tasks. Call future() on it to get one later."""
+        task = self._new_task(coro, priority, deadline, timeout)
+        self._queue_new(task)
+        return task
+
+    def _new_task(self, coro: Coroutine, priority: Priority, deadline: float | None, timeout: float | None) -> QueuedTask:
+        try:
+            self._check_accepting()
+            if self.admission:
+                self.admission.admit(self._shed_oldest)
+        except BaseException:
+            # the caller handed coro over, so it is ours to close; otherwise it warns that it was never awaited
+            coro.close()
+            raise
+        return QueuedTask(coro, self, priority, deadline, timeout)
+
+    def _queue_new(self, task: QueuedTask):
+        if task.timeout is not None:
+            self._add_timeout(task, time.monotonic() + task.timeout)
+        self._queue_put(task)
+
+    def _shed_oldest(self) -> bool:
+        # parked tasks aren't in the queue, and ones that were requeued partway through aren't cancelled halfway,
+        # so only tasks that haven't started can be shed
+        victim = self.exec_queue.take_least_urgent(lambda t: not t.started)
+        if victim is None:
+            return False
+        if self.stats:
+            self.stats.job_dropped()
+        # the new task takes over its slot
+        self._abandon(victim, release_slot=False)
+        return True
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """With cancel_futures, every task that hasn't finished is cancelled, whether queued or parked"""
+        if self._stop(cancel_futures):
+            self.exec_queue.put_nowait(_WAKEUP)
+        if cancel_futures:
+            for task in self.exec_queue.take_all():
+                if self.stats:
+                    self.stats.job_dropped()
+                self._abandon(task)
+            for task in list(self._parked):
+                self._abandon_parked(task)
+        if wait:
+            self._wait_for_pumps()
     
-    def pump_busy_loop(self):
-        while self.pump_single():
-            pass
-    
-    def _queue_put(self, t: ExecQueueTask):
+    def _queue_put(self, t: QueuedTask):
+        # capacity is enforced in submit(), this also requeues tasks that were already admitted
+        if self.cancelling:
+            # shutdown(cancel_futures=True) has already swept the queue
+            self._abandon(t)
+            return
+        if self.stats:
+            self.stats.jobs_enqueued((t,))
+        self.exec_queue.put_nowait(t)
+
+    def _cancel_task(self, task: QueuedTask):
+        """Called by QueuedTask.cancel() to get the cancellation to the coroutine promptly"""
+        if not task.started and self.exec_queue.remove(task):
+            if self.stats:
+                self.stats.job_dropped()
+            self._abandon(task)
+            return
+        waiting_on = task.waiting_on
+        if waiting_on is not None:
+            self._cancel_waiting_on(task, waiting_on)
+        # otherwise it is queued or being stepped right now, and the next step throws into it
+
+    def _cancel_waiting_on(self, task: QueuedTask, waiting_on: asyncio.Future):
+        # like Task.cancel, cancel what the task is waiting for; its done callback brings the task back to be thrown into
         try:
-            self.exec_queue.put_nowait(t)
-        except:
-            # task is dropped because queue is full
-            self.queue_full_count += 1
+            waiting_on.get_loop().call_soon_threadsafe(waiting_on.cancel, task._cancel_message)
+        except RuntimeError:
+            # the loop that owns it is closed, so it will never resolve
+            self._resume_parked(task, waiting_on)
 
-    def pump_single(self):
-        """Execute some scheduled work. Returns False when pumping should cease"""
+    def _abandon(self, task: QueuedTask, release_slot: bool = True):
+        """Resolve a task that will not be stepped again as cancelled"""
+        try:
+            task.coro.close()
+        except RuntimeError as e:
+            # the coroutine ignored GeneratorExit
+            self._record_error(e)
+        self._finish_cancelled(task)
+        if release_slot and self.admission:
+            self.admission.release()
+
+    def _abandon_parked(self, task: QueuedTask):
+        try:
+            self._parked.remove(task)
+        except KeyError:
+            # resumed in the meantime
+            return
+        self.resume_count += 1
+        waiting_on, task.waiting_on = task.waiting_on, None
+        wakeup = task.wakeup
+        if waiting_on is not None and wakeup is not None:
+            try:
+                # don't let a future that never resolves keep the task alive
+                waiting_on.get_loop().call_soon_threadsafe(waiting_on.remove_done_callback, wakeup)
+            except RuntimeError:
+                pass
+        self._abandon(task)
+
+    def _finish_cancelled(self, task: QueuedTask):
+        if task.timed_out:
+            task._finish('exception', TimeoutError(f'task did not finish within {task.timeout}s'))
+        else:
+            task._finish('cancelled', task._cancel_message)
+
+    def _add_timeout(self, task: QueuedTask, due: float):
+        with self._timeouts_lock:
+            heap = self._timeouts
+            heapq.heappush(heap, (due, next(self._timeout_seq), task))
+            if len(heap) > self._timeouts_prune_at:
+                # drop finished tasks so a long timeout doesn't keep their results alive
+                heap[:] = [entry for entry in heap if not entry[2].done()]
+                heapq.heapify(heap)
+                self._timeouts_prune_at = max(64, 2 * len(heap))
+
+    def _expire_timeouts(self) -> float | None:
+        """Cancel tasks whose timeout has passed. Returns the seconds until the next one is due, or None"""
+        now = time.monotonic()
+        expired = []
+        with self._timeouts_lock:
+            heap = self._timeouts
+            while heap and (heap[0][0] <= now or heap[0][2].done()):
+                expired.append(heapq.heappop(heap)[2])
+            next_due = heap[0][0] - now if heap else None
+        for task in expired:
+            if not task.done():
+                self.timeout_count += 1
+                task.timed_out = True
+                task.cancel(f'timed out after {task.timeout}s')
+        return next_due
+
+    def snapshot(self) -> dict:
+        snap = super().snapshot()
+        snap['parked'] = self.parked()
+        return snap
+
+    def parked(self) -> int:
+        """Number of tasks currently suspended on a future instead of sitting in the queue"""
+        return self.park_count - self.resume_count
+
+    def _resume_parked(self, task: QueuedTask, awaited: asyncio.Future):
+        # runs on whichever thread resolved the awaited future
+        try:
+            self._parked.remove(task)
+        except KeyError:
+            # already woken up by cancel(), or abandoned by shutdown
+            return
+        task.waiting_on = None
+        self.resume_count += 1
+        self._queue_put(task)
+        if self.stopping:
+            # a stopping pump may have dropped its wakeup while this task was parked
+            self.exec_queue.put_nowait(_WAKEUP)
+
+    def pump_single(self, block: bool = False, timeout: float | None = None):
+        """Execute some scheduled work. Returns False when pumping should cease.
+        If block is set, waits up to timeout seconds (forever if None) for work to arrive."""
         if self.cancelling:
             return False
-        task: ExecQueueTask | None = None
+        if self._timeouts:
+            next_due = self._expire_timeouts()
+            if block and next_due is not None and (timeout is None or next_due < timeout):
+                # come back in time to expire the next one
+                timeout = next_due
+        task: QueuedTask | None = None
         try:
-            task = self.exec_queue.get_nowait()
+            task = self.exec_queue.get(block, timeout)
         except queue.Empty as e:
-            if self.stopping:
+            if self.stopping and not self.parked():
                 return False
             return True
-        if isinstance(task, ExecQueueTask):
+        if task is _WAKEUP:
+            if self.parked() and not self.exec_queue.has_work():
+                # nothing to do until a parked task resumes, which brings a fresh wakeup with it
+                return not self.cancelling
+            return _pass_wakeup_along(self.exec_queue) and not self.cancelling
+        if isinstance(task, QueuedTask):
+            if task.done():
+                # abandoned by shutdown while we were taking it
+                return True
+            stats = self.stats
+            started_at = stats.job_dequeued(task) if stats else 0.0
+            if task.deadline is not None:
+                deadline, task.deadline = task.deadline, None
+                if time.monotonic() > deadline:
+                    self.deadline_missed_count += 1
+                    task.coro.close()
+                    task._finish('exception', DeadlineExceeded(f'deadline passed {time.monotonic() - deadline:.3f}s before the task could start'))
+                    if self.admission:
+                        self.admission.release()
+                    return True
+            task.started = True
+            # the step may also leave the task done by way of _abandon, which gives back its own slot
+            finished = True
             try:
-                if task.cancelled():
-                    result = task.coro.throw(CancelledError())
+                if task._must_cancel:
+                    task._must_cancel = False
+                    result = task.coro.throw(CancelledError(task._cancel_message))
                 else:
                     result = task.coro.send(None)
             except StopIteration as exc:
-                task.set_result(exc.value)
+                if task._must_cancel:
+                    # cancelled during its final step, like Task
+                    self._finish_cancelled(task)
+                else:
+                    task._finish('result', exc.value)
             except CancelledError as e:
-                task.cancel()
+                self._finish_cancelled(task)
             except (KeyboardInterrupt, SystemExit) as exc:
-                task.set_exception(exc)
+                task._finish('exception', exc)
                 raise
             except BaseException as exc:
-                task.set_exception(exc)
+                task._finish('exception', exc)
+                self.recent_errors.append((time.time(), exc))
             else:
                 blocking = getattr(result, '_asyncio_future_blocking', None)
                 if blocking:
-                    if result is task:
+                    if result is task._future:
                         e = RuntimeError(f'Task awaiting itself: {task!r}')
-                        task.set_exception(e)
+                        task._finish('exception', e)
                     else:
-                        # it's blocked on something but i'm just going to stick it back in the queue and hope that works.
-                        self._queue_put(task)
+                        # park it off the queue; the done callback puts it back once the future resolves
+                        finished = False
+                        result._asyncio_future_blocking = False
+                        self.park_count += 1
+                        task.waiting_on = result
+                        task.wakeup = functools.partial(self._resume_parked, task)
+                        self._parked.add(task)
+                        try:
+                            # on the loop that owns the future, which may be resolving it right now
+                            result.get_loop().call_soon_threadsafe(result.add_done_callback, task.wakeup)
+                        except RuntimeError:
+                            # that loop is closed, so the future will never resolve
+                            self._abandon_parked(task)
+                        else:
+                            if self.cancelling:
+                                # shutdown(cancel_futures=True) has already swept the parked tasks
+                                self._abandon_parked(task)
+                            elif task._must_cancel:
+                                # cancelled while it was being stepped
+                                self._cancel_waiting_on(task, result)
 
                 else:
                     if result is None:
                         # task is relinquishing control, add it at the back of the queue
+                        finished = False
                         self._queue_put(task)
+                    else:
+                        task._finish('exception', RuntimeError(f'Task got bad yield: {result!r}'))
+
+            if self.admission and finished:
+                self.admission.release()
                 
             # except:
             #     import traceback
@@ -89,55 +910,540 @@ class ExecQueueFutureFactory:
             #     self.exception_count += 1
 
             self.exec_count += 1
+            if stats:
+                stats.job_finished(task, started_at)
         return True
 
-class QueueExecutor(concurrent.futures.Executor):
-    exec_queue = queue.Queue()
-    stopping: bool = False
-    cancelling: bool = False
-    exec_count = 0
-    exception_count = 0
-    last_error: str | None = None
-    loop: AbstractEventLoop | None
+# ExecJob states
+_PENDING, _RUNNING, _FINISHED, _CANCELLED = range(4)
+
+class ExecJob:
+    """A call queued on a QueueExecutor. The concurrent.futures.Future for its outcome, which costs several times
+    more than the job itself, is only created when future() is first called"""
+    __slots__ = ('fn', 'args', 'kwargs', 'priority', 'deadline', 'enqueued_at', '_future', '_state', '_outcome')
+    # holds an AdmissionControl slot while queued
+    admitted = True
+
+    def __init__(self, fn, args, kwargs, priority: Priority = Priority.NORMAL, deadline: float | None = None,
+                 future: concurrent.futures.Future | None = None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.deadline = deadline
+        self._future = future
+        self._state = _PENDING
+        # (result, exception) once finished
+        self._outcome: tuple[object, BaseException | None] | None = None
+
+    def future(self) -> concurrent.futures.Future:
+        with _lazy_future_lock:
+            fut = self._future
+            if fut is not None:
+                return fut
+            fut = self._future = concurrent.futures.Future()
+        # the job may be starting or finishing on a pump right now; whichever side gets to the future second
+        # finds it already in that state, which both sides tolerate
+        state = self._state
+        if state == _CANCELLED:
+            fut.cancel()
+        elif state != _PENDING:
+            _mark_running(fut)
+            outcome = self._outcome
+            if state == _FINISHED and outcome is not None:
+                _settle_future(fut, *outcome)
+        return fut
+
+    def done(self) -> bool:
+        return self._state >= _FINISHED
+
+    def __call__(self):
+        if not self.begin():
+            return
+        try:
+            ret = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.finish(None, e)
+            # handed back so the executor can keep it in recent_errors
+            return e
+        except BaseException as e:
+            # CancelledError, SystemExit and the like carry on up, but not before the future has them
+            self.finish(None, e)
+            raise
+        self.finish(ret, None)
+
+    def begin(self) -> bool:
+        """For running the call elsewhere: False if it was cancelled, otherwise marks it as running"""
+        if self._state != _PENDING:
+            return False
+        self._state = _RUNNING
+        fut = self._future
+        if fut is not None and not _mark_running(fut):
+            self._state = _CANCELLED
+            return False
+        return True
 
-    def __init__(self):
-        super().__init__()
-        self.loop = None
+    def finish(self, result, exc: BaseException | None):
+        self._outcome = (result, exc)
+        self._state = _FINISHED
+        fut = self._future
+        if fut is not None:
+            _settle_future(fut, result, exc)
+
+    def cancel(self) -> bool:
+        # going through a future keeps this from racing a pump that is starting the job
+        if self.future().cancel():
+            self._state = _CANCELLED
+            return True
+        return False
 
-    async def exec_on_queue(self, loop: AbstractEventLoop, coro: Coroutine):
-        if not self.loop:
-            self.loop = loop
+    def expire(self, late_by: float):
+        if self.begin():
+            self.finish(None, DeadlineExceeded(f'deadline passed {late_by:.3f}s before the job could start'))
+
+def _mark_running(fut: concurrent.futures.Future) -> bool:
+    try:
+        return fut.set_running_or_notify_cancel()
+    except RuntimeError:
+        # already running
+        return True
+
+def _settle_future(fut: concurrent.futures.Future, result, exc: BaseException | None):
+    try:
+        if exc is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(exc)
+    except concurrent.futures.InvalidStateError:
+        pass
+
+class _Batch:
+    """Shared state for the jobs of one submit_batch call, which all report into a single future"""
+    __slots__ = ('future', 'results', 'size', 'finished')
+
+    def __init__(self, size: int):
+        self.future = concurrent.futures.Future()
+        self.results = [None] * size
+        self.size = size
+        # next() on a count is atomic, so exactly one job sees itself finish last
+        self.finished = itertools.count(1)
+        if size == 0:
+            self.future.set_result(self.results)
+
+    def job_done(self):
+        if next(self.finished) == self.size:
+            self._settle(self.future.set_result, self.results)
+
+    def fail(self, exc: BaseException):
+        self._settle(self.future.set_exception, exc)
+
+    def _settle(self, setter, value):
+        try:
+            setter(value)
+        except concurrent.futures.InvalidStateError:
+            # already cancelled, or another job failed first
+            pass
+
+class _BatchJob:
+    """One call of a submit_batch, which stores its result in the batch instead of a future of its own"""
+    __slots__ = ('fn', 'args', 'batch', 'index', 'priority', 'deadline', 'enqueued_at')
+    admitted = True
+
+    def __init__(self, fn, args: tuple, batch: _Batch, index: int, priority: Priority, deadline: float | None):
+        self.fn = fn
+        self.args = args
+        self.batch = batch
+        self.index = index
+        self.priority = priority
+        self.deadline = deadline
+
+    def __call__(self):
+        batch = self.batch
+        if batch.future.done():
+            # cancelled, or a sibling already failed
+            return
+        try:
+            batch.results[self.index] = self.fn(*self.args)
+        except Exception as e:
+            batch.fail(e)
+            return e
+        except BaseException as e:
+            batch.fail(e)
+            raise
+        batch.job_done()
+
+    def begin(self) -> bool:
+        # cancelled, or a sibling already failed
+        return not self.batch.future.done()
+
+    def finish(self, result, exc: BaseException | None):
+        if exc is None:
+            self.batch.results[self.index] = result
+            self.batch.job_done()
+        else:
+            self.batch.fail(exc)
+
+    def cancel(self):
+        self.batch.future.cancel()
+
+    def expire(self, late_by: float):
+        self.batch.fail(DeadlineExceeded(f'deadline passed {late_by:.3f}s before a job of the batch could start'))
+
+class _ForwardedHandle:
+    """Handle for a callback that was forwarded to a loop on another thread. Cancelling is forwarded too"""
+    __slots__ = ('_loop', '_handle', '_cancelled')
+
+    def __init__(self, loop: AbstractEventLoop):
+        self._loop = loop
+        self._handle: asyncio.Handle | None = None
+        self._cancelled = False
+
+    def _schedule(self, when: float | None, callback, args, context):
+        # runs on the loop's thread
+        if self._cancelled:
+            return
+        if when is None:
+            self._handle = self._loop.call_soon(callback, *args, context=context)
+        else:
+            self._handle = self._loop.call_at(when, callback, *args, context=context)
+
+    def _cancel_scheduled(self):
+        if self._handle:
+            self._handle.cancel()
+
+    def cancel(self):
+        self._cancelled = True
+        self._loop.call_soon_threadsafe(self._cancel_scheduled)
+
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+class _PumpThreadLoop:
+    """Stands in as the running loop while a coroutine steps on a pump thread, so things like asyncio.sleep work.
+    Scheduling calls are forwarded to the owning loop thread-safely, everything else goes straight to it."""
+    def __init__(self, loop: AbstractEventLoop):
+        self._loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self._loop, name)
+
+    def call_soon(self, callback, *args, context=None):
+        return self._forward(None, callback, args, context)
+
+    def call_later(self, delay, callback, *args, context=None):
+        return self._forward(self._loop.time() + delay, callback, args, context)
+
+    def call_at(self, when, callback, *args, context=None):
+        return self._forward(when, callback, args, context)
+
+    def _forward(self, when: float | None, callback, args, context):
+        handle = _ForwardedHandle(self._loop)
+        self._loop.call_soon_threadsafe(handle._schedule, when, callback, args, context)
+        return handle
+
+def _finish_on_loop(done: asyncio.Future, value, exc: BaseException | None):
+    if done.done():
+        return
+    if exc is None:
+        done.set_result(value)
+    elif isinstance(exc, CancelledError):
+        done.cancel()
+    else:
+        done.set_exception(exc)
+
+class _CoroutineDriver:
+    """Runs a coroutine on a QueueExecutor pump for as long as it can make progress. When it blocks on a future,
+    the driver is queued again by that future's done callback, and the final result lands in done on the owning loop."""
+    __slots__ = ('executor', 'loop', 'pump_loop', 'coro', 'done', 'waiting_on', 'throw_next', 'priority', 'enqueued_at')
+    # steps are queued by the driver itself, not by submit, so they don't take AdmissionControl slots
+    admitted = False
+    deadline = None
+
+    def __init__(self, executor: 'QueueExecutor', loop: AbstractEventLoop, coro: Coroutine, priority: Priority = Priority.NORMAL):
+        self.executor = executor
+        self.priority = priority
+        self.loop = loop
+        self.pump_loop = _PumpThreadLoop(loop)
+        self.coro = coro
+        self.done: asyncio.Future = loop.create_future()
+        self.done.add_done_callback(self._done_changed)
+        self.waiting_on: asyncio.Future | None = None
+        # thrown into the coroutine instead of resuming it normally on the next step
+        self.throw_next: BaseException | None = None
+
+    def __call__(self):
+        # runs on the pump thread
+        previous_loop = events._get_running_loop()
+        events._set_running_loop(self.pump_loop) # type: ignore
+        try:
+            self._run()
+        finally:
+            events._set_running_loop(previous_loop)
 
-        def iterate():
+    def _run(self):
+        while True:
             try:
-                result = coro.send(None)
+                exc, self.throw_next = self.throw_next, None
+                if exc is not None:
+                    result = self.coro.throw(exc)
+                else:
+                    result = self.coro.send(None)
             except StopIteration as exc:
-                return {'status': 'done', 'value': exc.value}
-            except CancelledError as e:
-                # return coro_throw(CancelledError())
-                return {'status': 'cancelled', 'exception': e}
+                self._settle(exc.value, None)
+                return
             except (KeyboardInterrupt, SystemExit) as exc:
-                # await coro_throw(exc)
-                return {'status': 'raised', 'exception': exc}
+                self._settle(None, exc)
+                raise
             except BaseException as exc:
-                # await coro_throw(exc)
-                return {'status': 'raised', 'exception': exc}
+                if not isinstance(exc, CancelledError):
+                    # cancellation is routine, only real failures go in recent_errors
+                    self.executor.recent_errors.append((time.time(), exc))
+                self._settle(None, exc)
+                return
+
+            if getattr(result, '_asyncio_future_blocking', None):
+                # really blocked, hand the wait back to the loop that owns the future
+                result._asyncio_future_blocking = False
+                self.waiting_on = result
+                # parked before the callback can fire, so a stopping executor knows to wait for it
+                self.executor._parked_drivers.add(self)
+                try:
+                    result.get_loop().call_soon_threadsafe(result.add_done_callback, self._resume)
+                except RuntimeError as e:
+                    # that loop is closed, so the future will never resolve
+                    self.executor._parked_drivers.discard(self)
+                    self.waiting_on = None
+                    self.throw_next = e
+                    continue
+                return
+            if result is None:
+                # bare yield (asyncio.sleep(0)), let other queued jobs have a turn first
+                self.executor._enqueue(self)
+                return
+            self.throw_next = RuntimeError(f'coroutine yielded {result!r}, which is not an asyncio future')
+
+    def _resume(self, awaited: asyncio.Future):
+        # runs on the thread of the loop that owns awaited
+        self.waiting_on = None
+        if not self.executor._resume_driver(self):
+            # the executor was shut down, and nothing is left to run the rest of the coroutine
+            try:
+                self.coro.close()
+            except RuntimeError as e:
+                self.executor._record_error(e)
+            self._settle(None, RuntimeError('executor was shut down while the coroutine was waiting'))
+
+    def _settle(self, value, exc: BaseException | None):
+        try:
+            self.loop.call_soon_threadsafe(_finish_on_loop, self.done, value, exc)
+        except RuntimeError:
+            # the loop is closed, so nobody is waiting for the result any more
+            pass
+
+    def _done_changed(self, done: asyncio.Future):
+        # runs on the owning loop. If whoever awaits the result gave up, cancel the coroutine too
+        if not done.cancelled():
+            return
+        self.throw_next = CancelledError()
+        waiting_on = self.waiting_on
+        if waiting_on is not None:
+            waiting_on.get_loop().call_soon_threadsafe(waiting_on.cancel)
+
+    def cancel(self):
+        self.coro.close()
+        self._settle(None, CancelledError())
+
+    def abandon(self):
+        """For shutdown(cancel_futures=True): cancel a parked driver now, rather than when its future resolves"""
+        waiting_on = self.waiting_on
+        if waiting_on is None:
+            # already on its way back, and _resume fails it
+            return
+        try:
+            waiting_on.get_loop().call_soon_threadsafe(self._abandon_on_loop, waiting_on)
+        except RuntimeError:
+            # that loop is closed, so the future will never resolve and nobody is waiting for the result
+            self.coro.close()
+
+    def _abandon_on_loop(self, waiting_on: asyncio.Future):
+        # on the future's own loop, so _resume can't run in between; if it was already called, it fails the driver
+        if waiting_on.remove_done_callback(self._resume):
+            self.waiting_on = None
+            self.cancel()
+
+class TimerHandle:
+    """A call scheduled on a QueueExecutor with call_at/call_later/call_every. Once due it is queued like any
+    other job at its priority. Periodic timers are rescheduled when a run finishes."""
+    __slots__ = ('fn', 'args', 'priority', 'when', 'interval', 'missed', 'cancelled', 'enqueued_at', '_executor')
+    # timers don't take AdmissionControl slots, and can't miss a deadline
+    admitted = False
+    deadline = None
+    fn: Callable
+    args: tuple
+    priority: Priority
+    # time.monotonic() at which it is next due
+    when: float
+    interval: float | None
+    # ticks a periodic timer skipped because a run overran them
+    missed: int
+    cancelled: bool
+
+    def __init__(self, executor: 'QueueExecutor', when: float, fn: Callable, args: tuple, priority: Priority, interval: float | None = None):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.when = when
+        self.interval = interval
+        self.missed = 0
+        self.cancelled = False
+        self._executor = executor
+
+    def cancel(self):
+        """Stop the timer. A run that is already underway still finishes"""
+        self.cancelled = True
+
+    def __call__(self):
+        if not self.begin():
+            return
+        try:
+            self.fn(*self.args)
+        finally:
+            self.finish(None, None)
+
+    def begin(self) -> bool:
+        return not self.cancelled
+
+    def finish(self, result, exc: BaseException | None):
+        if self.interval is None or self.cancelled:
+            return
+        # keep to the original schedule, skipping any ticks this run overran
+        self.when += self.interval
+        behind = time.monotonic() - self.when
+        if behind >= 0:
+            skipped = int(behind // self.interval) + 1
+            self.missed += skipped
+            self.when += skipped * self.interval
+        self._executor._schedule_timer(self)
+
+class QueueExecutor(_ExecQueuePump, concurrent.futures.Executor):
+    loop: AbstractEventLoop | None
+
+    def __init__(self, workers: int = 0, capacity: int | None = None, overflow: OverflowPolicy = OverflowPolicy.BLOCK, chunk_size: int = 1, stats: bool = False):
+        """workers > 0 starts that many pump threads owned by the executor, each with a local run queue
+        that the others steal from when they run dry. With the default of 0, nothing is started and the
+        caller pumps exec_queue with pump_single/pump_busy_loop/pump_blocking_loop.
+        capacity limits how many jobs may be queued at once, and overflow picks what submit() does when
+        that limit is reached.
+        chunk_size is how many jobs pump_single takes off exec_queue at once, and how many a worker may
+        carry over when it steals. Bigger chunks cost fewer lock round trips but can delay urgent work.
+        stats attaches an ExecutorStats, see snapshot()."""
+        super().__init__()
+        if stats:
+            self.stats = ExecutorStats()
+        self.loop = None
+        self.chunk_size = chunk_size
+        if capacity is not None:
+            self.admission = AdmissionControl(capacity, overflow)
+        # heap of (when, seq, TimerHandle), checked by the pumps between jobs
+        self._timers: list[tuple[float, int, TimerHandle]] = []
+        self._timers_lock = threading.Lock()
+        self._timer_seq = itertools.count()
+        self.workers = workers
+        # one deque per Priority for each worker
+        self._worker_jobs = [[collections.deque() for _ in Priority] for _ in range(workers)]
+        self._next_worker = itertools.count()
+        self._local = threading.local()
+        # workers park on this when every local queue is empty
+        self._worker_wakeup = threading.Condition()
+        self._idle_workers = 0
+        # exec_on_queue coroutines waiting on a future, which keep pumps and workers going after shutdown() until
+        # they come back and finish
+        self._parked_drivers: set[_CoroutineDriver] = set()
+        self._worker_threads = [
+            threading.Thread(target=self._worker_loop, args=(i,), name=f'QueueExecutor-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._worker_threads:
+            t.start()
+
+    async def exec_on_queue(self, loop: AbstractEventLoop, coro: Coroutine, priority: Priority = Priority.NORMAL):
+        """Run coro on the pump and return its result. It keeps the pump for as long as it can make progress;
+        futures it blocks on are waited for by the loop that owns them."""
+        if not self.loop:
+            self.loop = loop
+        self._check_accepting()
+        driver = _CoroutineDriver(self, loop, coro, priority)
+        self._enqueue(driver)
+        return await driver.done
+
+    def call_at(self, when: float, fn: Callable, /, *args, priority: Priority = Priority.NORMAL) -> TimerHandle:
+        """Queue fn(*args) once time.monotonic() reaches when. Exceptions it raises are counted like those of any
+        job without a future. Timers still pending at shutdown() are dropped."""
+        self._check_accepting()
+        timer = TimerHandle(self, when, fn, args, priority)
+        self._schedule_timer(timer)
+        return timer
+
+    def call_later(self, delay: float, fn: Callable, /, *args, priority: Priority = Priority.NORMAL) -> TimerHandle:
+        """Queue fn(*args) after delay seconds, see call_at"""
+        return self.call_at(time.monotonic() + delay, fn, *args, priority=priority)
+
+    def call_every(self, interval: float, fn: Callable, /, *args, delay: float | None = None, priority: Priority = Priority.NORMAL) -> TimerHandle:
+        """Queue fn(*args) every interval seconds, the first time after delay (interval by default) seconds, until
+        the returned handle is cancelled. Runs never overlap; ticks missed while a run overran are skipped."""
+        self._check_accepting()
+        timer = TimerHandle(self, time.monotonic() + (interval if delay is None else delay), fn, args, priority, interval)
+        self._schedule_timer(timer)
+        return timer
+
+    def _schedule_timer(self, timer: TimerHandle):
+        with self._timers_lock:
+            if self.stopping:
+                return
+            heapq.heappush(self._timers, (timer.when, next(self._timer_seq), timer))
+            earliest = self._timers[0][2] is timer
+        if earliest:
+            # whoever is sleeping was sleeping until a later deadline
+            if self.workers:
+                with self._worker_wakeup:
+                    self._worker_wakeup.notify()
             else:
-                blocking = getattr(result, '_asyncio_future_blocking', None)
-                if blocking:
-                    # wait for whatever
-                    # await blocking
-                    return {'status': 'blocking', 'on': blocking}
-                else:
-                    if result is None:
-                        return {'status': 'yielding'}
+                self.exec_queue.put_nowait(_TIMER_CHECK)
 
-        while True:
-            iter_result = await loop.run_in_executor(self, iterate)
-            print(iter_result)
+    def _fire_due_timers(self) -> float | None:
+        """Queue the timers that are due. Returns the seconds until the next one, or None if there are none"""
+        now = time.monotonic()
+        try:
+            # cheap unlocked peek for the common case
+            first = self._timers[0][0]
+        except IndexError:
+            return None
+        if first > now:
+            return first - now
+        due = []
+        with self._timers_lock:
+            heap = self._timers
+            while heap and heap[0][0] <= now:
+                due.append(heapq.heappop(heap)[2])
+            next_due = heap[0][0] - now if heap else None
+        for timer in due:
+            if not timer.cancelled:
+                self._enqueue(timer)
+        return next_due
+
+    def _next_timer_delay(self) -> float | None:
+        with self._timers_lock:
+            if not self._timers:
+                return None
+            return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _drop_timers(self):
+        with self._timers_lock:
+            for _, _, timer in self._timers:
+                timer.cancelled = True
+            self._timers.clear()
 
     def submit(self, fn, /, *args, **kwargs):
-        future = concurrent.futures.Future()
         """Submits a callable to be executed with the given arguments.
 
         Schedules the callable to be executed as fn(*args, **kwargs) and returns
@@ -146,28 +1452,341 @@ class QueueExecutor(concurrent.futures.Executor):
         Returns:
             A Future representing the given call.
         """
-        def job():
-            if not future.set_running_or_notify_cancel():
-                return
-            try:
-                ret = fn(*args, **kwargs)
-                future.set_result(ret)
-            except Exception as e:
-                future.set_exception(e)
-        
-        self.exec_queue.put_nowait(job)
+        # not through submit_prioritized, so priority= and deadline= keywords reach fn like any others
+        future = concurrent.futures.Future()
+        self._check_accepting()
+        if self.admission:
+            self.admission.admit(self._shed_oldest)
+        self._enqueue(ExecJob(fn, args, kwargs, Priority.NORMAL, None, future))
         return future
 
+    def submit_prioritized(self, fn, /, *args, priority: Priority = Priority.NORMAL, deadline: float | None = None, **kwargs):
+        """Like submit, but queues the call in the given priority class. If deadline (a time.monotonic() value)
+        passes before the call gets to run, its future fails with DeadlineExceeded instead."""
+        future = concurrent.futures.Future()
+        self._check_accepting()
+        if self.admission:
+            self.admission.admit(self._shed_oldest)
+        self._enqueue(ExecJob(fn, args, kwargs, priority, deadline, future))
+        return future
+
+    def post(self, fn, /, *args, priority: Priority = Priority.NORMAL, deadline: float | None = None, **kwargs) -> ExecJob:
+        """Like submit_prioritized, but returns the ExecJob without creating a future for it, which is much cheaper
+        when queueing very many calls. Call future() on it to get one later."""
+        self._check_accepting()
+        if self.admission:
+            self.admission.admit(self._shed_oldest)
+        job = ExecJob(fn, args, kwargs, priority, deadline)
+        self._enqueue(job)
+        return job
+
+    def post_many(self, fn, arg_tuples: Iterable[tuple], *, priority: Priority = Priority.NORMAL, deadline: float | None = None) -> list[ExecJob]:
+        """submit_many without the futures, see post()"""
+        self._check_accepting()
+        no_kwargs = {}
+        jobs = [ExecJob(fn, args, no_kwargs, priority, deadline) for args in arg_tuples]
+        self._admit_and_enqueue_many(jobs, priority)
+        return jobs
+
+    def submit_many(self, fn, arg_tuples: Iterable[tuple], *, priority: Priority = Priority.NORMAL, deadline: float | None = None) -> list[concurrent.futures.Future]:
+        """Queue fn(*args) for every tuple in arg_tuples in one go, returning a future for each"""
+        self._check_accepting()
+        no_kwargs = {}
+        futures: list[concurrent.futures.Future] = []
+        jobs = []
+        for args in arg_tuples:
+            fut = concurrent.futures.Future()
+            futures.append(fut)
+            jobs.append(ExecJob(fn, args, no_kwargs, priority, deadline, fut))
+        self._admit_and_enqueue_many(jobs, priority)
+        return futures
+
+    def submit_batch(self, fn, arg_tuples: Iterable[tuple], *, priority: Priority = Priority.NORMAL, deadline: float | None = None) -> concurrent.futures.Future:
+        """Queue fn(*args) for every tuple in arg_tuples in one go, returning a single future for the list of
+        results in order. The first exception fails the whole batch, and cancelling it skips jobs not yet run."""
+        self._check_accepting()
+        arg_tuples = list(arg_tuples)
+        batch = _Batch(len(arg_tuples))
+        jobs = [_BatchJob(fn, args, batch, i, priority, deadline) for i, args in enumerate(arg_tuples)]
+        self._admit_and_enqueue_many(jobs, priority)
+        return batch.future
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        """Executor.map, but the calls are queued with one submit_many instead of a submit each"""
+        end_time = None if timeout is None else timeout + time.monotonic()
+        fs = self.submit_many(fn, zip(*iterables))
+
+        def result_iterator():
+            try:
+                fs.reverse()
+                while fs:
+                    if end_time is None:
+                        yield fs.pop().result()
+                    else:
+                        yield fs.pop().result(end_time - time.monotonic())
+            finally:
+                for f in fs:
+                    f.cancel()
+        return result_iterator()
+
+    def _enqueue(self, job):
+        if self.stats:
+            self.stats.jobs_enqueued((job,))
+        if self.workers:
+            self._push_to_worker(job)
+        else:
+            self.exec_queue.put_nowait(job)
+
+    def _admit_and_enqueue_many(self, jobs: list, priority: Priority):
+        """Take admission slots for a batch and queue it. Under OverflowPolicy.BLOCK a batch bigger than the free
+        room goes in a slice at a time as it is made. If shutdown stops it part way, the jobs left over are cancelled,
+        and a submit_batch fails as a whole."""
+        if not self.admission:
+            self._enqueue_many(jobs, priority)
+            return
+        start = 0
+        while start < len(jobs):
+            try:
+                taken = self.admission.admit_many(len(jobs) - start, self._shed_oldest)
+            except BaseException as e:
+                if isinstance(jobs[0], _BatchJob):
+                    # the batch can't finish without the rest, so give back the slots of what was already queued too
+                    self._drop_batch(jobs[0].batch, e)
+                else:
+                    for job in jobs[start:]:
+                        job.cancel()
+                raise
+            self._enqueue_many(jobs[start:start + taken], priority)
+            start += taken
+
+    def _enqueue_many(self, jobs: list, priority: Priority):
+        if not jobs:
+            return
+        if self.stats:
+            self.stats.jobs_enqueued(jobs)
+        if not self.workers:
+            self.exec_queue.put_many(jobs)
+            return
+        levels = getattr(self._local, 'levels', None)
+        if levels is not None:
+            levels[priority].extend(jobs)
+        else:
+            # deal the batch out in contiguous runs, one per worker
+            per_worker = -(-len(jobs) // self.workers)
+            first = next(self._next_worker)
+            for n, start in enumerate(range(0, len(jobs), per_worker)):
+                self._worker_jobs[(first + n) % self.workers][priority].extend(jobs[start:start + per_worker])
+        if self._idle_workers:
+            with self._worker_wakeup:
+                self._worker_wakeup.notify_all()
+
     def shutdown(self, wait=True, *, cancel_futures=False):
-        self.stopping = True
+        """With cancel_futures, every job still queued is cancelled, and so are exec_on_queue coroutines waiting on
+        a future. Otherwise, those coroutines are run to the end once their future resolves, and wait waits for them
+        too; apart from those waiting on the loop of the calling thread, which can't resolve while it waits, and fail
+        when they come back."""
+        with self._timers_lock:
+            first_shutdown = self._stop(cancel_futures)
+        self._drop_timers()
         if cancel_futures:
-            self.cancelling = True
-    
-    def pump_busy_loop(self):
-        while self.pump_single():
-            pass
+            self._cancel_queued()
+            for driver in list(self._parked_drivers):
+                self._parked_drivers.discard(driver)
+                driver.abandon()
+        elif wait:
+            loop = events._get_running_loop()
+            if loop is not None:
+                for driver in list(self._parked_drivers):
+                    if driver.waiting_on is not None and driver.waiting_on.get_loop() is loop:
+                        self._parked_drivers.discard(driver)
+        if self.workers:
+            with self._worker_wakeup:
+                self._worker_wakeup.notify_all()
+            if wait:
+                current = threading.current_thread()
+                for t in self._worker_threads:
+                    if t is not current:
+                        t.join()
+            return
+        if first_shutdown:
+            self.exec_queue.put_nowait(_WAKEUP)
+        if wait:
+            self._wait_for_pumps()
+
+    def _cancel_queued(self):
+        jobs = self.exec_queue.take_all()
+        for levels in self._worker_jobs:
+            for level in levels:
+                while True:
+                    try:
+                        jobs.append(level.popleft())
+                    except IndexError:
+                        break
+        for job in jobs:
+            if self.admission and job.admitted:
+                self.admission.release()
+            if self.stats:
+                self.stats.job_dropped()
+            job.cancel()
+
+    async def submit_async(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        """Like submit, but when the executor is full under OverflowPolicy.BACKPRESSURE, waits for room
+        without blocking the event loop instead of raising"""
+        while True:
+            try:
+                return self.submit(fn, *args, **kwargs)
+            except ExecutorFull as e:
+                if e.ready is None:
+                    raise
+                await asyncio.wrap_future(e.ready)
+
+    def _shed_oldest(self) -> bool:
+        victim = None
+        if self.workers:
+            for priority in reversed(Priority):
+                for levels in self._worker_jobs:
+                    jobs = levels[priority]
+                    try:
+                        victim = jobs.popleft()
+                    except IndexError:
+                        continue
+                    if victim.admitted:
+                        break
+                    # coroutine steps don't hold a slot, so shedding one wouldn't make room
+                    jobs.appendleft(victim)
+                    victim = None
+                if victim is not None:
+                    break
+        else:
+            # coroutine steps don't hold a slot, so shedding one wouldn't make room
+            victim = self.exec_queue.take_least_urgent(lambda job: job.admitted)
+        if victim is None:
+            return False
+        if self.stats:
+            self.stats.job_dropped()
+        if isinstance(victim, _BatchJob):
+            self._drop_batch(victim.batch, ExecutorFull('a job of the batch was shed to make room for newer ones'))
+        else:
+            victim.cancel()
+        return True
 
-    def pump_single(self):
+    def _drop_batch(self, batch: _Batch, exc: BaseException):
+        """Fail a batch that lost one of its jobs, and take the rest of them out of the queue so they give back their slots"""
+        batch.fail(exc)
+        def of_batch(job) -> bool:
+            return isinstance(job, _BatchJob) and job.batch is batch
+        if self.workers:
+            dropped = []
+            for levels in self._worker_jobs:
+                for jobs in levels:
+                    for job in [job for job in list(jobs) if of_batch(job)]:
+                        try:
+                            jobs.remove(job)
+                        except ValueError:
+                            # a worker took it in the meantime, it sees the batch failed and gives its slot back
+                            continue
+                        dropped.append(job)
+        else:
+            dropped = self.exec_queue.take_matching(of_batch)
+        for _ in dropped:
+            if self.admission:
+                self.admission.release()
+            if self.stats:
+                self.stats.job_dropped()
+
+    def _resume_driver(self, driver: _CoroutineDriver) -> bool:
+        """Queue a parked driver again. Returns False if shutdown() gave up on it, or nothing is left to run it"""
+        if driver not in self._parked_drivers:
+            return False
+        if self.cancelling or (self.stopping and not self.workers and not self._pump_threads):
+            # cancelled by shutdown, or shut down with nothing pumping, so it would sit in the queue forever
+            self._parked_drivers.discard(driver)
+            return False
+        # queued before it stops counting as parked, so pumps and workers that stayed on for it can't leave in between
+        self._enqueue(driver)
+        self._parked_drivers.discard(driver)
+        if self.stopping:
+            # let them see whether anything is still parked
+            if self.workers:
+                with self._worker_wakeup:
+                    self._worker_wakeup.notify_all()
+            else:
+                self.exec_queue.put_nowait(_WAKEUP)
+        return True
+
+    def queue_depth(self) -> int:
+        if self.workers:
+            return sum(len(jobs) for levels in self._worker_jobs for jobs in levels)
+        return super().queue_depth()
+
+    def _push_to_worker(self, job):
+        # jobs submitted from a worker stay on that worker's queue, others are dealt out round robin
+        levels = getattr(self._local, 'levels', None)
+        if levels is None:
+            levels = self._worker_jobs[next(self._next_worker) % self.workers]
+        levels[job.priority].append(job)
+        # workers bump _idle_workers before their final empty check, so reading it unlocked can't miss one
+        if self._idle_workers:
+            with self._worker_wakeup:
+                self._worker_wakeup.notify()
+
+    def _take_job(self, index: int):
+        for priority in Priority:
+            try:
+                return self._worker_jobs[index][priority].popleft()
+            except IndexError:
+                pass
+            # steal the oldest job of this priority from the next busy worker along,
+            # before falling back to less urgent work of our own
+            for offset in range(1, self.workers):
+                victim_jobs = self._worker_jobs[(index + offset) % self.workers][priority]
+                try:
+                    job = victim_jobs.popleft()
+                except IndexError:
+                    continue
+                # with chunked stealing, bring over part of the victim's backlog too so we don't come back for each job
+                own_jobs = self._worker_jobs[index][priority]
+                for _ in range(min(self.chunk_size - 1, len(victim_jobs) // 2)):
+                    try:
+                        own_jobs.append(victim_jobs.popleft())
+                    except IndexError:
+                        break
+                return job
+        return None
+
+    def _worker_loop(self, index: int):
+        self._local.levels = self._worker_jobs[index]
+        thread_loop = None
+        while not self.cancelling:
+            if self._timers:
+                self._fire_due_timers()
+            job = self._take_job(index)
+            if job is None:
+                woken = False
+                with self._worker_wakeup:
+                    self._idle_workers += 1
+                    job = self._take_job(index)
+                    # after shutdown, stay on for coroutines that are still to come back
+                    if job is None and (not self.stopping or self._parked_drivers):
+                        # sleep until the next timer is due at the latest. read under _worker_wakeup,
+                        # so a timer scheduled ahead of it can't slip in before we wait
+                        self._worker_wakeup.wait(self._next_timer_delay())
+                        woken = True
+                    self._idle_workers -= 1
+                if job is None:
+                    if woken:
+                        # go round again even if woken by shutdown, there may be work queued just before it
+                        continue
+                    return
+            if self.admission and job.admitted:
+                self.admission.release()
+            if thread_loop is not self.loop:
+                # same as pump_single, jobs expect the executor's loop to be this thread's event loop
+                thread_loop = self.loop
+                events.set_event_loop(thread_loop)
+            self._run_job(job)
+
+    def pump_single(self, block: bool = False, timeout: float | None = None):
 
         try:
             events.get_event_loop()
@@ -175,32 +1794,83 @@ class QueueExecutor(concurrent.futures.Executor):
             # make sure the event loop is set on the thread we are pumping from
             events.set_event_loop(self.loop)
 
-        """Execute some scheduled work. Returns False when pumping should cease"""
+        """Execute some scheduled work. Returns False when pumping should cease.
+        If block is set, waits up to timeout seconds (forever if None) for work to arrive."""
         if self.cancelling:
             return False
-        f = None
+        if self._timers:
+            next_timer = self._fire_due_timers()
+            if block and next_timer is not None and (timeout is None or next_timer < timeout):
+                # sleep until the next timer is due at the latest
+                timeout = next_timer
         try:
-            f = self.exec_queue.get_nowait()
+            jobs = self.exec_queue.get_many(self.chunk_size, block, timeout)
         except queue.Empty as e:
-            if self.stopping:
+            if self.stopping and not self._parked_drivers:
                 return False
             return True
-        if f:
-            try:
-                f()
-            except:
-                import traceback
-                tb = traceback.format_exc()
-                self.last_error = tb
-                self.exception_count += 1
-
-            self.exec_count += 1
+        for f in jobs:
+            if f is _WAKEUP:
+                if self._parked_drivers and not self.exec_queue.has_work():
+                    # nothing to do until a parked coroutine comes back, which brings a fresh wakeup with it
+                    return not self.cancelling
+                return _pass_wakeup_along(self.exec_queue) and not self.cancelling
+            if f is _TIMER_CHECK:
+                continue
+            if self.admission and f.admitted:
+                self.admission.release()
+            self._run_job(f)
         return True
 
+    def _run_job(self, f):
+        stats = self.stats
+        started_at = stats.job_dequeued(f) if stats else 0.0
+        if f.deadline is not None:
+            late_by = time.monotonic() - f.deadline
+            if late_by > 0:
+                self.deadline_missed_count += 1
+                f.expire(late_by)
+                return
+        try:
+            failed = f()
+        except BaseException as e:
+            self._record_error(e)
+        else:
+            if failed is not None:
+                self.recent_errors.append((time.time(), failed))
+
+        self.exec_count += 1
+        if stats:
+            stats.job_finished(f, started_at)
+
 class YieldingEventLoop(asyncio.SelectorEventLoop):
-    def _run_once(self):
-        def step():
-            super().__run_once()
+    """An event loop that doesn't own a thread. Something else, like a Qt timer or a game loop, calls step()
+    regularly, and the loop does a time-boxed slice of its work each time."""
+    # kept by BaseEventLoop, which typeshed leaves out: callbacks ready to run, and a heap of timers
+    _ready: collections.deque[asyncio.Handle]
+    _scheduled: list[asyncio.TimerHandle]
+
+    def step(self, budget: float = 0.0) -> float | None:
+        """Run non-blocking iterations of the loop while callbacks are ready, for up to budget seconds.
+        At least one iteration always runs, and a callback that overruns the budget isn't interrupted.
+        Returns how long the host can wait before stepping again (see idle_time)."""
+        deadline = self.time() + budget
+        while True:
+            # stopping before running makes run_forever poll for I/O without blocking, run what's ready, then return
+            self.stop()
+            self.run_forever()
+            if not self._ready or self.time() >= deadline:
+                break
+        return self.idle_time()
+
+    def idle_time(self) -> float | None:
+        """Seconds until the next timer is due, 0 if callbacks are ready now, or None if nothing is scheduled.
+        I/O can still arrive at any time, so a host should keep stepping at some base rate regardless."""
+        if self._ready:
+            return 0.0
+        if not self._scheduled:
+            return None
+        return max(0.0, self._scheduled[0].when() - self.time())
 
 
 # class CustomEventLoop(AbstractEventLoop):
@@ -0,0 +1,79 @@
+import unittest, logging, asyncio, array
+
+from process_queue_executor import ProcessQueueExecutor
+from sink.unittest import LoggedTestCase
+
+def describe_buffer(buf):
+    # module level so spawned workers can unpickle it
+    view = memoryview(buf)
+    return type(buf).__name__, view.format, len(view), view[0], view[-1]
+
+def fail(message):
+    raise ValueError(message)
+
+class TestProcessQueueExecutor(LoggedTestCase):
+    def test_run_in_executor(self):
+        for method in [None, 'spawn']:
+            with self.subTest(start_method=method):
+                qe = ProcessQueueExecutor(processes=2, start_method=method)
+
+                async def run_jobs():
+                    loop = asyncio.get_running_loop()
+                    return await asyncio.gather(*(loop.run_in_executor(qe, pow, i, 2) for i in range(100)))
+
+                self.assertListEqual(asyncio.run(run_jobs()), [i * i for i in range(100)])
+                qe.shutdown(wait=True)
+                self.assertEqual(qe.exec_count, 100)
+                # the small jobs went in chunks rather than one trip each
+                self.assertLess(qe.chunk_count, 100)
+                self.logger.info(f'{method}: {qe.chunk_count} chunks')
+
+    def test_errors_stay_with_their_job(self):
+        qe = ProcessQueueExecutor(processes=1)
+        ok = qe.submit(abs, -1)
+        unpicklable = qe.submit(lambda: 1)
+        raises = qe.submit(fail, 'nope')
+        batch = qe.submit_batch(abs, [(-2,), (-3,)])
+        self.assertEqual(ok.result(timeout=30), 1)
+        self.assertRaises(Exception, unpicklable.result, timeout=30)
+        with self.assertRaises(ValueError):
+            raises.result(timeout=30)
+        self.assertListEqual(batch.result(timeout=30), [2, 3])
+        qe.shutdown(wait=True)
+        self.assertEqual(len(qe.snapshot()['recent_errors']), 2)
+
+    def test_coroutines_are_refused(self):
+        qe = ProcessQueueExecutor(processes=1)
+        async def step():
+            pass
+        coro = step()
+
+        async def run():
+            with self.assertRaises(TypeError):
+                await qe.exec_on_queue(asyncio.get_running_loop(), coro)
+        asyncio.run(run())
+        qe.shutdown(wait=True)
+        # closed, so it doesn't warn that it was never awaited
+        self.assertIsNone(coro.cr_frame)
+
+    def test_shared_memory_arguments(self):
+        qe = ProcessQueueExecutor(processes=1, shm_threshold=1024)
+        small = qe.submit(describe_buffer, b'abc')
+        big = qe.submit(describe_buffer, bytes(range(256)) * 8)
+        doubles = qe.submit(describe_buffer, array.array('d', [0.5] * 1000))
+        self.assertEqual(small.result(timeout=30), ('bytes', 'B', 3, 97, 99))
+        self.assertEqual(big.result(timeout=30), ('memoryview', 'B', 2048, 0, 255))
+        self.assertEqual(doubles.result(timeout=30), ('memoryview', 'd', 1000, 0.5, 0.5))
+        qe.shutdown(wait=True)
+        self.assertEqual(qe.shared_bytes, 2048 + 8000)
+
+        # opt-in, by default a big argument arrives as what was passed
+        qe = ProcessQueueExecutor(processes=1)
+        big = qe.submit(describe_buffer, bytes(2 * 1024 * 1024))
+        self.assertEqual(big.result(timeout=30), ('bytes', 'B', 2 * 1024 * 1024, 0, 0))
+        qe.shutdown(wait=True)
+        self.assertEqual(qe.shared_bytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
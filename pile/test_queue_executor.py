@@ -1,6 +1,6 @@
-import unittest, logging, asyncio
+import unittest, logging, asyncio, time
 
-from queue_executor import ExecQueueFutureFactory, QueueExecutor
+from queue_executor import DeadlineExceeded, ExecQueueFutureFactory, ExecutorFull, OverflowPolicy, Priority, QueueExecutor, YieldingEventLoop
 from sink.unittest import LoggedTestCase
 
 class TestQueueExecutor(LoggedTestCase):
@@ -58,6 +58,680 @@ class TestQueueExecutor(LoggedTestCase):
         self.assertGreater(qe.exec_count, 0)
         self.assertListEqual(items, ['a', 'b', 'c'])
 
+    def test_exec_on_queue_result_and_error(self):
+        qe = QueueExecutor(workers=1)
+
+        async def add(a, b):
+            await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            return a + b
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError('nope')
+
+        async def run_tests():
+            loop = asyncio.get_running_loop()
+            self.assertEqual(await qe.exec_on_queue(loop, add(1, 2)), 3)
+            with self.assertRaises(ValueError):
+                await qe.exec_on_queue(loop, fail())
+
+        asyncio.run(run_tests())
+        qe.shutdown(wait=True)
+        self.assertEqual(qe.exception_count, 0)
+
+    def test_shutdown_with_parked_coroutines(self):
+        async def slow():
+            await asyncio.sleep(0.1)
+            await asyncio.sleep(0)
+            return 'done'
+
+        async def run_tests():
+            loop = asyncio.get_running_loop()
+            for workers in [0, 1]:
+                qe = QueueExecutor(workers=workers)
+                pump = None
+                if not workers:
+                    pump = asyncio.ensure_future(asyncio.to_thread(qe.pump_blocking_loop))
+                # parked on the sleep while shutdown waits on another thread, and finished by the pump or worker
+                task = asyncio.ensure_future(qe.exec_on_queue(loop, slow()))
+                await asyncio.sleep(0.02)
+                await asyncio.to_thread(qe.shutdown, wait=True)
+                self.assertEqual(await asyncio.wait_for(task, 5), 'done')
+                if pump is not None:
+                    await asyncio.wait_for(pump, 5)
+
+            # waiting on this thread, the sleep can't finish until shutdown returns, so it fails instead of hanging
+            qe = QueueExecutor(workers=1)
+            task = asyncio.ensure_future(qe.exec_on_queue(loop, slow()))
+            await asyncio.sleep(0.02)
+            qe.shutdown(wait=True)
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(task, 5)
+
+            # cancelling a coroutine isn't an error worth keeping
+            qe = QueueExecutor(workers=1)
+            task = asyncio.ensure_future(qe.exec_on_queue(loop, slow()))
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.to_thread(qe.shutdown, wait=True)
+            self.assertListEqual(list(qe.recent_errors), [])
+
+        asyncio.run(run_tests())
+
+    def test_cancelling_shutdown_with_parked_coroutines(self):
+        cleaned_up = []
+        async def wait_forever(fut):
+            try:
+                return await fut
+            finally:
+                cleaned_up.append(fut)
+
+        async def run_tests():
+            loop = asyncio.get_running_loop()
+            for workers in [1, 2]:
+                qe = QueueExecutor(workers=workers)
+                never = loop.create_future()
+                task = asyncio.ensure_future(qe.exec_on_queue(loop, wait_forever(never)))
+                await asyncio.sleep(0.02)
+                qe.shutdown(wait=True, cancel_futures=True)
+                with self.assertRaises(asyncio.CancelledError):
+                    await asyncio.wait_for(task, 2)
+                self.assertListEqual(cleaned_up, [never])
+                # the future it was waiting on is left alone
+                self.assertFalse(never.done())
+                cleaned_up.clear()
+
+            # resolving after shutdown doesn't run the rest of the coroutine on workers that are gone
+            qe = QueueExecutor(workers=1)
+            soon = loop.create_future()
+            task = asyncio.ensure_future(qe.exec_on_queue(loop, wait_forever(soon)))
+            await asyncio.sleep(0.02)
+            soon.set_result('late')
+            qe.shutdown(wait=False, cancel_futures=True)
+            with self.assertRaises((asyncio.CancelledError, RuntimeError)):
+                await asyncio.wait_for(task, 2)
+
+        asyncio.run(run_tests())
+
+    def test_blocking_pump(self):
+        qe = QueueExecutor()
+
+        import threading
+        t = threading.Thread(target=qe.pump_blocking_loop)
+        t.start()
+
+        self.logger.info('main: submitting to parked pump')
+        self.assertEqual(qe.submit(lambda x: x * 2, 21).result(timeout=5), 42)
+
+        qe.shutdown(wait=False)
+        t.join(timeout=5)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(qe.exec_count, 1)
+
+    def test_factory_parks_blocked_task(self):
+        import threading
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever)
+        loop_thread.start()
+
+        factory = ExecQueueFutureFactory(loop)
+        pump = threading.Thread(target=factory.pump_blocking_loop)
+        pump.start()
+
+        async def wait_on_loop():
+            fut = loop.create_future()
+            loop.call_soon_threadsafe(loop.call_later, 0.1, fut.set_result, 'resolved')
+            return await fut
+
+        task = factory.submit(wait_on_loop())
+        # shutting down while the task is parked must still let it finish
+        factory.shutdown(wait=False)
+        pump.join(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+
+        self.assertFalse(pump.is_alive())
+        self.assertEqual(task.result(), 'resolved')
+        self.assertEqual(factory.park_count, 1)
+        self.assertEqual(factory.parked(), 0)
+        # one step to reach the await, one to finish after resuming
+        self.assertEqual(factory.exec_count, 2)
+
+    def test_factory_future_on_owning_loop(self):
+        import threading
+        async def main():
+            loop = asyncio.get_running_loop()
+            factory = ExecQueueFutureFactory(loop)
+            pump = threading.Thread(target=factory.pump_blocking_loop)
+            pump.start()
+
+            async def answer():
+                return 42
+            async def wait_on_loop():
+                # already resolved by the time the pump parks on it
+                fut = loop.create_future()
+                loop.call_soon_threadsafe(fut.set_result, 'resolved')
+                time.sleep(0.05)
+                return await fut
+            try:
+                # the pump settles these, and the loop has to be woken up to see it
+                return await asyncio.wait_for(factory.submit(answer()), 5), await asyncio.wait_for(factory.submit(wait_on_loop()), 5)
+            finally:
+                factory.shutdown(wait=False)
+                await asyncio.to_thread(pump.join, 5)
+
+        # debug mode makes the loop complain about being used from the pump thread
+        self.assertEqual(asyncio.run(main(), debug=True), (42, 'resolved'))
+
+    def test_factory_without_loop(self):
+        import threading
+        async def answer():
+            return 42
+        outcome = {}
+        def off_main_thread():
+            factory = ExecQueueFutureFactory()
+            coro = answer()
+            try:
+                factory.submit(coro)
+            except RuntimeError as e:
+                outcome['refused'] = e
+            outcome['closed'] = coro.cr_frame is None
+            # post() never needs a loop, and a loop started later can still be given the future
+            task = factory.post(answer())
+            factory.shutdown(wait=True)
+            async def late():
+                return await task.future()
+            outcome['late'] = asyncio.run(late())
+            # with no loop of its own, the factory binds futures to the running one
+            async def running():
+                factory = ExecQueueFutureFactory()
+                fut = factory.submit(answer())
+                pump = threading.Thread(target=factory.pump_blocking_loop)
+                pump.start()
+                try:
+                    return await asyncio.wait_for(fut, 5)
+                finally:
+                    factory.shutdown(wait=False)
+                    await asyncio.to_thread(pump.join, 5)
+            outcome['running'] = asyncio.run(running())
+        t = threading.Thread(target=off_main_thread)
+        t.start()
+        t.join(timeout=10)
+        self.assertFalse(t.is_alive())
+        self.assertIn('pass one in', str(outcome['refused']))
+        self.assertTrue(outcome['closed'])
+        self.assertEqual(outcome['late'], 42)
+        self.assertEqual(outcome['running'], 42)
+
+    def test_worker_pool(self):
+        qe = QueueExecutor(workers=4)
+
+        async def run_jobs():
+            loop = asyncio.get_running_loop()
+            return await asyncio.gather(*(loop.run_in_executor(qe, pow, i, 2) for i in range(100)))
+
+        results = asyncio.run(run_jobs())
+        qe.shutdown(wait=True)
+
+        self.assertListEqual(results, [i * i for i in range(100)])
+        self.assertEqual(qe.exec_count, 100)
+        for t in qe._worker_threads:
+            self.assertFalse(t.is_alive())
+
+    def test_independent_executors(self):
+        a = QueueExecutor()
+        b = QueueExecutor()
+        fa = a.submit(str, 'a')
+        fb = b.submit(str, 'b')
+        self.assertEqual(a.exec_queue.qsize(), 1)
+        self.assertEqual(b.exec_queue.qsize(), 1)
+
+        import threading
+        t = threading.Thread(target=a.pump_blocking_loop)
+        t.start()
+        self.assertEqual(fa.result(timeout=5), 'a')
+        a.shutdown(wait=True)
+        t.join(timeout=5)
+        self.assertFalse(t.is_alive())
+        self.assertFalse(fb.done())
+
+        # nothing is pumping b, so shutdown drains it on this thread
+        b.shutdown(wait=True)
+        self.assertEqual(fb.result(timeout=0), 'b')
+        self.assertEqual(a.exec_count, 1)
+        self.assertEqual(b.exec_count, 1)
+        self.assertRaises(RuntimeError, b.submit, str, 'c')
+
+    def test_capacity_reject(self):
+        qe = QueueExecutor(capacity=2, overflow=OverflowPolicy.REJECT)
+        qe.submit(str, 1)
+        qe.submit(str, 2)
+        with self.assertRaises(ExecutorFull) as raised:
+            qe.submit(str, 3)
+        self.assertIsNone(raised.exception.ready)
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.rejected_count, 1)
+
+        qe.pump_single()
+        qe.submit(str, 4)
+        qe.shutdown(wait=True)
+        self.assertEqual(qe.exec_count, 3)
+
+    def test_capacity_shed_oldest(self):
+        qe = QueueExecutor(capacity=2, overflow=OverflowPolicy.SHED_OLDEST)
+        f1 = qe.submit(str, 1)
+        f2 = qe.submit(str, 2)
+        f3 = qe.submit(str, 3)
+        self.assertTrue(f1.cancelled())
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.shed_count, 1)
+        self.assertEqual(qe.exec_queue.qsize(), 2)
+
+        qe.shutdown(wait=True)
+        self.assertEqual(f2.result(timeout=0), '2')
+        self.assertEqual(f3.result(timeout=0), '3')
+
+    def test_factory_sheds_only_unstarted_tasks(self):
+        loop = asyncio.new_event_loop()
+        factory = ExecQueueFutureFactory(loop, capacity=2, overflow=OverflowPolicy.SHED_OLDEST)
+        steps = []
+        async def yielding(name):
+            for i in range(3):
+                steps.append(name)
+                await asyncio.sleep(0)
+
+        started = factory.post(yielding('started'))
+        # takes its first step and goes to the back of the queue
+        factory.pump_single()
+        fresh = factory.post(yielding('fresh'))
+        newest = factory.post(yielding('newest'))
+        self.assertTrue(fresh.cancelled())
+        self.assertFalse(started.done())
+        # everything queued has started now, so there's nothing left to shed
+        factory.pump_single()
+        factory.pump_single()
+        rejected = yielding('rejected')
+        with self.assertRaises(ExecutorFull):
+            factory.post(rejected)
+        # closed by the factory, so it doesn't warn that it was never awaited
+        self.assertIsNone(rejected.cr_frame)
+
+        factory.shutdown(wait=True)
+        loop.close()
+        self.assertTrue(started.done() and not started.cancelled())
+        self.assertTrue(newest.done() and not newest.cancelled())
+        self.assertEqual(steps.count('started'), 3)
+        self.assertNotIn('fresh', steps)
+
+    def test_capacity_backpressure(self):
+        qe = QueueExecutor(capacity=1, overflow=OverflowPolicy.BACKPRESSURE)
+        qe.submit(str, 1)
+
+        async def produce():
+            # waits for room instead of raising, once the pump has taken the first job
+            asyncio.get_running_loop().call_later(0.01, qe.pump_single)
+            return await qe.submit_async(str, 2)
+
+        f2 = asyncio.run(produce())
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.backpressure_count, 1)
+        qe.shutdown(wait=True)
+        self.assertEqual(f2.result(timeout=0), '2')
+
+    def test_capacity_block(self):
+        qe = QueueExecutor(capacity=1, overflow=OverflowPolicy.BLOCK)
+        qe.submit(str, 1)
+
+        import threading
+        submitted = []
+        t = threading.Thread(target=lambda: submitted.append(qe.submit(str, 2)))
+        t.start()
+        t.join(timeout=0.05)
+        self.assertTrue(t.is_alive())
+
+        qe.pump_single()
+        t.join(timeout=5)
+        self.assertFalse(t.is_alive())
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.blocked_count, 1)
+        qe.shutdown(wait=True)
+        self.assertEqual(submitted[0].result(timeout=0), '2')
+
+    def test_base_exceptions_settle_futures(self):
+        def raise_(exc: BaseException):
+            raise exc
+
+        for workers in [0, 1]:
+            with self.subTest(workers=workers):
+                qe = QueueExecutor(workers=workers)
+                cancelled = qe.submit(raise_, asyncio.CancelledError())
+                exited = qe.submit(raise_, SystemExit(3))
+                batch = qe.submit_batch(raise_, [(KeyboardInterrupt(),)])
+                after = qe.submit(str, 'still running')
+                qe.shutdown(wait=True)
+                self.assertIsInstance(cancelled.exception(timeout=5), asyncio.CancelledError)
+                self.assertIsInstance(exited.exception(timeout=5), SystemExit)
+                self.assertIsInstance(batch.exception(timeout=5), KeyboardInterrupt)
+                self.assertEqual(after.result(timeout=5), 'still running')
+                self.assertEqual(qe.exception_count, 3)
+
+    def test_priority_and_deadline(self):
+        qe = QueueExecutor()
+        order = []
+        qe.submit_prioritized(order.append, 'low', priority=Priority.LOW)
+        qe.submit(order.append, 'normal')
+        qe.submit_prioritized(order.append, 'high', priority=Priority.HIGH)
+        late = qe.submit_prioritized(order.append, 'late', priority=Priority.HIGH, deadline=time.monotonic() - 1)
+        qe.shutdown(wait=True)
+
+        self.assertListEqual(order, ['high', 'normal', 'low'])
+        self.assertIsInstance(late.exception(timeout=0), DeadlineExceeded)
+        self.assertEqual(qe.deadline_missed_count, 1)
+
+    def test_submit_passes_priority_and_deadline_keywords_through(self):
+        def schedule(item, priority, deadline=None):
+            return (item, priority, deadline)
+
+        qe = QueueExecutor()
+        f = qe.submit(schedule, 1, priority='urgent')
+        g = qe.submit(schedule, 2, priority='later', deadline=10.0)
+        h = asyncio.run(qe.submit_async(schedule, 3, priority='soon', deadline=time.monotonic() - 1))
+        qe.shutdown(wait=True)
+        self.assertEqual(f.result(timeout=0), (1, 'urgent', None))
+        self.assertEqual(g.result(timeout=0), (2, 'later', 10.0))
+        self.assertEqual(h.result(timeout=0)[:2], (3, 'soon'))
+        self.assertEqual(qe.deadline_missed_count, 0)
+
+    def test_shedding_a_batch_job(self):
+        qe = QueueExecutor(capacity=3, overflow=OverflowPolicy.SHED_OLDEST)
+        batch = qe.submit_batch(str, [(i,) for i in range(3)])
+        newest = qe.submit(str, 'newest')
+        # the batch can't finish without its oldest job, so all of it goes and gives its slots back
+        self.assertIsInstance(batch.exception(timeout=0), ExecutorFull)
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.admitted, 1)
+        self.assertEqual(qe.queue_depth(), 1)
+        self.assertEqual(qe.admission.shed_count, 1)
+        qe.shutdown(wait=True)
+        self.assertEqual(newest.result(timeout=0), 'newest')
+        self.assertEqual(qe.admission.admitted, 0)
+
+        # shedding for a batch counts the room a dropped batch gives back, and stops once there is enough
+        qe = QueueExecutor(capacity=3, overflow=OverflowPolicy.SHED_OLDEST)
+        oldest = qe.submit_batch(str, [('a',), ('b',)])
+        newest = qe.submit(str, 'newest')
+        fits = qe.submit_batch(str, [('c',), ('d',)])
+        self.assertIsInstance(oldest.exception(timeout=0), ExecutorFull)
+        self.assertFalse(newest.done())
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.shed_count, 1)
+        self.assertEqual(qe.admission.admitted, 3)
+        qe.shutdown(wait=True)
+        self.assertEqual(newest.result(timeout=0), 'newest')
+        self.assertListEqual(fits.result(timeout=0), ['c', 'd'])
+        self.assertEqual(qe.admission.admitted, 0)
+
+    def test_batches_over_capacity(self):
+        import threading
+        # bigger than the capacity, so it goes in a capacity's worth at a time as the pump makes room
+        qe = QueueExecutor(capacity=4, overflow=OverflowPolicy.BLOCK)
+        pump = threading.Thread(target=qe.pump_blocking_loop)
+        pump.start()
+        futures = qe.submit_many(abs, [(-i,) for i in range(6)])
+        self.assertListEqual([f.result(timeout=5) for f in futures], list(range(6)))
+        self.assertListEqual(list(qe.map(abs, range(-9, 0))), list(range(9, 0, -1)))
+        qe.shutdown(wait=True)
+        pump.join(timeout=5)
+        assert qe.admission is not None
+        self.assertEqual(qe.admission.admitted, 0)
+
+        for policy in [OverflowPolicy.REJECT, OverflowPolicy.BACKPRESSURE, OverflowPolicy.SHED_OLDEST]:
+            with self.subTest(policy=policy):
+                qe = QueueExecutor(capacity=4, overflow=policy)
+                queued = qe.submit(str, 'queued')
+                # a failed batch doesn't hold on to any slots
+                for submit in [qe.submit_many, qe.post_many, qe.submit_batch]:
+                    with self.assertRaises(ExecutorFull) as raised:
+                        submit(str, [(i,) for i in range(6)])
+                    self.assertIsNone(raised.exception.ready)
+                assert qe.admission is not None
+                self.assertEqual(qe.admission.admitted, 1)
+                self.assertEqual(qe.queue_depth(), 1)
+                self.assertFalse(queued.done())
+
+                fits = qe.submit_many(str, [(i,) for i in range(3)])
+                if policy == OverflowPolicy.SHED_OLDEST:
+                    # room for two more is made by shedding the oldest two
+                    more = qe.submit_batch(str, [('a',), ('b',)])
+                    self.assertTrue(queued.cancelled())
+                    self.assertTrue(fits[0].cancelled())
+                    self.assertEqual(qe.admission.shed_count, 2)
+                else:
+                    with self.assertRaises(ExecutorFull):
+                        qe.submit_batch(str, [('a',), ('b',)])
+                    self.assertEqual(qe.queue_depth(), 4)
+                    qe.pump_single()
+                    qe.pump_single()
+                    more = qe.submit_batch(str, [('a',), ('b',)])
+                qe.shutdown(wait=True)
+                self.assertListEqual(more.result(timeout=0), ['a', 'b'])
+                self.assertEqual(qe.admission.admitted, 0)
+
+    def test_batches(self):
+        qe = QueueExecutor(workers=2, chunk_size=8)
+        futures = qe.submit_many(pow, [(i, 2) for i in range(50)])
+        batch = qe.submit_batch(pow, [(i, 3) for i in range(50)])
+        failing = qe.submit_batch(int, [('1',), ('x',)])
+        mapped = list(qe.map(abs, range(-5, 0)))
+        qe.shutdown(wait=True)
+
+        self.assertListEqual([f.result(timeout=0) for f in futures], [i ** 2 for i in range(50)])
+        self.assertListEqual(batch.result(timeout=0), [i ** 3 for i in range(50)])
+        self.assertIsInstance(failing.exception(timeout=0), ValueError)
+        self.assertListEqual(mapped, [5, 4, 3, 2, 1])
+
+    def test_chunked_pump(self):
+        qe = QueueExecutor(chunk_size=4)
+        futures = qe.submit_many(str, [(i,) for i in range(10)])
+        # one chunk per call
+        qe.pump_single()
+        self.assertEqual(qe.exec_count, 4)
+        qe.shutdown(wait=True)
+        self.assertListEqual([f.result(timeout=0) for f in futures], [str(i) for i in range(10)])
+
+    def test_factory_cancellation(self):
+        import threading
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever)
+        loop_thread.start()
+
+        factory = ExecQueueFutureFactory(loop, capacity=10)
+        cleaned_up = []
+        def settled():
+            # task futures are settled on their loop, so let it catch up before looking at them
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(timeout=5)
+        async def wait_forever(name):
+            try:
+                await loop.create_future()
+            finally:
+                cleaned_up.append(name)
+
+        # not started yet, so it comes straight off the queue
+        queued = factory.submit(wait_forever('queued'))
+        self.assertTrue(queued.cancel())
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(factory.queue_depth(), 0)
+
+        # parked, so the future it waits on is cancelled and the coroutine gets to clean up
+        parked = factory.submit(wait_forever('parked'))
+        factory.pump_single()
+        self.assertEqual(factory.parked(), 1)
+        parked.cancel()
+        factory.pump_single(block=True, timeout=5)
+        settled()
+        self.assertTrue(parked.cancelled())
+
+        timed = factory.submit(wait_forever('timed'), timeout=0.05)
+        factory.pump_single()
+        started = time.monotonic()
+        while not timed.done() and time.monotonic() - started < 5:
+            factory.pump_single(block=True, timeout=1)
+            settled()
+        self.assertIsInstance(timed.exception(), TimeoutError)
+        self.assertEqual(factory.timeout_count, 1)
+
+        # shutting down with cancel_futures resolves everything, queued or parked
+        left_parked = factory.submit(wait_forever('left parked'))
+        factory.pump_single()
+        left_queued = factory.submit(wait_forever('left queued'))
+        factory.shutdown(wait=True, cancel_futures=True)
+        settled()
+        self.assertTrue(left_parked.cancelled())
+        self.assertTrue(left_queued.cancelled())
+
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+        self.assertEqual(factory.parked(), 0)
+        assert factory.admission is not None
+        self.assertEqual(factory.admission.admitted, 0)
+        self.assertListEqual(cleaned_up, ['parked', 'timed', 'left parked'])
+
+    def test_shutdown_drains_idle_workers(self):
+        qe = QueueExecutor(workers=2)
+        # let both workers go idle, so the jobs and the shutdown arrive while they are parked
+        time.sleep(0.05)
+        jobs = qe.post_many(abs, [(i,) for i in range(1000)])
+        qe.shutdown(wait=True)
+        self.assertEqual(qe.exec_count, 1000)
+        self.assertTrue(all(job.done() for job in jobs))
+
+    def test_shutdown_cancels_queued_jobs(self):
+        qe = QueueExecutor(workers=0)
+        futures = qe.submit_many(str, [(i,) for i in range(5)])
+        qe.shutdown(wait=True, cancel_futures=True)
+        self.assertTrue(all(f.cancelled() for f in futures))
+        self.assertEqual(qe.exec_count, 0)
+
+    def test_post_without_futures(self):
+        qe = QueueExecutor()
+        early = qe.post(str, 1)
+        early_future = early.future()
+        late = qe.post(str, 2)
+        jobs = qe.post_many(int, [('3',), ('x',)])
+        cancelled = qe.post(str, 4)
+        self.assertTrue(cancelled.cancel())
+        qe.shutdown(wait=True)
+
+        self.assertEqual(early_future.result(timeout=0), '1')
+        self.assertTrue(late.done())
+        # a future asked for after the fact comes back already resolved
+        self.assertEqual(late.future().result(timeout=0), '2')
+        self.assertEqual(jobs[0].future().result(timeout=0), 3)
+        self.assertIsInstance(jobs[1].future().exception(timeout=0), ValueError)
+        self.assertTrue(cancelled.future().cancelled())
+
+        loop = asyncio.new_event_loop()
+        factory = ExecQueueFutureFactory(loop)
+        async def answer():
+            return 42
+        task = factory.post(answer())
+        factory.shutdown(wait=True)
+        self.assertTrue(task.done())
+        self.assertEqual(task.future().result(), 42)
+        loop.close()
+
+    def test_timers(self):
+        import threading
+        for workers in [0, 1]:
+            with self.subTest(workers=workers):
+                qe = QueueExecutor(workers=workers)
+                pump = None
+                if not workers:
+                    pump = threading.Thread(target=qe.pump_blocking_loop)
+                    pump.start()
+
+                fired = []
+                ticks = []
+                once = qe.call_later(0.05, lambda: fired.append(time.monotonic()))
+                # scheduled behind the first, then ahead of it, which has to wake the sleeping pump early
+                qe.call_later(0.2, fired.append, 'late')
+                qe.call_later(0.01, fired.append, 'early')
+                poller = qe.call_every(0.02, lambda: ticks.append(time.monotonic()))
+                cancelled = qe.call_later(0.03, fired.append, 'cancelled')
+                cancelled.cancel()
+                qe.call_every(0.02, int, 'not a number')
+
+                time.sleep(0.3)
+                poller.cancel()
+                qe.shutdown(wait=True)
+                if pump is not None:
+                    pump.join(timeout=5)
+
+                self.logger.info(f'workers={workers}: fired {fired}, {len(ticks)} ticks')
+                self.assertEqual(fired[0], 'early')
+                self.assertGreaterEqual(fired[1], once.when)
+                self.assertLess(fired[1] - once.when, 0.05)
+                self.assertEqual(fired[2], 'late')
+                self.assertEqual(len(fired), 3)
+                self.assertGreaterEqual(len(ticks), 10)
+                # periodic runs keep to the schedule rather than drifting by the time each run took
+                self.assertLess(ticks[-1] - ticks[0] - 0.02 * (len(ticks) - 1 + poller.missed), 0.05)
+                self.assertGreaterEqual(qe.exception_count, 10)
+
+    def test_stats_snapshot(self):
+        qe = QueueExecutor()
+        self.assertNotIn('stats', qe.snapshot())
+
+        qe = QueueExecutor(stats=True)
+        qe.submit_many(time.sleep, [(0.002,)] * 3)
+        qe.submit(int, 'not a number')
+        self.assertEqual(qe.snapshot()['queue_depth'], 4)
+        qe.shutdown(wait=True)
+
+        snap = qe.snapshot()
+        self.logger.info(snap)
+        self.assertEqual(snap['queue_depth'], 0)
+        self.assertEqual(snap['stats']['max_queue_depth'], 4)
+        self.assertEqual(len(snap['stats']['recent_jobs']), 4)
+        self.assertEqual(snap['stats']['recent_jobs'][0].label, 'sleep')
+        self.assertGreaterEqual(snap['stats']['run_time']['p50_us'], 2000)
+        self.assertEqual(sum(snap['stats']['queue_wait']['buckets_us'].values()), 4)
+        # errors are kept whether or not stats are on
+        self.assertEqual(len(snap['recent_errors']), 1)
+        self.assertIsInstance(snap['recent_errors'][0][1], ValueError)
+
+
+class TestYieldingEventLoop(LoggedTestCase):
+    def test_stepped_from_host_loop(self):
+        loop = YieldingEventLoop()
+        items = []
+        async def push_all():
+            for s in ['a', 'b', 'c']:
+                await asyncio.sleep(0.01)
+                items.append(s)
+            return len(items)
+
+        task = loop.create_task(push_all())
+        steps = 0
+        # stand-in for a host loop that sleeps between steps
+        import time
+        while not task.done():
+            idle = loop.step(budget=0.001)
+            steps += 1
+            self.assertFalse(loop.is_running())
+            time.sleep(idle if idle is not None else 0.001)
+
+        self.logger.info(f'finished after {steps} steps')
+        self.assertEqual(task.result(), 3)
+        self.assertListEqual(items, ['a', 'b', 'c'])
+        self.assertIsNone(loop.idle_time())
+        loop.close()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
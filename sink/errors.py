@@ -1,12 +1,164 @@
+import ast, functools, os, sys
+from typing import NamedTuple
+
 class NotImplementedError(Exception):
     """Error for methods that haven't been implemented."""
+
+class StubInfo(NamedTuple):
+    """Where a stubbed function lives"""
+    module: str
+    qualname: str
+    filename: str
+    lineno: int
+
+    def __str__(self):
+        return f'{self.module}.{self.qualname} (in {self.filename}:{self.lineno})'
+
+# every @stubbed function imported so far, by module.qualname
+_stubs: dict[str, StubInfo] = {}
+
 def stub():
-    import inspect
-    frame = inspect.currentframe()
-    if not frame:
-        raise NotImplementedError("Method not implemented, current frame unknown")
-    caller_frame = frame.f_back
-    if not caller_frame:
+    """Raise NotImplementedError naming the calling function. Prefer @stubbed, which works out the name once at import."""
+    try:
+        caller = sys._getframe(1).f_code
+    except ValueError:
         raise NotImplementedError("Method not implemented, caller frame unknown")
-    caller = caller_frame.f_code
-    raise NotImplementedError(f"Method not implemented: {caller.co_name} (in {caller.co_filename}:{caller.co_firstlineno})")
\ No newline at end of file
+    raise NotImplementedError(f"Method not implemented: {caller.co_name} (in {caller.co_filename}:{caller.co_firstlineno})")
+
+def stubbed(fn):
+    """Decorator for a function that hasn't been implemented yet: calling it raises NotImplementedError. It is
+    registered when its module is imported, see stubs(), and find_stubs() spots it without importing anything."""
+    code = fn.__code__
+    info = StubInfo(fn.__module__, fn.__qualname__, code.co_filename, code.co_firstlineno)
+    _stubs[f'{info.module}.{info.qualname}'] = info
+    message = f"Method not implemented: {info.qualname} (in {info.filename}:{info.lineno})"
+
+    @functools.wraps(fn)
+    def raise_not_implemented(*args, **kwargs):
+        raise NotImplementedError(message)
+    setattr(raise_not_implemented, '__stub__', info)
+    return raise_not_implemented
+
+def stub_info(fn) -> StubInfo | None:
+    """Where fn was stubbed, if it is a @stubbed function"""
+    return getattr(fn, '__stub__', None)
+
+def stubs(prefix: str = '') -> list[StubInfo]:
+    """Stubs registered by @stubbed in the modules imported so far, optionally only those in the module (or package,
+    or class) prefix and under it"""
+    if not prefix:
+        return list(_stubs.values())
+    under = prefix + '.'
+    return [info for name, info in _stubs.items() if name == prefix or name.startswith(under)]
+
+_markers = {'sink.errors.stub', 'sink.errors.stubbed'}
+
+def _imported_names(tree: ast.Module, module: str, is_package: bool) -> dict[str, str]:
+    """What each name bound by an import in tree refers to, e.g. {'stubbed': 'sink.errors.stubbed'}"""
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    names[alias.asname] = alias.name
+                else:
+                    # import a.b binds a
+                    top = alias.name.partition('.')[0]
+                    names[top] = top
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                package = module.split('.') if is_package else module.split('.')[:-1]
+                package = package[:len(package) - node.level + 1]
+                base = '.'.join(package + ([node.module] if node.module else []))
+            for alias in node.names:
+                names[alias.asname or alias.name] = f'{base}.{alias.name}'
+    return names
+
+def _dotted_name(node: ast.expr) -> str | None:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _dotted_name(node.value)
+        return None if value is None else f'{value}.{node.attr}'
+    return None
+
+def _is_stub_marker(node: ast.expr, names: dict[str, str]) -> bool:
+    """@stubbed or @sink.errors.stubbed, or a bare stub() call, under whatever names they were imported as"""
+    if isinstance(node, ast.Call):
+        node = node.func
+    dotted = _dotted_name(node)
+    if dotted is None:
+        return False
+    head, dot, rest = dotted.partition('.')
+    imported = names.get(head)
+    return imported is not None and imported + dot + rest in _markers
+
+def _stubs_in_source(source: str, module: str, filename: str) -> list[StubInfo]:
+    tree = ast.parse(source, filename)
+    names = _imported_names(tree, module, os.path.basename(filename) == '__init__.py')
+    if f'{module}.stub' in _markers:
+        # this module, where they're defined rather than imported
+        names.update(stub=f'{module}.stub', stubbed=f'{module}.stubbed')
+    found = []
+    def visit(body: list[ast.stmt], prefix: str):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                visit(node.body, f'{prefix}{node.name}.')
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                decorated = any(_is_stub_marker(d, names) and not isinstance(d, ast.Call) for d in node.decorator_list)
+                # the older style, stub() as the first statement
+                calls_stub = any(isinstance(s, ast.Expr) and isinstance(s.value, ast.Call) and _is_stub_marker(s.value, names)
+                                 for s in node.body[:2])
+                if decorated or calls_stub:
+                    # co_firstlineno counts the decorators
+                    lineno = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                    found.append(StubInfo(module, prefix + node.name, filename, lineno))
+                visit(node.body, f'{prefix}{node.name}.<locals>.')
+    visit(tree.body, '')
+    return found
+
+def find_stubs(package: str) -> list[StubInfo]:
+    """Statically list the stubs in a package (by name, or a directory) without importing its modules: functions
+    decorated with @stubbed, and ones that start by calling stub(). Naming a subpackage imports its parents."""
+    if os.path.isdir(package):
+        roots = [os.path.abspath(package)]
+        name = os.path.basename(roots[0])
+    else:
+        import importlib.util
+        spec = importlib.util.find_spec(package)
+        if spec is None:
+            raise ModuleNotFoundError(f'No module named {package!r}', name=package)
+        roots = list(spec.submodule_search_locations or [])
+        name = package
+        if not roots:
+            # a plain module, which has no source to look through if it is built in or compiled
+            origin = spec.origin
+            if origin is None or not origin.endswith('.py'):
+                return []
+            with open(origin, encoding='utf-8') as f:
+                return _stubs_in_source(f.read(), package, origin)
+
+    found = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '__pycache__')))
+            rel = os.path.relpath(dirpath, root)
+            parts = [name] + ([] if rel == '.' else rel.split(os.sep))
+            for filename in sorted(filenames):
+                if not filename.endswith('.py'):
+                    continue
+                module_parts = parts if filename == '__init__.py' else parts + [filename[:-3]]
+                path = os.path.join(dirpath, filename)
+                with open(path, encoding='utf-8') as f:
+                    source = f.read()
+                # skip files that can't have any before paying for a parse
+                if 'stub' in source:
+                    found.extend(_stubs_in_source(source, '.'.join(module_parts), path))
+    return found
+
+if __name__ == '__main__':
+    # python -m sink.errors package...: survey the stubs left in some packages
+    for package in sys.argv[1:] or ['.']:
+        for info in find_stubs(package):
+            print(info)
@@ -0,0 +1,180 @@
+import os, re, shutil, subprocess, sys, threading, time, typing
+from typing import Iterable
+
+_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+class ImportRecord:
+    """One module's import, as reported by -X importtime"""
+    __slots__ = ('name', 'self_us', 'cumulative_us', 'depth', 'children')
+
+    def __init__(self, name: str, self_us: int, cumulative_us: int, depth: int):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+        self.children = []
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'self_us': self.self_us, 'cumulative_us': self.cumulative_us,
+                'children': [c.to_dict() for c in self.children]}
+
+def parse_importtime(lines: Iterable[str]) -> list[ImportRecord]:
+    """Build the import tree out of -X importtime lines, other lines are ignored. Returns the top level imports in
+    the order they finished."""
+    # importtime prints a module after everything it imported, so children wait here until their parent turns up
+    pending: dict[int, list[ImportRecord]] = {}
+    roots = []
+    for line in lines:
+        m = _IMPORTTIME.match(line)
+        if not m:
+            continue
+        depth = (len(m.group(3)) - 1) // 2
+        record = ImportRecord(m.group(4), int(m.group(1)), int(m.group(2)), depth)
+        record.children = pending.pop(depth + 1, [])
+        if depth == 0:
+            roots.append(record)
+        else:
+            pending.setdefault(depth, []).append(record)
+    return roots
+
+class StartupProfile:
+    """How long an entry point took to start, and what it imported on the way"""
+    command: list[str]
+    imports: list[ImportRecord]
+    # seconds from launch, None if it never happened
+    first_output: float | None
+    first_output_line: str | None
+    exited: float | None
+    returncode: int | None
+
+    def __init__(self, command: list[str]):
+        self.command = command
+        self.imports = []
+        self.first_output = None
+        self.first_output_line = None
+        self.exited = None
+        self.returncode = None
+
+    def import_us(self) -> int:
+        return sum(r.cumulative_us for r in self.imports)
+
+    def heaviest(self, count: int = 10) -> list[ImportRecord]:
+        """Top level imports that took the longest, including what they imported"""
+        return sorted(self.imports, key=lambda r: r.cumulative_us, reverse=True)[:count]
+
+    def to_dict(self) -> dict:
+        return {'command': self.command, 'first_output': self.first_output, 'first_output_line': self.first_output_line,
+                'exited': self.exited, 'returncode': self.returncode, 'import_us': self.import_us(),
+                'imports': [r.to_dict() for r in self.imports]}
+
+    def report(self, min_us: int = 1000, count: int = 10) -> str:
+        """The heaviest imports, each with the parts of its tree that took at least min_us"""
+        def when(seconds):
+            return 'never' if seconds is None else f'{seconds * 1000:.1f}ms'
+        lines = [f'{" ".join(self.command)}',
+                 f'  first output after {when(self.first_output)}: {self.first_output_line!r}' if self.first_output_line is not None
+                 else f'  first output after {when(self.first_output)}',
+                 f'  exited after {when(self.exited)} with {self.returncode}',
+                 f'  imports took {self.import_us() / 1000:.1f}ms, heaviest:']
+        def walk(record: ImportRecord, indent: int):
+            lines.append(f'{"  " * indent}{record.cumulative_us / 1000:8.1f}ms {record.self_us / 1000:8.1f}ms self  {record.name}')
+            for child in sorted(record.children, key=lambda r: r.cumulative_us, reverse=True):
+                if child.cumulative_us >= min_us:
+                    walk(child, indent + 1)
+        for record in self.heaviest(count):
+            walk(record, 2)
+        return '\n'.join(lines)
+
+def _is_uv_script(path: str) -> bool:
+    try:
+        with open(path, encoding='utf-8') as f:
+            first = f.readline()
+    except OSError:
+        return False
+    return first.startswith('#!') and 'uv run' in first
+
+def entry_point_command(script: str, args: Iterable[str] = (), python: str | None = None) -> list[str]:
+    """How to launch script the way its shebang would: through `uv run --script` for uv scripts when uv is around,
+    otherwise with python (this interpreter by default)"""
+    if python is None and _is_uv_script(script) and shutil.which('uv'):
+        return ['uv', 'run', '--script', script, *args]
+    return [python or sys.executable, script, *args]
+
+def profile(command: list[str], marker: str | None = None, stop_after_output: bool = False, timeout: float | None = None,
+            echo: bool = True) -> StartupProfile:
+    """Run command with import time profiling turned on (PYTHONPROFILEIMPORTTIME, which reaches python through uv
+    too) and time it until the first line on stdout, or the first one matching the marker regex. With
+    stop_after_output the process is terminated there, for GUIs and other things that don't exit on their own."""
+    result = StartupProfile(list(command))
+    env = dict(os.environ, PYTHONPROFILEIMPORTTIME='1', PYTHONUNBUFFERED='1')
+    stderr_lines = []
+    pattern = re.compile(marker) if marker else None
+    start = time.perf_counter()
+    # closes the pipes on the way out
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                          env=env, text=True, errors='replace') as proc:
+        stdout = typing.cast(typing.IO[str], proc.stdout)
+        stderr = typing.cast(typing.IO[str], proc.stderr)
+
+        def read_stderr():
+            for line in stderr:
+                if line.startswith('import time:'):
+                    stderr_lines.append(line)
+                elif echo:
+                    sys.stderr.write(line)
+        stderr_reader = threading.Thread(target=read_stderr, daemon=True)
+        stderr_reader.start()
+        killer = None
+        if timeout is not None:
+            killer = threading.Timer(timeout, proc.kill)
+            killer.daemon = True
+            killer.start()
+
+        try:
+            for line in stdout:
+                if echo:
+                    sys.stdout.write(line)
+                if result.first_output is None and (pattern is None or pattern.search(line)):
+                    result.first_output = time.perf_counter() - start
+                    result.first_output_line = line.rstrip('\n')
+                    if stop_after_output:
+                        proc.terminate()
+            result.returncode = proc.wait()
+            result.exited = time.perf_counter() - start
+        finally:
+            if killer is not None:
+                killer.cancel()
+            if proc.returncode is None:
+                # interrupted while reading, don't leave it running
+                proc.kill()
+            stderr_reader.join()
+    result.imports = parse_importtime(stderr_lines)
+    return result
+
+def main(argv=None) -> int:
+    """python -m sink.startup [options] script.py [args...]: profile an entry point's imports and time to first output"""
+    import argparse, json
+    parser = argparse.ArgumentParser(prog='python -m sink.startup', description=main.__doc__)
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    parser.add_argument('--python', default=None, help='run the script with this interpreter instead of through uv')
+    parser.add_argument('--marker', default=None, help='regex for the stdout line that counts as the first useful output')
+    parser.add_argument('--stop', action='store_true', help='terminate the script once it has produced that output')
+    parser.add_argument('--timeout', type=float, default=None)
+    parser.add_argument('--min-ms', type=float, default=1.0, help='leave imports quicker than this out of the tree')
+    parser.add_argument('--json', metavar='PATH', default=None, help="write the whole profile as json, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    result = profile(entry_point_command(args.script, args.args, args.python), args.marker, args.stop, args.timeout,
+                     echo=args.json != '-')
+    if args.json == '-':
+        json.dump(result.to_dict(), sys.stdout, indent=1)
+    else:
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(result.to_dict(), f, indent=1)
+        print(result.report(int(args.min_ms * 1000)), file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import unittest, os, sys, tempfile
+
+from sink.errors import NotImplementedError, StubInfo, find_stubs, stub, stub_info, stubbed, stubs
+from sink.unittest import LoggedTestCase
+
+class TestStubs(LoggedTestCase):
+    def test_stubbed_raises_and_registers(self):
+        class Widget:
+            @stubbed
+            def draw(self, canvas):
+                """Draws the widget"""
+
+        with self.assertRaisesRegex(NotImplementedError, r'Widget\.draw \(in .*test_errors\.py:\d+\)'):
+            Widget().draw(None)
+        self.assertEqual(Widget.draw.__doc__, 'Draws the widget')
+        info = stub_info(Widget.draw)
+        assert info is not None
+        self.assertIn(info, stubs(__name__))
+        self.assertEqual(info.module, __name__)
+        self.assertTrue(info.qualname.endswith('<locals>.Widget.draw'))
+
+    def test_stub_call_names_caller(self):
+        def unfinished():
+            stub()
+        with self.assertRaisesRegex(NotImplementedError, 'Method not implemented: unfinished'):
+            unfinished()
+
+    def test_find_stubs_without_importing(self):
+        with tempfile.TemporaryDirectory() as root:
+            package = os.path.join(root, 'half_done')
+            os.makedirs(os.path.join(package, 'sub'))
+            with open(os.path.join(package, '__init__.py'), 'w') as f:
+                f.write('raise RuntimeError("imported")\n')
+            with open(os.path.join(package, 'sub', 'shapes.py'), 'w') as f:
+                f.write('from sink.errors import stub, stubbed\n'
+                        'import sink.errors\n'
+                        'class Shape:\n'
+                        '    @stubbed\n'
+                        '    def area(self): ...\n'
+                        '    @sink.errors.stubbed\n'
+                        '    async def outline(self): ...\n'
+                        '    def done(self): return 1\n'
+                        'def legacy():\n'
+                        '    stub()\n'
+                        '    raise Exception()\n')
+            with open(os.path.join(package, 'sub', 'lookalikes.py'), 'w') as f:
+                # only names that come from sink.errors count
+                f.write('from sink import errors as e\n'
+                        'from ..sub import shapes\n'
+                        'import mock\n'
+                        '@e.stubbed\n'
+                        'def aliased(): ...\n'
+                        '@shapes.stubbed\n'
+                        'def elsewhere(): ...\n'
+                        '@stubbed\n'
+                        'def unimported(): ...\n'
+                        'def mocked():\n'
+                        '    mock.stub()\n')
+            found = find_stubs(package)
+            self.logger.info(found)
+            shapes = os.path.join(package, 'sub', 'shapes.py')
+            self.assertListEqual(found, [
+                StubInfo('half_done.sub.lookalikes', 'aliased', os.path.join(package, 'sub', 'lookalikes.py'), 4),
+                StubInfo('half_done.sub.shapes', 'Shape.area', shapes, 4),
+                StubInfo('half_done.sub.shapes', 'Shape.outline', shapes, 6),
+                StubInfo('half_done.sub.shapes', 'legacy', shapes, 9),
+            ])
+            self.assertNotIn('half_done', sys.modules)
+
+    def test_find_stubs_matches_registry(self):
+        found = find_stubs('interactive')
+        self.assertIn('interactive.picker.pickers.ItemPickerBase._present_items', [f'{f.module}.{f.qualname}' for f in found])
+        import interactive.picker.pickers
+        self.assertSetEqual(set(stubs('interactive')), set(found))
+
+    def test_stubs_prefix_stops_at_module_boundaries(self):
+        def draw():
+            ...
+        draw.__module__ = 'interactive_tools'
+        sibling = stub_info(stubbed(draw))
+        assert sibling is not None
+        self.assertIn(sibling, stubs('interactive_tools'))
+        self.assertIn(sibling, stubs())
+        self.assertNotIn(sibling, stubs('interactive'))
+        self.assertNotIn(sibling, stubs('interactive_tool'))
+
+if __name__ == '__main__':
+    unittest.main()
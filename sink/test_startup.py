@@ -0,0 +1,53 @@
+import unittest, os, sys, tempfile
+
+from sink.startup import entry_point_command, parse_importtime, profile
+from sink.unittest import LoggedTestCase
+
+class TestStartupProfile(LoggedTestCase):
+    def test_parse_importtime(self):
+        lines = [
+            'import time: self [us] | cumulative | imported package\n',
+            'import time:        10 |         10 |   _weakref\n',
+            'import time:        20 |         20 |     _io_helper\n',
+            'import time:        30 |         50 |   io_ish\n',
+            'import time:       100 |        160 | heavy\n',
+            'unrelated stderr output\n',
+            'import time:         5 |          5 | light\n',
+        ]
+        roots = parse_importtime(lines)
+        self.assertListEqual([r.name for r in roots], ['heavy', 'light'])
+        heavy = roots[0]
+        self.assertEqual(heavy.cumulative_us, 160)
+        self.assertListEqual([c.name for c in heavy.children], ['_weakref', 'io_ish'])
+        self.assertListEqual([c.name for c in heavy.children[1].children], ['_io_helper'])
+
+    def test_profile_script(self):
+        with tempfile.TemporaryDirectory() as root:
+            script = os.path.join(root, 'tool.py')
+            with open(script, 'w') as f:
+                f.write('import json\n'
+                        'print("starting")\n'
+                        'import asyncio\n'
+                        'print("ready", flush=True)\n'
+                        'import time\n'
+                        'time.sleep(30)\n')
+            command = entry_point_command(script, python=sys.executable)
+            result = profile(command, marker='^ready', stop_after_output=True, timeout=20, echo=False)
+        self.logger.info(result.report())
+
+        self.assertEqual(result.first_output_line, 'ready')
+        assert result.first_output is not None
+        self.assertLess(result.first_output, 10)
+        # stopped rather than waiting out the sleep
+        self.assertNotEqual(result.returncode, 0)
+        assert result.exited is not None
+        self.assertLess(result.exited, 10)
+        names = [r.name for r in result.imports]
+        self.assertIn('json', names)
+        self.assertIn('asyncio', names)
+        asyncio_import = next(r for r in result.imports if r.name == 'asyncio')
+        self.assertGreater(asyncio_import.cumulative_us, asyncio_import.self_us)
+        self.assertIn('asyncio', result.report())
+
+if __name__ == '__main__':
+    unittest.main()
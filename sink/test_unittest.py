@@ -0,0 +1,126 @@
+import unittest, io, logging, os, tempfile, time
+
+from sink.unittest import _BufferingHandler, LoggedTestCase, ParallelTestRunner
+
+def _sleep_noting_when(seconds: float):
+    """Sleep, and note when in the file named by $SAMPLE_SLEEPS, if set, for the parent to see the sleeps overlap"""
+    start = time.time()
+    time.sleep(seconds)
+    path = os.environ.get('SAMPLE_SLEEPS')
+    if path:
+        with open(path, 'a') as f:
+            f.write(f'{start} {time.time()}\n')
+
+class _Samples(LoggedTestCase):
+    """Not collected by the loader (no test_ prefix), run by name from TestParallelTestRunner"""
+    def sample_passes(self):
+        self.logger.info('passing quietly')
+        _sleep_noting_when(0.5)
+
+    def sample_fails(self):
+        self.logger.info('about to fail in %s', os.getpid())
+        _sleep_noting_when(0.5)
+        self.fail('on purpose')
+
+    def sample_errors(self):
+        try:
+            raise KeyError('inner')
+        except KeyError:
+            self.logger.exception('caught something')
+        _sleep_noting_when(0.5)
+        raise ValueError('on purpose')
+
+    def sample_subtests(self):
+        for i in range(3):
+            with self.subTest(i=i):
+                self.assertNotEqual(i, 1)
+
+    @unittest.skip('not today')
+    def sample_skipped(self):
+        pass
+
+class _Flood(LoggedTestCase):
+    log_capacity = 100
+    log_level_caps = {logging.DEBUG: 10}
+
+    def sample_floods(self):
+        self.logger.warning('early warning')
+        for i in range(10000):
+            self.logger.debug('step %d', i)
+        self.fail('after the flood')
+
+class TestBufferingHandler(LoggedTestCase):
+    def test_bounded(self):
+        logger = logging.getLogger('bufferingLogger.test_bounded')
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        buf = _BufferingHandler(capacity=50, level_caps={logging.DEBUG: 20})
+        logger.addHandler(buf)
+        try:
+            logger.error('first error')
+            for i in range(1000):
+                logger.debug('debug %d', i)
+            for i in range(40):
+                logger.info('info %d', i)
+        finally:
+            logger.removeHandler(buf)
+
+        messages = [r.getMessage() for r in buf.records]
+        self.assertEqual(len(messages), 50)
+        # the debug flood only pushed out older debug records, the error went once the buffer as a whole was full
+        self.assertEqual(messages[:10], [f'debug {i}' for i in range(990, 1000)])
+        self.assertEqual(messages[10:], [f'info {i}' for i in range(40)])
+        self.assertEqual(buf.dropped, 991)
+        self.assertEqual(buf.dropped_by_level[logging.DEBUG], 990)
+        self.assertEqual(buf.dropped_by_level[logging.ERROR], 1)
+
+    def test_dropped_count_printed_on_failure(self):
+        out = io.StringIO()
+        ParallelTestRunner(processes=1, stream=out).run(unittest.TestSuite([_Flood('sample_floods')]))
+        report = out.getvalue()
+        self.logger.info(report)
+        self.assertIn('9990 older log records were dropped (DEBUG=9990)', report)
+        self.assertIn('early warning', report)
+        self.assertIn('step 9999', report)
+        self.assertNotIn('step 9989', report)
+
+class TestParallelTestRunner(LoggedTestCase):
+    def test_runs_in_parallel_and_reports_logs_of_failures(self):
+        names = ['sample_passes', 'sample_fails', 'sample_errors', 'sample_subtests', 'sample_skipped']
+        suite = unittest.TestSuite(_Samples(name) for name in names)
+        out = io.StringIO()
+        sleeps_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(sleeps_dir.cleanup)
+        sleeps_path = os.path.join(sleeps_dir.name, 'sleeps')
+        os.environ['SAMPLE_SLEEPS'] = sleeps_path
+        self.addCleanup(os.environ.pop, 'SAMPLE_SLEEPS', None)
+        result = ParallelTestRunner(processes=4, stream=out).run(suite)
+        report = out.getvalue()
+        self.logger.info(report)
+
+        self.assertEqual(result.testsRun, 5)
+        self.assertEqual(len(result.failures), 2)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(len(result.skipped), 1)
+        self.assertFalse(result.wasSuccessful())
+        # the three half second sleeps ran side by side
+        with open(sleeps_path) as f:
+            sleeps = [tuple(map(float, line.split())) for line in f]
+        self.assertEqual(len(sleeps), 3)
+        self.assertLess(max(start for start, _ in sleeps), min(end for _, end in sleeps))
+
+        self.assertIn('about to fail in', report)
+        self.assertIn('caught something', report)
+        self.assertIn("KeyError: 'inner'", report)
+        self.assertIn('(i=1)', report)
+        # logs of tests that passed stay in their worker
+        self.assertNotIn('passing quietly', report)
+        self.assertIn('FAILED (failures=2, errors=1, skipped=1)', report)
+
+    def test_logs_are_per_test(self):
+        a, b = _Samples('sample_passes'), _Samples('sample_fails')
+        self.assertIsNot(a.logger, b.logger)
+        self.assertFalse(a.logger.propagate)
+
+if __name__ == '__main__':
+    unittest.main()
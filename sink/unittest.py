@@ -1,27 +1,69 @@
-import unittest, logging, sys
+import unittest, logging, sys, time
+import argparse, collections, concurrent.futures, heapq, logging.handlers, multiprocessing, os, queue
 
 class _BufferingHandler(logging.Handler):
-    def __init__(self, *args):
+    """Keeps the latest capacity records, and at most level_caps[levelno] of any one level, counting the ones it
+    drops. Records are kept as they are, they're only formatted if they get printed."""
+    def __init__(self, capacity: int = 10000, level_caps: dict[int, int] | None = None, *args):
         super().__init__(*args)
-        self.records = []
+        self.capacity = capacity
+        self.level_caps = level_caps or {}
+        self.dropped = 0
+        self.dropped_by_level = collections.Counter()
+        # a ring per level of (seq, record), so a flood of debug records doesn't push the warnings out
+        self._levels = {}
+        self._seq = 0
+        self._count = 0
 
     def emit(self, record):
-        self.records.append(record)
+        levelno = record.levelno
+        ring = self._levels.get(levelno)
+        if ring is None:
+            ring = self._levels[levelno] = collections.deque()
+        cap = min(self.level_caps.get(levelno, self.capacity), self.capacity)
+        if cap <= 0:
+            self._drop(levelno)
+            return
+        if len(ring) >= cap:
+            ring.popleft()
+            self._drop(levelno)
+        elif self._count >= self.capacity:
+            # full, make room by dropping the oldest record of any level
+            oldest_level, oldest = min(((l, r) for l, r in self._levels.items() if r), key=lambda lr: lr[1][0][0])
+            oldest.popleft()
+            self._drop(oldest_level)
+        else:
+            self._count += 1
+        self._seq += 1
+        ring.append((self._seq, record))
+
+    def _drop(self, levelno: int):
+        self.dropped += 1
+        self.dropped_by_level[levelno] += 1
+
+    @property
+    def records(self) -> list[logging.LogRecord]:
+        """Buffered records, oldest first"""
+        return [record for _, record in heapq.merge(*self._levels.values())]
 
 
 class LoggedTestCase(unittest.TestCase):
     """Test case which accumulates logs as it runs and only prints them if there is a failure or error"""
+    # most records kept per test, and per level (e.g. {logging.DEBUG: 1000}), the oldest go first
+    log_capacity: int = 10000
+    log_level_caps: dict[int, int] | None = None
+
     def __init__(self, *args):
         super().__init__(*args)
 
-        self.logger = logging.getLogger("bufferingLogger")
+        # a logger of its own per test, so that tests running side by side don't share a buffer
+        self.logger = logging.getLogger(f"bufferingLogger.{self.id()}")
         self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
 
     def setUp(self):
         super().setUp()
-        for hdlr in self.logger.handlers:
-           self.logger.removeHandler(hdlr)
-        self.logbuf = _BufferingHandler()
+        self.logbuf = _BufferingHandler(self.log_capacity, self.log_level_caps)
         self.logger.addHandler(self.logbuf)
 
     def tearDown(self):
@@ -29,8 +71,283 @@ class LoggedTestCase(unittest.TestCase):
         self.logger.removeHandler(self.logbuf)
 
     def run(self, result=None):
-        super().run(result)
-        if result and (len(result.failures) + len(result.errors)) > 0:
+        problems_before = (len(result.failures) + len(result.errors)) if result else 0
+        result = super().run(result)
+        logbuf = getattr(self, 'logbuf', None)
+        if not result or not logbuf or len(result.failures) + len(result.errors) == problems_before:
+            return result
+        records = logbuf.records
+        if logbuf.dropped:
+            by_level = ', '.join(f'{logging.getLevelName(l)}={n}' for l, n in sorted(logbuf.dropped_by_level.items()))
+            records.insert(0, self.logger.makeRecord(self.logger.name, logging.WARNING, __file__, 0,
+                                                     '%d older log records were dropped (%s)', (logbuf.dropped, by_level), None))
+        add_log_records = getattr(result, 'addLogRecords', None)
+        if add_log_records:
+            # a ParallelTestRunner worker, the parent prints them
+            add_log_records(self, records)
+        else:
             sh = logging.StreamHandler(sys.stdout)
-            for r in self.logbuf.records:
-                sh.emit(r)
\ No newline at end of file
+            for r in records:
+                sh.emit(r)
+        return result
+
+
+class _Outcome:
+    """What happened to one test in a worker process, in a form that pickles"""
+    __slots__ = ('test_id', 'description', 'kind', 'problems', 'records', 'duration')
+
+    def __init__(self, test_id: str, description: str):
+        self.test_id = test_id
+        self.description = description
+        # ok, fail, error, skip, expected_failure or unexpected_success
+        self.kind = 'ok'
+        # (kind, description, formatted traceback or skip reason)
+        self.problems = []
+        self.records = []
+        self.duration = 0.0
+
+
+class _OutcomeResult(unittest.TestResult):
+    """Collects _Outcomes instead of keeping exceptions and test objects around"""
+    def __init__(self):
+        super().__init__()
+        self.outcomes = {}
+
+    def _outcome(self, test) -> _Outcome:
+        outcome = self.outcomes.get(test.id())
+        if outcome is None:
+            outcome = self.outcomes[test.id()] = _Outcome(test.id(), str(test))
+        return outcome
+
+    def _add(self, test, kind: str, text: str, description: str | None = None):
+        outcome = self._outcome(test)
+        # an error outranks a failure, which outranks anything else
+        if kind == 'error' or (kind == 'fail' and outcome.kind != 'error') or outcome.kind == 'ok':
+            outcome.kind = kind
+        outcome.problems.append((kind, description or outcome.description, text))
+
+    def startTest(self, test):
+        super().startTest(test)
+        self._outcome(test).duration = time.perf_counter()
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        outcome = self._outcome(test)
+        outcome.duration = time.perf_counter() - outcome.duration
+
+    def format_error(self, err, test) -> str:
+        """The traceback of err the way TestResult prints it, with unittest's own frames left out"""
+        # typeshed leaves this private method of TestResult out
+        return unittest.TestResult._exc_info_to_string(self, err, test) # type: ignore
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._add(test, 'error', self.format_error(err, test))
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._add(test, 'fail', self.format_error(err, test))
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            exc_type = err[0]
+            kind = 'fail' if exc_type is not None and issubclass(exc_type, test.failureException) else 'error'
+            self._add(test, kind, self.format_error(err, test), str(subtest))
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._add(test, 'skip', reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self._add(test, 'expected_failure', self.format_error(err, test))
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._add(test, 'unexpected_success', '')
+
+    def addLogRecords(self, test, records: list[logging.LogRecord]):
+        # bake the message and any traceback into the record, its args and exc_info may not pickle
+        # prepare() never touches the queue
+        prepare = logging.handlers.QueueHandler(queue.SimpleQueue()).prepare
+        self._outcome(test).records.extend(prepare(r) for r in records)
+
+
+def _run_test(test_id: str) -> list[_Outcome]:
+    """Runs in a worker process: load a test by name and run it on its own"""
+    result = _OutcomeResult()
+    try:
+        test = unittest.defaultTestLoader.loadTestsFromName(test_id)
+    except Exception:
+        outcome = _Outcome(test_id, test_id)
+        outcome.kind = 'error'
+        outcome.problems.append(('error', test_id, result.format_error(sys.exc_info(), None)))
+        return [outcome]
+    test.run(result)
+    return list(result.outcomes.values())
+
+
+def _flatten(suite) -> list[unittest.TestCase]:
+    if isinstance(suite, unittest.TestCase):
+        return [suite]
+    return [test for child in suite for test in _flatten(child)]
+
+
+class _RemoteTest(unittest.TestCase):
+    """Stands in for a test that ran in a worker process, in TestResult.failures and friends"""
+    def __init__(self, test_id: str, description: str):
+        super().__init__()
+        self._id = test_id
+        self.description = description
+
+    def id(self):
+        return self._id
+
+    # TestCase compares by class and method name, which every _RemoteTest shares
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+    def shortDescription(self):
+        return None
+
+    def __str__(self):
+        return self.description
+
+
+class ParallelTestRunner:
+    """Runs each test of a suite in one of a pool of worker processes. Logs of LoggedTestCases stay in their own
+    worker and only come back to be printed when the test fails, next to its traceback.
+    Every test is loaded again by name in the worker, so tests need to be importable by their id() and setUpClass
+    and friends run once per test rather than once per class."""
+    _status_chars = {'ok': '.', 'fail': 'F', 'error': 'E', 'skip': 's', 'expected_failure': 'x', 'unexpected_success': 'u'}
+    _status_words = {'ok': 'ok', 'fail': 'FAIL', 'error': 'ERROR', 'skip': 'skipped', 'expected_failure': 'expected failure',
+                     'unexpected_success': 'unexpected success'}
+
+    def __init__(self, processes: int | None = None, verbosity: int = 1, stream=None, start_method: str | None = None):
+        """processes defaults to os.cpu_count(). Tests that mostly sleep or wait can use more processes than that."""
+        self.processes = processes or os.cpu_count() or 1
+        self.verbosity = verbosity
+        self.stream = stream or sys.stderr
+        self.start_method = start_method
+
+    def run(self, suite) -> unittest.TestResult:
+        tests = _flatten(suite)
+        result = unittest.TestResult()
+        outcomes = []
+        start = time.perf_counter()
+
+        # tests the loader couldn't import are placeholders that can't be loaded by name, they just report the error here
+        local = [t for t in tests if type(t).__module__ == 'unittest.loader']
+        remote = [t.id() for t in tests if type(t).__module__ != 'unittest.loader']
+        local_result = _OutcomeResult()
+        for test in local:
+            test.run(local_result)
+        for outcome in local_result.outcomes.values():
+            self._report(outcome)
+            outcomes.append(outcome)
+
+        if remote:
+            processes = min(self.processes, len(remote))
+            with concurrent.futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context(self.start_method)) as pool:
+                futures = [pool.submit(_run_test, test_id) for test_id in remote]
+                for future in concurrent.futures.as_completed(futures):
+                    for outcome in future.result():
+                        self._report(outcome)
+                        outcomes.append(outcome)
+        elapsed = time.perf_counter() - start
+
+        for outcome in outcomes:
+            self._collect(result, outcome)
+        result.testsRun = len(outcomes)
+        if self.verbosity == 1:
+            self.stream.write('\n')
+        self._print_problems(outcomes)
+        self._print_summary(result, elapsed)
+        return result
+
+    def _report(self, outcome: _Outcome):
+        if self.verbosity > 1:
+            self.stream.write(f'{outcome.description} ... {self._status_words[outcome.kind]} ({outcome.duration:.3f}s)\n')
+        elif self.verbosity == 1:
+            self.stream.write(self._status_chars[outcome.kind])
+        self.stream.flush()
+
+    @staticmethod
+    def _collect(result: unittest.TestResult, outcome: _Outcome):
+        for kind, description, text in outcome.problems:
+            test = _RemoteTest(outcome.test_id, description)
+            if kind == 'error':
+                result.errors.append((test, text))
+            elif kind == 'fail':
+                result.failures.append((test, text))
+            elif kind == 'skip':
+                result.skipped.append((test, text))
+            elif kind == 'expected_failure':
+                result.expectedFailures.append((test, text))
+            elif kind == 'unexpected_success':
+                result.unexpectedSuccesses.append(test)
+
+    def _print_problems(self, outcomes: list[_Outcome]):
+        handler = logging.StreamHandler(self.stream)
+        for outcome in outcomes:
+            problems = [p for p in outcome.problems if p[0] in ('error', 'fail')]
+            for kind, description, text in problems:
+                self.stream.write('=' * 70 + '\n')
+                self.stream.write(f'{self._status_words[kind]}: {description}\n')
+                self.stream.write('-' * 70 + '\n')
+                self.stream.write(text)
+            if problems and outcome.records:
+                self.stream.write(' captured log '.center(70, '-') + '\n')
+                for r in outcome.records:
+                    handler.emit(r)
+        if any(o.kind in ('error', 'fail') for o in outcomes):
+            self.stream.write('-' * 70 + '\n')
+
+    def _print_summary(self, result: unittest.TestResult, elapsed: float):
+        self.stream.write(f'Ran {result.testsRun} test{"" if result.testsRun == 1 else "s"} in {elapsed:.3f}s '
+                          f'({self.processes} processes)\n\n')
+        infos = []
+        if result.failures:
+            infos.append(f'failures={len(result.failures)}')
+        if result.errors:
+            infos.append(f'errors={len(result.errors)}')
+        if result.skipped:
+            infos.append(f'skipped={len(result.skipped)}')
+        if result.expectedFailures:
+            infos.append(f'expected failures={len(result.expectedFailures)}')
+        if result.unexpectedSuccesses:
+            infos.append(f'unexpected successes={len(result.unexpectedSuccesses)}')
+        status = 'OK' if result.wasSuccessful() else 'FAILED'
+        self.stream.write(f'{status} ({", ".join(infos)})\n' if infos else f'{status}\n')
+        self.stream.flush()
+
+
+def main(argv=None) -> int:
+    """python -m sink.unittest [-j N] [names...]: discover (or load by name) and run tests with a ParallelTestRunner"""
+    parser = argparse.ArgumentParser(prog='python -m sink.unittest', description=main.__doc__)
+    parser.add_argument('names', nargs='*', help='test modules, classes or methods, discovers from --start-directory if none')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default os.cpu_count()')
+    parser.add_argument('-v', '--verbose', dest='verbosity', action='store_const', const=2, default=1)
+    parser.add_argument('-q', '--quiet', dest='verbosity', action='store_const', const=0)
+    parser.add_argument('-s', '--start-directory', default='.')
+    parser.add_argument('-p', '--pattern', default='test*.py')
+    parser.add_argument('-t', '--top-level-directory', default=None)
+    parser.add_argument('--start-method', default=None, help="multiprocessing start method, 'fork', 'spawn' or 'forkserver'")
+    args = parser.parse_args(argv)
+
+    loader = unittest.defaultTestLoader
+    if args.names:
+        # as with python -m unittest, names are relative to the current directory
+        sys.path.insert(0, os.getcwd())
+        suite = loader.loadTestsFromNames(args.names)
+    else:
+        suite = loader.discover(args.start_directory, args.pattern, args.top_level_directory)
+    runner = ParallelTestRunner(args.processes, args.verbosity, start_method=args.start_method)
+    return 0 if runner.run(suite).wasSuccessful() else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
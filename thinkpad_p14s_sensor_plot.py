@@ -12,12 +12,8 @@
 
 # suuuper messy live plot for my thinkpad p14s' sensors
 
-import pyqtgraph as pg
-import numpy
 import pathlib, typing,sys
 import psutil
-from pyqtgraph.Qt import QtCore, QtGui
-from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout
 #pyqtgraph.examples.run()
 
 def discover_sensors():
@@ -132,6 +128,11 @@ class CpuFuncSeries(FuncSeries):
     def sample(self):
         return psutil.cpu_percent(interval=None)
 
+# qt only now, so the sensors are listed without waiting for it
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore, QtGui
+from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout
+
 class MainWindow(QMainWindow):
 
     def __init__(self):